@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Vectorised analytics over the raw log: when sets happen, how big they are, rolling trends
+"""
+
+import datetime
+import threading
+from db import DEFAULT_EXERCISE, DEFAULT_USER, to_day, from_day
+
+try:
+    import numpy as np
+except ImportError:  # optional: the rest of the app works without it
+    np = None
+
+ROW = [("day", "i4"), ("ts", "i8"), ("count", "i4")] if np else None
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+HOUR_MS = 3600 * 1000
+
+
+def available():
+    return np is not None
+
+
+def _midnights(days):
+    """Local midnight in epoch ms for each epoch day (DST-aware, one call per distinct day)"""
+    return np.array(
+        [datetime.datetime.combine(from_day(int(day)), datetime.time()).timestamp() * 1000 for day in days],
+        dtype=np.int64
+    )
+
+
+def _rolling_median(values, window):
+    if len(values) < window:
+        return np.empty(0)
+    return np.median(np.lib.stride_tricks.sliding_window_view(values, window), axis=1)
+
+
+class Analytics:
+    """Raw entries of one user's exercise as columnar arrays, with results computed on demand
+
+    The arrays are loaded once. After a write only the changed days are
+    re-read and spliced in, and every result is memoised until the next
+    write, so repeated reads cost nothing and a new set costs one small
+    query rather than a reload of the whole history.
+    """
+
+    def __init__(self, storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        if np is None:
+            raise RuntimeError("Analytics need NumPy (pip install numpy)")
+        self.store = storage
+        self.exercise = exercise
+        self.user = user
+        self._lock = threading.RLock()  # results may build on other cached results
+        self._refresh_lock = threading.Lock()  # one splice at a time, in write order
+        self._stale_days = set()  # epoch days written since the arrays were refreshed
+        self.load()
+        storage.add_listener(self._changed)
+
+    def load(self):
+        with self._refresh_lock:
+            with self._lock:
+                self._stale_days.clear()  # writes from here on are marked again
+            rows = np.fromiter(self.store.iter_raw(exercise=self.exercise, user=self.user), dtype=ROW)
+            with self._lock:
+                self._set_rows(rows)
+
+    def _set_rows(self, rows):
+        """Install rows sorted by (day, ts) and derive the columns (caller holds the lock)"""
+        self.rows = rows
+        self.day = rows["day"]
+        self.count = rows["count"].astype(np.int64)
+        unique, inverse = np.unique(self.day, return_inverse=True)
+        midnights = _midnights(np.append(unique, unique[-1] + 1) if len(unique) else unique)
+        local_ms = rows["ts"] - midnights[:-1][inverse]
+        # Edits and back-filled days are stamped when they were entered, not on their day:
+        # they have no time of day to chart
+        self.timed = (local_ms >= 0) & (local_ms < np.diff(midnights)[inverse])
+        self.hour = np.clip(local_ms // HOUR_MS, 0, 23)  # 25-hour DST days fold into 23
+        self.weekday = (self.day + 3) % 7  # epoch day 0 was a Thursday; Monday = 0
+        self._results = {}
+
+    def _changed(self, changes):
+        """Writer listener: note the days to re-read; the next query splices them in"""
+        days = changes.get(self.user, {}).get(self.exercise)
+        if days:
+            with self._lock:
+                self._stale_days.update(to_day(date) for date in days)
+
+    def _refresh(self):
+        """Splice re-read stale days into the arrays
+
+        The store is read without holding self._lock: listeners may be
+        called under the store's own lock, and _changed needs ours.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                if not self._stale_days:
+                    return
+                stale = sorted(self._stale_days)
+                self._stale_days.clear()
+            fresh = np.fromiter(
+                (
+                    row for day in stale
+                    for row in self.store.iter_raw(from_day(day), from_day(day), self.exercise, self.user)
+                ),
+                dtype=ROW
+            )
+            with self._lock:
+                kept = self.rows[~np.isin(self.day, np.array(stale, dtype=np.int32))]
+                rows = np.concatenate([kept, fresh])
+                if len(kept) and len(fresh) and fresh["day"][0] <= kept["day"][-1]:
+                    rows = rows[np.lexsort((rows["ts"], rows["day"]))]
+                self._set_rows(rows)
+
+    def _cached(self, key, compute):
+        self._refresh()
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = compute()
+            return self._results[key]
+
+    # --- Queries ---
+
+    def hour_weekday(self):
+        """{"reps": 7x24, "sets": 7x24} nested lists, Monday first, hour 0-23
+
+        Only entries stamped on their own day count; see _set_rows.
+        """
+        def compute():
+            cell = (self.weekday * 24 + self.hour)[self.timed]
+            reps = np.bincount(cell, weights=self.count[self.timed], minlength=168).astype(np.int64)
+            sets = np.bincount(cell, minlength=168)
+            return {"reps": reps.reshape(7, 24).tolist(), "sets": sets.reshape(7, 24).tolist()}
+        return self._cached("hour_weekday", compute)
+
+    def set_distribution(self):
+        """Set sizes: histogram {size: sets}, percentiles, mean, std and max"""
+        def compute():
+            counts = self.count[self.count > 0]  # skips are logged as 0
+            if not len(counts):
+                return {"sets": 0, "histogram": {}, "percentiles": {}, "mean": 0, "std": 0, "max": 0}
+            sizes = np.bincount(counts)
+            nonzero = np.flatnonzero(sizes)
+            return {
+                "sets": int(len(counts)),
+                "histogram": {int(size): int(sizes[size]) for size in nonzero},
+                "percentiles": {
+                    f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(counts, PERCENTILES))
+                },
+                "mean": round(float(counts.mean()), 2),
+                "std": round(float(counts.std()), 2),
+                "max": int(counts.max()),
+            }
+        return self._cached("set_distribution", compute)
+
+    def daily(self):
+        """(first epoch day, dense daily totals with zeros for missing days)"""
+        def compute():
+            if not len(self.day):
+                return 0, np.zeros(0, dtype=np.int64)
+            first = int(self.day[0])
+            return first, np.bincount(self.day - first, weights=self.count).astype(np.int64)
+        return self._cached("daily", compute)
+
+    def rolling(self, window=7, days=90):
+        """Rolling mean and median of daily totals for the last `days` days of the log"""
+        def compute():
+            first, totals = self.daily()
+            if len(totals) < window:
+                return []
+            sums = np.cumsum(np.concatenate([[0], totals]))
+            means = (sums[window:] - sums[:-window]) / window
+            medians = _rolling_median(totals, window)
+            start = max(len(means) - days, 0)
+            end_days = np.arange(first + window - 1, first + len(totals))
+            return [
+                {"date": from_day(int(day)).isoformat(), "mean": round(float(mean), 2), "median": float(median)}
+                for day, mean, median in zip(end_days[start:], means[start:], medians[start:])
+            ]
+        return self._cached(("rolling", window, days), compute)
+
+    def summary(self, window=7, days=90):
+        """Everything above in one JSON-ready dict"""
+        self._refresh()
+        return {
+            "exercise": self.exercise,
+            "user": self.user,
+            "entries": int(len(self.rows)),
+            "hour_weekday": self.hour_weekday(),
+            "set_distribution": self.set_distribution(),
+            "rolling": {"window": window, "days": self.rolling(window, days)},
+        }
+
+
+def get_analytics(storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """The Analytics for a user's exercise shared by everything using this store, or None without NumPy"""
+    if np is None:
+        return None
+    return storage.shared(("analytics", exercise, user), lambda store: Analytics(store, exercise, user))
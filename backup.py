@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Online snapshots of the database through the SQLite backup API
+"""
+
+import datetime
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+STEP_PAGES = 64        # pages copied per backup step
+STEP_PAUSE = 0.002     # seconds yielded between steps
+PREFIX = "pushups-"
+
+
+def snapshots(backup_dir):
+    """Snapshot files in backup_dir, newest first"""
+    backup_dir = Path(backup_dir)
+    if not backup_dir.is_dir():
+        return []
+    return sorted(backup_dir.glob(f"{PREFIX}*.db"), reverse=True)
+
+
+def rotate(backup_dir, keep):
+    """Delete all but the newest `keep` snapshots; returns the removed paths"""
+    removed = snapshots(backup_dir)[keep:]
+    for path in removed:
+        path.unlink()
+    return removed
+
+
+def _copy(src, dest_path, pages, report):
+    def progress(status, remaining, total):
+        report["steps"] += 1
+        report["pages"] = total
+        time.sleep(STEP_PAUSE)
+
+    dest = sqlite3.connect(dest_path)
+    try:
+        src.backup(dest, pages=pages, progress=progress)
+        report["check"] = dest.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        dest.close()
+
+
+def backup(manager, backup_dir, keep=7, pages=STEP_PAGES):
+    """Snapshot the database into backup_dir and rotate; returns a report
+
+    Copies a few pages per step with a pause in between, from a read-only
+    connection holding one read transaction. Under WAL that pins a
+    snapshot: writers carry on untouched, and the backup never restarts
+    because of them (a plain stepped backup starts over after every
+    commit from another connection). The file appears under its final
+    name only once complete.
+    """
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    path = backup_dir / f"{PREFIX}{datetime.datetime.now():%Y%m%d-%H%M%S}.db"
+    partial = path.with_name(path.name + ".part")
+    report = {"path": str(path), "steps": 0, "pages": 0, "check": None}
+
+    began = time.perf_counter()
+    with manager.read() as src:
+        src.execute("BEGIN")
+        try:
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()  # start the read snapshot
+            _copy(src, partial, pages, report)
+        except Exception:
+            partial.unlink(missing_ok=True)
+            raise
+        finally:
+            src.rollback()
+    os.replace(partial, path)
+
+    report["bytes"] = path.stat().st_size
+    report["seconds"] = time.perf_counter() - began
+    report["removed"] = len(rotate(backup_dir, keep))
+    return report
+
+
+def restore(manager, snapshot, pages=STEP_PAGES):
+    """Copy a snapshot over the live database through the backup API
+
+    Going through SQLite (rather than copying the file over) keeps the WAL
+    and any other open connections consistent. Stop the app first: its
+    in-memory caches do not notice a restore.
+    """
+    src = sqlite3.connect(f"file:{Path(snapshot)}?mode=ro", uri=True)
+    try:
+        check = src.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise ValueError(f"{snapshot} failed its integrity check: {check}")
+        began = time.perf_counter()
+        with manager.write() as dest:
+            src.backup(dest, pages=pages)
+    finally:
+        src.close()
+    return {"path": str(snapshot), "bytes": Path(snapshot).stat().st_size, "seconds": time.perf_counter() - began}
+
+
+def describe(report):
+    text = f"Snapshot {report['path']}: {report['bytes'] / 1024:.0f} KB in {report['seconds']:.2f} s"
+    if report.get("steps"):
+        text += f" ({report['steps']} steps, integrity {report['check']})"
+    if report.get("removed"):
+        text += f", removed {report['removed']} old snapshot(s)"
+    return text
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare the text-date schema (v1) with the integer-day schema (v2)
+
+Builds a synthetic log (27 entries a day, the default 35-minute timer),
+measures file size and typical query times, migrates a copy in place and
+measures again.
+
+    python benchmarks/bench_schema.py [years]
+"""
+
+import datetime
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import get_manager, to_day
+from migrations import migrate, _v1_text_log
+
+ENTRIES_PER_DAY = 27
+
+
+def build_v1(path, years):
+    conn = sqlite3.connect(path)
+    _v1_text_log(conn, None)
+    start = datetime.date.today() - datetime.timedelta(days=365 * years)
+    rows = []
+    for i in range(365 * years):
+        day = start + datetime.timedelta(days=i)
+        for j in range(ENTRIES_PER_DAY):
+            moment = datetime.datetime.combine(day, datetime.time(7)) + datetime.timedelta(minutes=35 * j)
+            rows.append((day.isoformat(), random.randint(5, 30), moment.isoformat()))
+    conn.executemany("INSERT INTO pushups (date, count, timestamp) VALUES (?, ?, ?)", rows)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return start, len(rows)
+
+
+def timed(conn, sql, params, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(path, label, month_start, month_end, text):
+    conn = sqlite3.connect(path)
+    if text:
+        params = (month_start.isoformat(), month_end.isoformat())
+        month = "SELECT SUM(count) FROM pushups WHERE date BETWEEN ? AND ?"
+        daily = "SELECT date, SUM(count) FROM pushups WHERE date BETWEEN ? AND ? GROUP BY date"
+    else:
+        params = (to_day(month_start), to_day(month_end))
+        month = "SELECT SUM(count) FROM pushups WHERE day BETWEEN ? AND ?"
+        daily = "SELECT day, SUM(count) FROM pushups WHERE day BETWEEN ? AND ? GROUP BY day"
+    size = path.stat().st_size
+    results = (timed(conn, month, params), timed(conn, daily, params))
+    conn.close()
+    print(f"{label:>4}: {size / 1024 / 1024:7.2f} MB   30-day sum {results[0]:7.3f} ms   30-day daily {results[1]:7.3f} ms")
+    return size, results
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        start, count = build_v1(path, years)
+        print(f"{count} entries over {years} years")
+        month_start = start + datetime.timedelta(days=365 * years // 2)
+        month_end = month_start + datetime.timedelta(days=29)
+
+        before = measure(path, "v1", month_start, month_end, text=True)
+
+        began = time.perf_counter()
+        migrate(get_manager(path), progress=lambda done, total: None)
+        print(f"migrated in {time.perf_counter() - began:.2f} s")
+        get_manager(path).close()
+
+        after = measure(path, "v2", month_start, month_end, text=False)
+        print(f"size {after[0] / before[0]:.0%} of v1, "
+              f"30-day sum {before[1][0] / after[1][0]:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
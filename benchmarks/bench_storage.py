@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Compare the storage engines on the same workload
+
+Logs a synthetic history through each engine (27 entries a day, the
+default 35-minute timer), then times opening the store again and the
+range reads the UI and web server make.
+
+    python benchmarks/bench_storage.py [days]
+"""
+
+import datetime
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import ENGINES, FILENAMES
+
+ENTRIES_PER_DAY = 27
+
+
+def workload(days):
+    start = datetime.date.today() - datetime.timedelta(days=days)
+    for i in range(days):
+        day = start + datetime.timedelta(days=i)
+        for j in range(ENTRIES_PER_DAY):
+            moment = datetime.datetime.combine(day, datetime.time(7)) + datetime.timedelta(minutes=35 * j)
+            yield day, random.randint(5, 30), moment
+
+
+def timed(fn, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(engine, path, entries):
+    store = ENGINES[engine](path)
+    began = time.perf_counter()
+    futures = [store.log(day, count, moment) for day, count, moment in entries]
+    for future in futures:
+        future.result()
+    write_us = (time.perf_counter() - began) / len(entries) * 1e6
+
+    open_ms = 0.0
+    if path is not None:  # nothing to reopen for the memory engine
+        store.close()
+        began = time.perf_counter()
+        store = ENGINES[engine](path)
+        open_ms = (time.perf_counter() - began) * 1000
+
+    today = datetime.date.today()
+    month = timed(lambda: store.day_range(today - datetime.timedelta(days=29), today))
+    weeks = timed(lambda: store.day_range(granularity="week"))
+    store.close()
+    print(f"{engine:>6}: write {write_us:7.1f} us/entry   reopen {open_ms:8.1f} ms   "
+          f"30 days {month:7.3f} ms   all weeks {weeks:7.3f} ms")
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    entries = list(workload(days))
+    print(f"{len(entries)} entries over {days} days")
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in ENGINES:
+            filename = FILENAMES[engine]
+            bench(engine, filename and Path(tmp) / filename, entries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compare the web server engines under a room full of polling phones
+
+Starts web_server.py on a memory store with each engine in turn, then
+opens one keep-alive connection per phone and has every phone poll
+/api/today. Reports throughput, latency percentiles, failed requests
+and the server's peak thread count.
+
+    python benchmarks/bench_web.py [phones] [seconds] [poll interval ms]
+"""
+
+import http.client
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from serving import ENGINES
+
+ROOT = Path(__file__).resolve().parent.parent
+PORT = 18480
+
+
+def server_threads(pid):
+    """Current thread count of a process (Linux only, else None)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def wait_until_up(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/today")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def phone(port, stop, interval, latencies, errors):
+    conn = None
+    while not stop.is_set():
+        began = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            conn.request("GET", "/api/today?exercise=pushups")
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - began)
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            if conn is not None:
+                conn.close()
+            conn = None
+        stop.wait(interval)
+    if conn is not None:
+        conn.close()
+
+
+def run(engine, phones, seconds, interval):
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "web_server.py"), "memory", str(PORT), "unused", engine],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT
+    )
+    try:
+        wait_until_up(PORT)
+        stop = threading.Event()
+        latencies, errors = [], []
+        clients = [
+            threading.Thread(target=phone, args=(PORT, stop, interval, latencies, errors), daemon=True)
+            for _ in range(phones)
+        ]
+        for client in clients:
+            client.start()
+        peak = 0
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            peak = max(peak, server_threads(server.pid) or 0)
+            time.sleep(0.2)
+        stop.set()
+        for client in clients:
+            client.join(15)
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    pick = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0
+    print(f"{engine:9} {len(latencies) / seconds:8.0f} req/s  p50 {pick(0.5):6.1f} ms  p99 {pick(0.99):7.1f} ms  "
+          f"max {pick(1):7.1f} ms  errors {len(errors):5}  server threads {peak or '?'}")
+
+
+def main():
+    phones = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    interval = (float(sys.argv[3]) if len(sys.argv) > 3 else 100) / 1000
+    print(f"{phones} phones polling every {interval * 1000:.0f} ms for {seconds:.0f} s")
+    for engine in ENGINES:
+        run(engine, phones, seconds, interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Raw-log compaction: fold old entries into one row per exercise and day
+"""
+
+import datetime
+import time
+from db import to_day
+
+CHUNK_DAYS = 90  # days folded per writer transaction, so live writes interleave
+
+
+def _fold_chunk(first, last, archive, report):
+    """Writer op: collapse every multi-entry (exercise, day) in [first, last] to one row
+
+    The folded row keeps the device and seq of the day's latest entry
+    (bare columns next to MAX), so sync orders it like that entry. The
+    change log is left alone: peers still receive the individual entries.
+    """
+    def op(conn):
+        conn.execute("DROP TABLE IF EXISTS temp.fold")
+        conn.execute('''
+            CREATE TEMP TABLE fold AS
+            SELECT exercise, day, SUM(count) AS total, MAX(ts) AS ts, device, seq, COUNT(*) AS rows
+            FROM pushups WHERE day BETWEEN ? AND ?
+            GROUP BY exercise, day HAVING COUNT(*) > 1
+        ''', (first, last))
+        if archive:
+            conn.execute('''
+                INSERT OR IGNORE INTO pushups_archive (id, exercise, day, ts, count)
+                SELECT id, exercise, day, ts, count FROM pushups
+                WHERE (exercise, day) IN (SELECT exercise, day FROM temp.fold)
+            ''')
+        days, rows = conn.execute("SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM temp.fold").fetchone()
+        conn.execute("DELETE FROM pushups WHERE (exercise, day) IN (SELECT exercise, day FROM temp.fold)")
+        conn.execute(
+            "INSERT INTO pushups (exercise, day, ts, count, device, seq) "
+            "SELECT exercise, day, ts, total, device, seq FROM temp.fold"
+        )
+        conn.execute("DROP TABLE temp.fold")
+        report["days_folded"] += days
+        report["rows_removed"] += rows - days
+        return ()  # day totals are unchanged, nothing to notify
+    return op
+
+
+def _reclaim(conn):
+    """Writer op: return free pages to the filesystem"""
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # Python's sqlite3 steps a no-result PRAGMA once, which frees a single page
+    for _ in range(free):
+        conn.execute("PRAGMA incremental_vacuum")
+    return ()
+
+
+def compact(manager, older_than_days=365, archive=False):
+    """Fold raw rows older than the cutoff through the writer; returns a report
+
+    Blocks until done, so run it off the UI thread.
+    """
+    started = time.perf_counter()
+    cutoff = to_day(datetime.date.today()) - older_than_days
+    with manager.read() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+        first = conn.execute("SELECT MIN(day) FROM pushups").fetchone()[0]
+
+    report = {"days_folded": 0, "rows_removed": 0}
+    if first is not None:
+        for start in range(first, cutoff, CHUNK_DAYS):
+            last = min(start + CHUNK_DAYS, cutoff) - 1
+            manager.writer.submit(_fold_chunk(start, last, archive, report)).result()
+
+    manager.writer.submit(_reclaim).result()
+    with manager.read() as conn:
+        pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    report["bytes_reclaimed"] = max(pages_before - pages_after, 0) * page_size
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def describe(report):
+    return (f"Compacted {report['days_folded']} days ({report['rows_removed']} rows removed), "
+            f"reclaimed {report['bytes_reclaimed'] / 1024:.0f} KB in {report['seconds']} s")
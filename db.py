@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite connection management for the tracker and the web server
+"""
+
+import datetime
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote
+
+BUSY_TIMEOUT = 5.0  # seconds a connection waits on a lock before failing
+
+# Applied to every connection we open
+PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",   # safe with WAL, no fsync per commit
+    "PRAGMA cache_size = -8000",     # ~8 MB page cache
+    "PRAGMA mmap_size = 67108864",   # 64 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class ConnectionManager:
+    """Pools tuned read-write and read-only connections for one database file"""
+
+    def __init__(self, db_path, pool_size=4):
+        self.db_path = Path(db_path)
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._idle = {False: [], True: []}  # readonly flag -> idle connections
+        self._wal_ready = False
+        self._writer = None
+
+    @property
+    def writer(self):
+        """The single WriteQueue all writes to this file go through"""
+        with self._lock:
+            if self._writer is None:
+                self._writer = WriteQueue(self)
+            return self._writer
+
+    def _open(self, readonly):
+        if readonly:
+            uri = f"file:{quote(str(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _ensure_wal(self):
+        """Switch the file to WAL once; the setting is persistent"""
+        if self._wal_ready:
+            return
+        conn = self._open(readonly=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        with self._lock:
+            self._wal_ready = True
+        self._release(conn, readonly=False)
+
+    def _acquire(self, readonly):
+        self._ensure_wal()
+        with self._lock:
+            idle = self._idle[readonly]
+            if idle:
+                return idle.pop()
+        return self._open(readonly)
+
+    def _release(self, conn, readonly):
+        with self._lock:
+            idle = self._idle[readonly]
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def read(self):
+        """Borrow a read-only connection"""
+        conn = self._acquire(readonly=True)
+        try:
+            yield conn
+        finally:
+            self._release(conn, readonly=True)
+
+    @contextmanager
+    def write(self):
+        """Borrow a read-write connection wrapped in a transaction"""
+        conn = self._acquire(readonly=False)
+        try:
+            with conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            self._release(conn, readonly=False)
+
+    def close(self):
+        """Close every idle pooled connection"""
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle = {False: [], True: []}
+        for pool in pools:
+            for conn in pool:
+                conn.close()
+
+
+class WriteQueue:
+    """Dedicated writer thread that group-commits queued write operations
+
+    An operation is a callable taking a connection and returning the
+    (user, exercise, datetime.date) triples it touched. Everything waiting in the queue when the writer wakes
+    up is applied in one transaction, each operation inside its own
+    savepoint so a failing one does not take the rest of the batch down.
+    """
+
+    def __init__(self, manager, maxsize=256, max_batch=64):
+        self.manager = manager
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize)
+        self._listeners = []
+        self._hooks = []
+        self._closing = threading.Lock()
+        self.closed = False
+        self.commits = 0
+        self.version = 0  # moves once a commit's listeners have all run, see Storage.data_version
+        self.last_batch_size = 0
+        self.last_commit_ms = 0.0
+        self.avg_commit_ms = 0.0
+        self.last_commit_at = 0.0  # time.time() of the last commit
+        self._thread = threading.Thread(target=self._run, name="pushtimer-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth,
+            "commits": self.commits,
+            "last_batch_size": self.last_batch_size,
+            "last_commit_ms": round(self.last_commit_ms, 2),
+            "avg_commit_ms": round(self.avg_commit_ms, 2),
+        }
+
+    def add_listener(self, listener, local_only=False):
+        """Call listener({user: {exercise: {date: total}}}) on the writer thread after each commit
+
+        total is None for a day left without any entries of that exercise.
+        A local_only listener does not hear of days only touch() reported,
+        so it can pass this process's writes on without echoing others'.
+        """
+        self._listeners.append((listener, local_only))
+
+    def add_hook(self, hook):
+        """Call hook(conn, {user: {exercise: {date: total}}}) inside each write transaction
+
+        Hooks keep derived tables in step with the log. Each runs in its own
+        savepoint; a failing hook is rolled back and logged without losing
+        the batch, and its listener is expected to notice and recover.
+        """
+        self._hooks.append(hook)
+
+    def touch(self, keys):
+        """Run hooks and listeners for (user, exercise, date) days another process changed
+
+        For a second process writing the same database (see web_process.py):
+        the days' totals are re-read in a write transaction of their own, so
+        derived tables and caches catch up exactly as after a local write.
+        """
+        keys = list(keys)
+        def op(conn):
+            return keys
+        op.remote = True
+        return self.submit(op)
+
+    def submit(self, op, callback=None):
+        """Queue a write and return a Future resolved once it is committed
+
+        Never blocks, so it is safe on the UI thread: with the queue full
+        (the writer far behind) or after close(), the Future fails at once
+        with RuntimeError instead.
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        error = None
+        with self._closing:
+            if self.closed:
+                error = RuntimeError("The writer is closed")
+            else:
+                try:
+                    self._queue.put_nowait((op, future))
+                except queue.Full:
+                    error = RuntimeError(f"The writer is busy ({self._queue.maxsize} writes queued)")
+        if error is not None:
+            future.set_exception(error)  # outside the lock: callbacks run right here
+        return future
+
+    def close(self, timeout=BUSY_TIMEOUT):
+        """Commit everything still queued, then stop the writer thread"""
+        with self._closing:
+            if self.closed:
+                return
+            self.closed = True  # nothing is queued after this, so the stop below comes last
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                print("Writer did not drain its queue in time; stopping without the rest")
+                return
+        self._thread.join(timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _run_hooks(self, conn, changes):
+        for hook in self._hooks:
+            conn.execute("SAVEPOINT hook")
+            try:
+                hook(conn, changes)
+                conn.execute("RELEASE hook")
+            except Exception as e:
+                conn.execute("ROLLBACK TO hook")
+                conn.execute("RELEASE hook")
+                print(f"Write hook failed: {e}")
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        results = []
+        touched = set()
+        local = set()  # touched by this process's own writes
+        conn = self.manager._acquire(readonly=False)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, future in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    keys = op(conn) or ()
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((future, None, e))
+                    continue
+                touched.update(keys)
+                if not getattr(op, "remote", False):
+                    local.update(keys)
+                results.append((future, keys, None))
+            changes = day_totals(conn, touched)
+            if changes:
+                self._run_hooks(conn, changes)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self.manager._release(conn, readonly=False)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.commits += 1
+        self.last_batch_size = len(batch)
+        self.last_commit_ms = elapsed
+        self.avg_commit_ms += (elapsed - self.avg_commit_ms) / min(self.commits, 100)
+        self.last_commit_at = time.time()
+
+        for future, keys, error in results:
+            if error is None:
+                future.set_result(keys)
+            else:
+                future.set_exception(error)
+
+        if changes:
+            local_changes = changes if local == touched else None
+            for listener, local_only in self._listeners:
+                if local_only:
+                    if local_changes is None:
+                        local_changes = day_totals_subset(changes, local)
+                    if not local_changes:
+                        continue
+                try:
+                    listener(local_changes if local_only else changes)
+                except Exception as e:
+                    print(f"Write listener failed: {e}")
+            self.version += 1
+
+
+# --- Storage encoding: integer days since 1970-01-01, milliseconds since the epoch ---
+
+DEFAULT_EXERCISE = "pushups"  # what entries logged before the exercise dimension are
+DEFAULT_USER = "default"      # whose entries those logged before the user dimension are
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def to_day(date):
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def from_day(day):
+    return datetime.date.fromordinal(day + EPOCH_ORDINAL)
+
+
+def to_ms(moment):
+    """Milliseconds since the epoch for a (naive, local) datetime"""
+    return int(moment.timestamp() * 1000)
+
+
+def from_ms(ms):
+    return datetime.datetime.fromtimestamp(ms / 1000)
+
+
+def rebuild_daily_totals(conn):
+    """Recompute daily_totals from the raw log; returns the number of (exercise, day) rows"""
+    conn.execute("DELETE FROM daily_totals")
+    conn.execute('''
+        INSERT INTO daily_totals (exercise, day, total, entries, last_ts)
+        SELECT exercise, day, SUM(count), COUNT(*), MAX(ts) FROM pushups GROUP BY exercise, day
+    ''')
+    return conn.execute("SELECT COUNT(*) FROM daily_totals").fetchone()[0]
+
+
+# --- Users and exercises: names in the API, small integer ids in the tables ---
+#
+# An exercises row is one user's exercise, so every table keyed by exercise id
+# (daily_totals, streaks, day_resets...) is per user without a user column.
+
+USER_ID_SQL = "(SELECT id FROM users WHERE name = ?)"
+EXERCISE_ID_SQL = f"(SELECT id FROM exercises WHERE name = ? AND user = {USER_ID_SQL})"  # (exercise, user)
+
+
+def user_id(conn, name, create=False):
+    """Id for a user name, registering it if create is set (else None when unknown)"""
+    if create:
+        conn.execute("INSERT OR IGNORE INTO users (name) VALUES (?)", (name,))
+    row = conn.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def exercise_id(conn, name, create=False, user=DEFAULT_USER):
+    """Id for a user's exercise, registering both if create is set (else None when unknown)"""
+    if create:
+        conn.execute("INSERT OR IGNORE INTO exercises (user, name) VALUES (?, ?)",
+                     (user_id(conn, user, create=True), name))
+    row = conn.execute(f"SELECT id FROM exercises WHERE id = {EXERCISE_ID_SQL}", (name, user)).fetchone()
+    return row[0] if row else None
+
+
+def list_exercises(conn, user=DEFAULT_USER):
+    """A user's exercise names in the order they were first logged"""
+    return [name for (name,) in conn.execute(
+        f"SELECT name FROM exercises WHERE user = {USER_ID_SQL} ORDER BY id", (user,)
+    )]
+
+
+def list_users(conn):
+    """User names in the order they first logged anything"""
+    return [name for (name,) in conn.execute("SELECT name FROM users ORDER BY id")]
+
+
+# --- Range reads, answered from daily_totals (clustered on day) or idx_day_ts_count ---
+
+# SQL expression mapping a day to the first day of its period
+PERIODS = {
+    "day": "day",
+    "week": "(day + 3) / 7 * 7 - 3",  # epoch day 0 is a Thursday; weeks start Monday
+    "month": "CAST(strftime('%s', day * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400",
+    "year": "CAST(strftime('%s', day * 86400, 'unixepoch', 'start of year') AS INTEGER) / 86400",
+}
+
+
+def _day_bounds(start, end):
+    return (
+        -(2 ** 31) if start is None else to_day(start),
+        2 ** 31 if end is None else to_day(end),
+    )
+
+
+def _range_cursor(conn, start, end, granularity, exercise, user):
+    period = PERIODS[granularity]
+    return conn.execute(
+        f"SELECT {period} AS period, SUM(total) FROM daily_totals "
+        f"WHERE exercise = {EXERCISE_ID_SQL} AND day BETWEEN ? AND ? GROUP BY period ORDER BY period",
+        (exercise, user, *_day_bounds(start, end))
+    )
+
+
+def query_range(conn, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """[(period start date, total)] for periods with entries between start and end"""
+    rows = _range_cursor(conn, start, end, granularity, exercise, user)
+    return [(from_day(period), total) for period, total in rows]
+
+
+def iter_range(manager, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER,
+               chunk=1000):
+    """Like query_range, but yields rows off the cursor without building a list"""
+    with manager.read() as conn:
+        cursor = _range_cursor(conn, start, end, granularity, exercise, user)
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            for period, total in rows:
+                yield from_day(period), total
+
+
+def day_bounds(conn, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """(first, last) logged date, or None when the exercise has no entries"""
+    first, last = conn.execute(
+        f"SELECT MIN(day), MAX(day) FROM daily_totals WHERE exercise = {EXERCISE_ID_SQL}", (exercise, user)
+    ).fetchone()
+    return None if first is None else (from_day(first), from_day(last))
+
+
+def iter_entries(manager, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER, chunk=1000):
+    """Yield (datetime, count) for each raw log entry between start and end"""
+    with manager.read() as conn:
+        cursor = conn.execute(
+            f"SELECT ts, count FROM pushups WHERE exercise = {EXERCISE_ID_SQL} "
+            f"AND day BETWEEN ? AND ? ORDER BY day, ts",
+            (exercise, user, *_day_bounds(start, end))
+        )
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            for ts, count in rows:
+                yield from_ms(ts), count
+
+
+def iter_raw(manager, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER, chunk=5000):
+    """Yield (epoch day, epoch ms, count) per raw entry, undecoded, for bulk consumers"""
+    with manager.read() as conn:
+        cursor = conn.execute(
+            f"SELECT day, ts, count FROM pushups WHERE exercise = {EXERCISE_ID_SQL} "
+            f"AND day BETWEEN ? AND ? ORDER BY day, ts",
+            (exercise, user, *_day_bounds(start, end))
+        )
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            yield from rows
+
+
+def day_totals(conn, keys):
+    """{user: {exercise: {date: total}}} for (user, exercise, date) triples (None if a day has no entries)"""
+    totals = {}
+    for user, exercise, date in keys:
+        row = conn.execute(
+            f"SELECT total FROM daily_totals WHERE exercise = {EXERCISE_ID_SQL} AND day = ?",
+            (exercise, user, to_day(date))
+        ).fetchone()
+        totals.setdefault(user, {}).setdefault(exercise, {})[date] = row[0] if row else None
+    return totals
+
+
+def day_totals_subset(changes, keys):
+    """The part of a day_totals() dict covering the given (user, exercise, date) triples"""
+    subset = {}
+    for user, exercise, date in keys:
+        if date in changes.get(user, {}).get(exercise, {}):
+            subset.setdefault(user, {}).setdefault(exercise, {})[date] = changes[user][exercise][date]
+    return subset
+
+
+# --- Change log: every write as (device, seq), for delta sync between databases ---
+
+APPEND, RESET = 1, 2  # a RESET replaces the entries of its day that it is ordered after
+
+
+def local_device(conn):
+    """(id, uuid) of the device this database writes as"""
+    return conn.execute("SELECT id, uuid FROM devices WHERE local = 1").fetchone()
+
+
+def new_device(conn):
+    """Write as a fresh device from now on (after a restore rewound this device's log)"""
+    conn.execute("UPDATE devices SET local = 0 WHERE local = 1")
+    conn.execute("INSERT INTO devices (uuid, local) VALUES (?, 1)", (uuid.uuid4().hex,))
+    return local_device(conn)
+
+
+def device_id(conn, device_uuid):
+    """Id for a device uuid, registering a peer's device on first sight"""
+    conn.execute("INSERT OR IGNORE INTO devices (uuid, local) VALUES (?, 0)", (device_uuid,))
+    return conn.execute("SELECT id FROM devices WHERE uuid = ?", (device_uuid,)).fetchone()[0]
+
+
+def last_seq(conn, device):
+    """Highest sequence number logged for a device, 0 if none"""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes WHERE device = ?", (device,)).fetchone()[0]
+
+
+def apply_change(conn, device, seq, op, exercise, day, ts, count):
+    """Log a change and apply it to the entries; False if it was already logged
+
+    Entries are ordered by (ts, device uuid, seq). A RESET deletes the
+    entries of its day ordered before it and becomes that day's
+    watermark; a change ordered before the watermark is logged but not
+    applied. Replicas holding the same changes therefore hold the same
+    entries, whatever order the changes arrived in.
+    """
+    logged = conn.execute(
+        "INSERT OR IGNORE INTO changes (device, seq, op, exercise, day, ts, count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (device, seq, op, exercise, day, ts, count)
+    ).rowcount
+    if not logged:
+        return False
+    key = (ts, conn.execute("SELECT uuid FROM devices WHERE id = ?", (device,)).fetchone()[0], seq)
+    mark = conn.execute(
+        "SELECT r.ts, d.uuid, r.seq FROM day_resets AS r JOIN devices AS d ON d.id = r.device "
+        "WHERE r.exercise = ? AND r.day = ?",
+        (exercise, day)
+    ).fetchone()
+    if mark is not None and tuple(mark) > key:
+        return True
+    if op == RESET:
+        conn.execute(
+            "DELETE FROM pushups WHERE exercise = ? AND day = ? "
+            "AND (ts, (SELECT uuid FROM devices WHERE id = pushups.device), seq) < (?, ?, ?)",
+            (exercise, day, *key)
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO day_resets (exercise, day, ts, device, seq) VALUES (?, ?, ?, ?, ?)",
+            (exercise, day, ts, device, seq)
+        )
+    conn.execute(
+        "INSERT INTO pushups (exercise, day, ts, count, device, seq) VALUES (?, ?, ?, ?, ?, ?)",
+        (exercise, day, ts, count, device, seq)
+    )
+    return True
+
+
+# --- Write operations, applied on the writer thread ---
+
+def insert_entry(date, count, moment, replace=False, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Append a log entry, optionally replacing the rest of that day's entries of the user's exercise"""
+    day = to_day(date)
+    def op(conn):
+        ex = exercise_id(conn, exercise, create=True, user=user)
+        device = local_device(conn)[0]
+        apply_change(conn, device, last_seq(conn, device) + 1, RESET if replace else APPEND,
+                     ex, day, to_ms(moment), count)
+        return [(user, exercise, date)]
+    return op
+
+
+def set_day_total(date, count, moment, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Collapse a day into a single entry with the given count"""
+    return insert_entry(date, count, moment, replace=True, exercise=exercise, user=user)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path):
+    """Return the process-wide manager for a database file"""
+    key = str(Path(db_path).resolve())
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(db_path)
+        return manager
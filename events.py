@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Live change events for phones: one broadcaster per store, fanned out to Server-Sent Events streams
+"""
+
+import asyncio
+import collections
+import datetime
+import json
+import threading
+import time
+
+HEARTBEAT_SECONDS = 15  # a comment line this often keeps NAT and proxies from dropping idle streams
+BLOCKING_STREAM_SECONDS = 25  # streams holding a server thread end this soon; the browser reconnects
+BACKLOG = 256  # recent events kept for clients reconnecting with Last-Event-ID
+RETRY_MS = 3000
+
+
+def _encode(seq, kind, data):
+    return f"id: {seq}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+class Broadcaster:
+    """Turns each commit into one numbered event and wakes every stream waiting for it
+
+    The writer listener encodes an event once, whatever the number of
+    clients, and keeps the last BACKLOG of them so a reconnecting phone
+    catches up from its Last-Event-ID. Streams never query the store.
+    Waiters on an asyncio loop share a single future per loop, so a commit
+    costs one call_soon_threadsafe per loop rather than one per phone;
+    blocking waiters (other web engines) share a Condition.
+    """
+
+    def __init__(self, storage):
+        self.store = storage
+        self.seq = int(time.time() * 1000)  # ids from an earlier run of the server are always behind
+        self.streams = 0
+        self._events = collections.deque(maxlen=BACKLOG)  # (seq, encoded)
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._futures = {}  # asyncio loop -> future resolved at the next event
+        storage.add_listener(self._changed)
+
+    def _changed(self, changes):
+        """Writer listener: publish the new day totals"""
+        self.publish("change", {
+            "today": datetime.date.today().isoformat(),
+            "changes": [
+                {"user": user, "exercise": exercise, "date": date.isoformat(), "total": total or 0}
+                for user, exercises in changes.items()
+                for exercise, days in exercises.items()
+                for date, total in sorted(days.items())
+            ],
+        })
+
+    def load(self):
+        """Called by reload_shared(): what changed is unknown, so tell every client to refetch"""
+        self.publish("reset", {"today": datetime.date.today().isoformat()})
+
+    def publish(self, kind, data):
+        with self._lock:
+            self.seq += 1
+            self._events.append((self.seq, _encode(self.seq, kind, data)))
+            self._condition.notify_all()
+            futures, self._futures = self._futures, {}
+        for loop, future in futures.items():
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:  # that loop has closed
+                pass
+
+    def since(self, seq):
+        """Encoded events after seq, or None when some have already left the backlog"""
+        with self._lock:
+            if seq > self.seq:  # numbered by an earlier run of the server
+                return None
+            if seq < self.seq and (not self._events or self._events[0][0] > seq + 1):
+                return None
+            return [encoded for n, encoded in self._events if n > seq]
+
+    def _future(self, loop):
+        with self._lock:
+            future = self._futures.get(loop)
+            if future is None:
+                future = self._futures[loop] = loop.create_future()
+            return future, self.seq
+
+    def stream(self, last_id=None):
+        return EventStream(self, last_id)
+
+    def stats(self):
+        return {"seq": self.seq, "streams": self.streams}
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class EventStream:
+    """The body of one text/event-stream response
+
+    Iterated asynchronously by the asyncio web server, a waiting stream
+    is a suspended coroutine and costs no thread. Other servers iterate
+    it normally, which holds one of their threads, so those streams end
+    after BLOCKING_STREAM_SECONDS and the browser reconnects where it left
+    off.
+    """
+
+    def __init__(self, broadcaster, last_id=None):
+        self.broadcaster = broadcaster
+        self.seq = broadcaster.seq if last_id is None else last_id
+        self._opening = [b"retry: %d\n\n" % RETRY_MS]
+        if last_id is not None:
+            self._opening += self._catch_up()
+
+    def _catch_up(self):
+        missed = self.broadcaster.since(self.seq)
+        self.seq = self.broadcaster.seq
+        if missed is None:
+            return [_encode(self.seq, "reset", {"today": datetime.date.today().isoformat()})]
+        return missed
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        with self.broadcaster._lock:
+            self.broadcaster.streams += 1
+        try:
+            yield b"".join(self._opening)
+            while True:
+                future, seq = self.broadcaster._future(loop)
+                if seq == self.seq:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(future), HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield b": ping\n\n"
+                        continue
+                yield b"".join(self._catch_up())
+        finally:
+            with self.broadcaster._lock:
+                self.broadcaster.streams -= 1
+
+    def __iter__(self):
+        broadcaster = self.broadcaster
+        ends = time.monotonic() + BLOCKING_STREAM_SECONDS
+        with broadcaster._lock:
+            broadcaster.streams += 1
+        try:
+            yield b"".join(self._opening)
+            while time.monotonic() < ends:
+                with broadcaster._condition:
+                    broadcaster._condition.wait_for(
+                        lambda: broadcaster.seq != self.seq, min(HEARTBEAT_SECONDS, ends - time.monotonic())
+                    )
+                    changed = broadcaster.seq != self.seq
+                yield b"".join(self._catch_up()) if changed else b": ping\n\n"
+        finally:
+            with broadcaster._lock:
+                broadcaster.streams -= 1
+
+
+def get_broadcaster(storage):
+    """The change Broadcaster shared by everything using this store"""
+    return storage.shared("events", Broadcaster)
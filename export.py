@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Streaming export of raw entries or period rollups as CSV or JSON Lines
+"""
+
+import csv
+import io
+import json
+import zlib
+from db import DEFAULT_EXERCISE, DEFAULT_USER, from_day, from_ms
+
+FORMATS = ("csv", "jsonl")
+# level -> (first column, storage granularity; None = raw entries, which also carry their date:
+# an edit of a past day is stamped with the time of the edit, not a time on that day)
+LEVELS = {
+    "raw": ("timestamp", None),
+    "day": ("date", "day"),
+    "week": ("week", "week"),
+    "month": ("month", "month"),
+}
+CHUNK_ROWS = 500  # rows encoded per yielded chunk
+
+
+def iter_rows(store, level="day", start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Yield (date, first column value, count) straight off the store's cursor"""
+    column, granularity = LEVELS[level]
+    if granularity is None:
+        for day, ms, count in store.iter_raw(start, end, exercise, user):
+            yield from_day(day), from_ms(ms).isoformat(timespec="seconds"), count
+    else:
+        for date, total in store.iter_range(start, end, granularity, exercise, user):
+            yield date, date.isoformat(), total
+
+
+def _encode(rows, fmt, column):
+    """Yield text chunks of CHUNK_ROWS encoded rows, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    dated = column == "timestamp"  # raw entries: the timestamp alone may not tell the day
+    if fmt == "csv":
+        writer.writerow([column.capitalize(), "Date", "Count"] if dated else [column.capitalize(), "Count"])
+    n = 0
+    for date, value, count in rows:
+        if fmt == "csv":
+            writer.writerow([value, date.isoformat(), count] if dated else [value, count])
+        elif dated:
+            buffer.write(json.dumps({column: value, "date": date.isoformat(), "count": count}) + "\n")
+        else:
+            buffer.write(json.dumps({column: value, "count": count}) + "\n")
+        n += 1
+        if n % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _progress_rows(rows, bounds, progress):
+    """Pass rows through, reporting the percentage of the date span covered"""
+    first, last = bounds
+    span = max((last - first).days, 1)
+    reported = -1
+    for row in rows:
+        percent = min(100, max(0, (row[0] - first).days * 100 // span))
+        if percent != reported:
+            progress(percent)
+            reported = percent
+        yield row
+
+
+def _span(store, start, end, exercise, user):
+    bounds = store.bounds(exercise, user)
+    if bounds is None:
+        return None
+    first = max(bounds[0], start) if start else bounds[0]
+    last = min(bounds[1], end) if end else bounds[1]
+    return first, last
+
+
+def export_chunks(store, fmt="csv", level="day", start=None, end=None, compress=False, progress=None,
+                  exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Yield one exercise's export as bytes chunks in constant memory, gzip-compressed if asked
+
+    progress(percent) is called as the export moves through the date range.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    if level not in LEVELS:
+        raise ValueError(f"Unknown export level {level!r} (expected one of {', '.join(LEVELS)})")
+
+    rows = iter_rows(store, level, start, end, exercise, user)
+    if progress:
+        span = _span(store, start, end, exercise, user)
+        if span:
+            rows = _progress_rows(rows, span, progress)
+    gz = zlib.compressobj(wbits=31) if compress else None  # 31 = gzip container
+    for text in _encode(rows, fmt, LEVELS[level][0]):
+        data = text.encode("utf-8")
+        if gz:
+            data = gz.compress(data)
+        if data:
+            yield data
+    if gz:
+        yield gz.flush()
+    if progress:
+        progress(100)
+
+
+def export_to_file(store, file_path, fmt="csv", level="day", start=None, end=None, compress=False, progress=None,
+                   exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Stream an export to file_path; returns the number of bytes written"""
+    written = 0
+    with open(file_path, "wb") as f:
+        for chunk in export_chunks(store, fmt, level, start, end, compress, progress, exercise, user):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def guess_options(file_path):
+    """(format, compress) from a file name like history.jsonl.gz"""
+    name = str(file_path).lower()
+    compress = name.endswith(".gz")
+    if compress:
+        name = name[:-3]
+    return ("jsonl" if name.endswith((".jsonl", ".json")) else "csv"), compress
+
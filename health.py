@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Database health check: page-level integrity plus derived tables vs the raw log
+"""
+
+import time
+from db import rebuild_daily_totals
+from streaks import ISLANDS_SQL, rebuild_streaks
+
+# Rows of daily_totals that disagree with the raw log, in either direction
+TOTALS_DRIFT_SQL = '''
+    SELECT COUNT(*) FROM (
+        SELECT exercise, day, total, entries, last_ts FROM daily_totals
+        EXCEPT
+        SELECT exercise, day, SUM(count), COUNT(*), MAX(ts) FROM pushups GROUP BY exercise, day
+    ) UNION ALL SELECT COUNT(*) FROM (
+        SELECT exercise, day, SUM(count), COUNT(*), MAX(ts) FROM pushups GROUP BY exercise, day
+        EXCEPT
+        SELECT exercise, day, total, entries, last_ts FROM daily_totals
+    )
+'''
+
+STREAKS_DRIFT_SQL = f'''
+    SELECT COUNT(*) FROM (
+        SELECT exercise, start, end, length FROM streaks EXCEPT {ISLANDS_SQL}
+    ) UNION ALL SELECT COUNT(*) FROM (
+        {ISLANDS_SQL} EXCEPT SELECT exercise, start, end, length FROM streaks
+    )
+'''
+
+
+def quick_check(conn):
+    """[] when the file is sound, else SQLite's list of problems"""
+    rows = [row[0] for row in conn.execute("PRAGMA quick_check")]
+    return [] if rows == ["ok"] else rows
+
+
+def _repair(actions):
+    """Writer op applying the repairs; returns no dates, callers reload their caches"""
+    def op(conn):
+        if "reindex" in actions:
+            conn.execute("REINDEX")
+        if "daily_totals" in actions:
+            rebuild_daily_totals(conn)
+        if "streaks" in actions or "daily_totals" in actions:  # streaks derive from the totals
+            rebuild_streaks(conn)
+        return ()
+    return op
+
+
+def check(manager, repair=True):
+    """Verify the database and, if asked, fix what can be fixed; returns a report
+
+    Index damage is repaired with REINDEX, drifted daily_totals or streaks
+    are rebuilt from the raw log. Damage to the tables themselves cannot be
+    repaired here and stays in report["problems"].
+    """
+    began = time.perf_counter()
+    report = {"problems": [], "repaired": []}
+    with manager.read() as conn:
+        integrity = quick_check(conn)
+        totals_drift = sum(n for (n,) in conn.execute(TOTALS_DRIFT_SQL)) if not integrity else 0
+        streaks_drift = sum(n for (n,) in conn.execute(STREAKS_DRIFT_SQL)) if not integrity else 0
+
+    actions = []
+    if integrity:
+        report["problems"] += integrity[:10]
+        actions.append("reindex")
+    if totals_drift:
+        report["problems"].append(f"daily_totals differs from the raw log on {totals_drift} row(s)")
+        actions.append("daily_totals")
+    if streaks_drift:
+        report["problems"].append(f"streaks differ from the daily totals on {streaks_drift} row(s)")
+        actions.append("streaks")
+
+    if repair and actions:
+        if integrity:
+            actions += ["daily_totals"]  # recount on top of the rebuilt indexes
+        failure = []
+        try:
+            manager.writer.submit(_repair(actions)).result()
+            report["repaired"] = actions
+        except Exception as e:
+            failure = [f"repair failed: {e}"]
+        with manager.read() as conn:
+            remaining = quick_check(conn)
+        report["problems"] = remaining[:10] + failure
+        if remaining:
+            report["problems"].append("the file is still damaged; restore a backup with `manage.py restore`")
+
+    report["ok"] = not report["problems"]
+    report["seconds"] = time.perf_counter() - began
+    return report
+
+
+def describe(report):
+    if report["ok"] and not report["repaired"]:
+        return f"Database check passed in {report['seconds']:.2f} s"
+    if report["ok"]:
+        return f"Database repaired ({', '.join(report['repaired'])}) in {report['seconds']:.2f} s"
+    return "Database problems: " + "; ".join(report["problems"])
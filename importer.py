@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Bulk import of CSV or JSON Lines history, deduplicated on (exercise, timestamp, count)
+"""
+
+import csv
+import datetime
+import gzip
+import json
+import pickle
+import tempfile
+import time
+from db import DEFAULT_EXERCISE, DEFAULT_USER, EPOCH_ORDINAL, APPEND, exercise_id, from_day, local_device, last_seq
+
+BATCH_ROWS = 10000  # rows per executemany into the staging table
+TIME_COLUMNS = ("timestamp", "datetime", "time", "date")
+
+
+def open_text(file_path):
+    """Open a history file for reading as text, transparently gunzipping"""
+    if str(file_path).endswith(".gz"):
+        return gzip.open(file_path, "rt", encoding="utf-8", newline="")
+    return open(file_path, encoding="utf-8", newline="")
+
+
+def guess_format(file_path):
+    name = str(file_path).lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return "jsonl" if name.endswith((".jsonl", ".json")) else "csv"
+
+
+def parse_moment(text):
+    """Naive local datetime from an ISO date or datetime string"""
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+    except ValueError:  # before Python 3.11: date-only strings, a trailing Z
+        text = text.strip()
+        if len(text) == 10:
+            return datetime.datetime.combine(datetime.date.fromisoformat(text), datetime.time())
+        moment = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def _csv_rows(lines, exercise):
+    """(exercise, time, count, date or None) per row; the exercise and date columns are optional"""
+    reader = csv.reader(lines)
+    header = [name.strip().lower() for name in next(reader, [])]
+    when = next((header.index(name) for name in TIME_COLUMNS if name in header), None)
+    if when is None or "count" not in header:
+        raise ValueError(f"CSV header needs a count column and one of: {', '.join(TIME_COLUMNS)}")
+    count = header.index("count")
+    date = header.index("date") if "date" in header and header.index("date") != when else None
+    if "exercise" not in header and date is None:
+        if (when, count) == (0, 1):  # our own single-exercise export layout
+            return ((exercise, *row[:2], None) if len(row) >= 2 else (None, None, None, None)
+                    for row in reader if row)
+        width = max(when, count)
+        return ((exercise, row[when], row[count], None) if len(row) > width else (None, None, None, None)
+                for row in reader if row)
+    name = header.index("exercise") if "exercise" in header else None
+    width = max(i for i in (when, count, name, date) if i is not None)
+    return ((row[name].strip() or exercise if name is not None else exercise, row[when], row[count],
+             row[date] if date is not None else None) if len(row) > width else (None, None, None, None)
+            for row in reader if row)
+
+
+def _jsonl_rows(lines, exercise):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            key = next(name for name in TIME_COLUMNS if name in item)
+            date = item.get("date") if key != "date" else None
+            yield item.get("exercise") or exercise, item[key], item["count"], date
+        except (ValueError, KeyError, TypeError, StopIteration, AttributeError):
+            yield None, None, None, None
+
+
+def iter_records(lines, fmt, report, exercise=DEFAULT_EXERCISE):
+    """Yield (exercise, epoch day, epoch ms, count) per readable row, counting the rest as skipped
+
+    Rows without an exercise column or key are taken as `exercise`. The
+    day is the row's date when it has one besides its time (raw exports:
+    an edit of a past day is stamped with when the edit was made).
+    """
+    rows = _csv_rows(lines, exercise) if fmt == "csv" else _jsonl_rows(lines, exercise)
+    read = skipped = 0
+    try:
+        for name, when, count, date in rows:
+            read += 1
+            try:
+                moment = parse_moment(when)
+                day = parse_moment(date).date() if date else moment.date()
+                count = int(count)
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            if not isinstance(name, str):
+                skipped += 1
+                continue
+            yield name, day.toordinal() - EPOCH_ORDINAL, int(moment.timestamp() * 1000), count
+    finally:
+        report["read"] += read
+        report["skipped"] += skipped
+
+
+def _batches(records):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def spool(records):
+    """Drain records into an anonymous temporary file; returns an iterator replaying them
+
+    Parsing, and for uploads reading the network, happens here on the
+    caller's thread. The store then consumes the spool inside its write
+    transaction at local disk speed, so a big file or a trickling upload
+    never holds up other writes.
+    """
+    f = tempfile.TemporaryFile()
+    try:
+        for batch in _batches(records):
+            pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return _unspool(f)
+
+
+def _unspool(f):
+    with f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def bulk_insert(records, report, user=DEFAULT_USER):
+    """Writer op: stage a user's records, insert the new ones, refresh their days' totals once
+
+    The per-row daily_totals triggers are dropped for the insert and put
+    back afterwards, all inside the writer's transaction, so a million-row
+    import costs one set-based aggregate pass instead of a million upserts.
+    records is consumed inside that transaction: pass a spool(), not a parser.
+    """
+    def op(conn):
+        # Keyed like idx_exercise_day_ts_count: duplicates within the file vanish on the
+        # way in and the insert below reads rows already in index order, with no sort
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS import_rows (exercise INTEGER, day INTEGER, ts INTEGER, "
+            "count INTEGER, PRIMARY KEY (exercise, day, ts, count)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS import_days ("
+            "exercise INTEGER, day INTEGER, PRIMARY KEY (exercise, day)) WITHOUT ROWID"
+        )
+        conn.execute("DELETE FROM temp.import_rows")
+        conn.execute("DELETE FROM temp.import_days")
+        ids = {}
+        def with_ids(records):
+            for name, day, ms, count in records:
+                ex = ids.get(name)
+                if ex is None:
+                    ex = ids[name] = exercise_id(conn, name, create=True, user=user)
+                yield ex, day, ms, count
+        for batch in _batches(with_ids(records)):
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.import_rows (exercise, day, ts, count) VALUES (?, ?, ?, ?)", batch
+            )
+        conn.execute("INSERT INTO temp.import_days SELECT DISTINCT exercise, day FROM temp.import_rows")
+
+        triggers = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'pushups'"
+        ).fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        # New rows are logged as this device's changes first (rows from before a later
+        # reset of their day would be superseded at once, so they are left out), then
+        # copied into the log from that contiguous run of sequence numbers
+        device, device_uuid = local_device(conn)
+        base = last_seq(conn, device)
+        conn.execute(f'''
+            INSERT INTO changes (device, seq, op, exercise, day, ts, count)
+            SELECT ?, ? + ROW_NUMBER() OVER (ORDER BY exercise, day, ts, count), {APPEND}, exercise, day, ts, count
+            FROM temp.import_rows AS i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM pushups AS p
+                WHERE p.exercise = i.exercise AND p.day = i.day AND p.ts = i.ts AND p.count = i.count
+            ) AND NOT EXISTS (
+                SELECT 1 FROM day_resets AS r
+                WHERE r.exercise = i.exercise AND r.day = i.day AND (r.ts > i.ts OR r.ts = i.ts
+                    AND (SELECT uuid FROM devices WHERE id = r.device) > ?)
+            )
+        ''', (device, base, device_uuid))
+        cursor = conn.execute(
+            "INSERT INTO pushups (exercise, day, ts, count, device, seq) "
+            "SELECT exercise, day, ts, count, device, seq FROM changes WHERE device = ? AND seq > ?",
+            (device, base)
+        )
+        report["inserted"] = cursor.rowcount
+        touched = "(exercise, day) IN (SELECT exercise, day FROM temp.import_days)"
+        conn.execute(f"DELETE FROM daily_totals WHERE {touched}")
+        conn.execute(f'''
+            INSERT INTO daily_totals (exercise, day, total, entries, last_ts)
+            SELECT exercise, day, SUM(count), COUNT(*), MAX(ts) FROM pushups
+            WHERE {touched} GROUP BY exercise, day
+        ''')
+        for _, sql in triggers:
+            conn.execute(sql)
+
+        names = {ex: name for name, ex in ids.items()}
+        days = [
+            (user, names[ex], from_day(day))
+            for ex, day in conn.execute("SELECT exercise, day FROM temp.import_days")
+        ]
+        conn.execute("DELETE FROM temp.import_rows")
+        conn.execute("DELETE FROM temp.import_days")
+        return days
+    return op
+
+
+def import_lines(store, lines, fmt="csv", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Import an iterable of CSV or JSON Lines text lines as a user's entries; returns a report
+
+    Rows naming no exercise are logged as `exercise`.
+    """
+    report = {"read": 0, "inserted": 0, "skipped": 0, "duplicates": 0, "days": 0}
+    began = time.perf_counter()
+    records = spool(iter_records(lines, fmt, report, exercise))
+    report["days"] = len(store.import_entries(records, report, user))
+    report["duplicates"] = report["read"] - report["skipped"] - report["inserted"]
+    report["seconds"] = time.perf_counter() - began
+    return report
+
+
+def import_file(store, file_path, fmt=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Import a .csv/.jsonl file (optionally .gz); returns a report"""
+    with open_text(file_path) as f:
+        return import_lines(store, f, fmt or guess_format(file_path), exercise, user)
+
+
+def describe(report):
+    return (
+        f"Imported {report['inserted']} of {report['read']} rows across {report['days']} days "
+        f"({report['duplicates']} duplicates, {report['skipped']} unreadable) in {report['seconds']:.2f} s"
+    )
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Crash-safe journal of reminder events, replayed at startup
+
+A reminder on screen, snoozed, or answered a moment before the process
+died would otherwise be lost: the dialog lives only in Qt, and a logged
+set only exists once the writer commits it. Every step is appended here
+first, so the next start can put the reminder back on screen and log any
+set the store never committed.
+"""
+
+import datetime
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from db import DEFAULT_USER, to_ms, from_ms
+
+
+class ReminderJournal:
+    """Append-only binary journal of reminder events with batched fsyncs
+
+    The same discipline as LogStorage: an event is one small record
+    written and flushed to the OS (microseconds, never an fsync on the
+    caller's thread), and a background thread fsyncs at most once per
+    interval. A record is a fixed header, the exercise name (any length
+    the store accepts) and a CRC32 of both, so a torn or garbled tail is
+    detected and dropped on open. Only unresolved reminders matter, so
+    recover() rewrites the journal down to those.
+    """
+
+    MAGIC = b"PTJRN02\n"
+    BODY = struct.Struct("<BBIqiH")  # event, flags, reminder id, epoch ms, count, exercise name bytes
+    CRC = struct.Struct("<I")
+    FIRED, ACKNOWLEDGED, LOGGED, SKIPPED, SNOOZED, SAVED = 1, 2, 3, 4, 5, 6
+    REPLACE = 1  # flag: the set replaced the day's entries
+    # Version 1 records: the name NUL-padded to a fixed 32 bytes; read, then rewritten as version 2
+    MAGIC_V1 = b"PTJRN01\n"
+    BODY_V1 = struct.Struct("<BBIqi32s")
+
+    def __init__(self, path, fsync_interval=1.0):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.fsyncs = 0
+        self._lock = threading.Lock()
+        self._open = {}  # reminder id -> (event, flags, ms, count, exercise) of its latest event
+        self._next_id = 1
+        self._file = None
+        if self._replay():
+            self._rewrite()  # an old-format journal
+        else:
+            self._file = open(self.path, "ab")
+            if self._file.tell() == 0:
+                self._file.write(self.MAGIC)
+                self._file.flush()
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="pushtimer-journal-sync", daemon=True)
+        self._syncer.start()
+
+    def _replay(self):
+        """Fold the file's intact records into the open reminders; True if it is in the old format"""
+        if not self.path.exists():
+            return False
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if not data:
+            return False
+        if data.startswith(self.MAGIC_V1):
+            offset = self._replay_v1(data)
+        elif data.startswith(self.MAGIC):
+            offset = len(self.MAGIC)
+            while offset + self.BODY.size <= len(data):
+                event, flags, reminder, ms, count, length = self.BODY.unpack_from(data, offset)
+                end = offset + self.BODY.size + length
+                if end + self.CRC.size > len(data) or (
+                    self.CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end])
+                ):
+                    break
+                self._track(event, flags, reminder, ms, count, data[offset + self.BODY.size:end].decode("utf-8"))
+                offset = end + self.CRC.size
+        else:
+            raise ValueError(f"{self.path} is not a reminder journal")
+        if offset < len(data):
+            print(f"Dropping a torn {len(data) - offset}-byte tail of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        return data.startswith(self.MAGIC_V1)
+
+    def _replay_v1(self, data):
+        offset = len(self.MAGIC_V1)
+        size = self.BODY_V1.size + self.CRC.size
+        while offset + size <= len(data):
+            body = data[offset:offset + self.BODY_V1.size]
+            if self.CRC.unpack_from(data, offset + self.BODY_V1.size)[0] != zlib.crc32(body):
+                break
+            event, flags, reminder, ms, count, exercise = self.BODY_V1.unpack(body)
+            self._track(event, flags, reminder, ms, count, exercise.rstrip(b"\0").decode("utf-8"))
+            offset += size
+        return offset
+
+    def _record(self, event, flags, reminder, ms, count, exercise):
+        encoded = exercise.encode("utf-8")
+        if len(encoded) > 0xFFFF:
+            raise ValueError(f"Exercise name {exercise[:40]!r}... is too long for the journal")
+        body = self.BODY.pack(event, flags, reminder, ms, count, len(encoded)) + encoded
+        return body + self.CRC.pack(zlib.crc32(body))
+
+    def _track(self, event, flags, reminder, ms, count, exercise):
+        """Fold one event into the open reminders"""
+        if event in (self.ACKNOWLEDGED, self.SAVED):
+            self._open.pop(reminder, None)
+        else:
+            self._open[reminder] = (event, flags, ms, count, exercise)
+        self._next_id = max(self._next_id, reminder + 1)
+
+    def _append(self, event, reminder=None, ms=0, count=0, exercise="", flags=0):
+        with self._lock:
+            if reminder is None:
+                reminder = self._next_id
+            self._file.write(self._record(event, flags, reminder, ms, count, exercise))
+            self._file.flush()
+            self._track(event, flags, reminder, ms, count, exercise)
+        self._dirty.set()
+        return reminder
+
+    # --- Events ---
+
+    def fired(self, moment):
+        """A reminder went on screen; returns its id"""
+        return self._append(self.FIRED, ms=to_ms(moment))
+
+    def acknowledged(self, reminder):
+        """Dismissed without an answer"""
+        self._append(self.ACKNOWLEDGED, reminder)
+
+    def snoozed(self, reminder, until):
+        self._append(self.SNOOZED, reminder, to_ms(until))
+
+    def logged(self, reminder, count, exercise, moment, replace=False):
+        """A set about to be written (a skip when count is 0); returns the id to confirm with saved()
+
+        reminder is None for sets logged without a reminder.
+        """
+        event = self.LOGGED if count else self.SKIPPED
+        return self._append(event, reminder, to_ms(moment), count, exercise, self.REPLACE if replace else 0)
+
+    def saved(self, reminder):
+        """The set's write committed"""
+        self._append(self.SAVED, reminder)
+
+    def watch(self, reminder, future):
+        """Confirm a logged set once the store's Future for it succeeds"""
+        def done(f):
+            if f.exception() is None:
+                self.saved(reminder)
+        future.add_done_callback(done)
+
+    # --- Startup ---
+
+    def recover(self, store, user=DEFAULT_USER):
+        """Resolve what the last run left open; returns a report
+
+        Sets the store lacks are logged again (a set already committed is
+        recognised by its timestamp and count, so recovering twice is
+        harmless). A reminder left on screen or snoozed today is reported
+        in report["reopen"] as the time to show it again.
+        """
+        report = {"relogged": 0, "confirmed": 0, "reopen": None}
+        now = datetime.datetime.now()
+        with self._lock:
+            pending = sorted(self._open.items())
+        for reminder, (event, flags, ms, count, exercise) in pending:
+            moment = from_ms(ms)
+            if event in (self.LOGGED, self.SKIPPED):
+                date = moment.date()
+                if any(ts == ms and n == count for _, ts, n in store.iter_raw(date, date, exercise, user)):
+                    report["confirmed"] += 1
+                else:
+                    store.log(date, count, moment, bool(flags & self.REPLACE), exercise, user).result()
+                    report["relogged"] += 1
+            elif moment.date() == now.date():
+                due = max(moment, now) if event == self.SNOOZED else now
+                report["reopen"] = min(report["reopen"] or due, due)
+        with self._lock:
+            for reminder, _ in pending:
+                self._open.pop(reminder, None)
+            self._rewrite()
+        return report
+
+    def _rewrite(self):
+        """Replace the file with the still-open events (caller holds the lock)"""
+        if self._file is not None:
+            self._file.close()
+        fresh = self.path.with_name(self.path.name + ".new")
+        with open(fresh, "wb") as f:
+            f.write(self.MAGIC)
+            for reminder, (event, flags, ms, count, exercise) in sorted(self._open.items()):
+                f.write(self._record(event, flags, reminder, ms, count, exercise))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(fresh, self.path)
+        self._file = open(self.path, "ab")
+
+    # --- Durability ---
+
+    def _sync_loop(self):
+        while not self._closed.is_set():
+            self._dirty.wait()
+            if self._closed.wait(self.fsync_interval):
+                break
+            self._sync()
+
+    def _sync(self):
+        # Outside the lock so appends keep flowing; only recover() swaps the file, and it fsyncs its own
+        self._dirty.clear()
+        with self._lock:
+            f = self._file
+        try:
+            os.fsync(f.fileno())
+        except ValueError:  # closed by recover() meanwhile
+            return
+        self.fsyncs += 1
+
+    def close(self):
+        self._closed.set()
+        self._dirty.set()  # wake the syncer so it sees the close
+        self._syncer.join(self.fsync_interval + 1)
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def describe(report):
+    reopen = f", reminder due {report['reopen']:%H:%M}" if report["reopen"] else ""
+    return (f"Reminder journal: {report['relogged']} set(s) logged again, "
+            f"{report['confirmed']} already saved{reopen}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Team leaderboard: today's reps, this week's reps and the current streak of every user, kept ranked
+"""
+
+import bisect
+import datetime
+import threading
+from db import DEFAULT_EXERCISE
+from streaks import StreakEngines, get_streak_engine
+
+BOARDS = ("today", "week", "streak")
+
+
+class Leaderboard:
+    """Every user's score on each board for one exercise, held in rank order
+
+    Each board is a list of (-score, user) kept sorted. A write re-scores
+    only the users it touched, from the day totals the writer already
+    reports (a pop and an insort per board), so reading the top ten or a
+    user's rank costs the same with five users or five hundred. The week
+    runs Monday to today; the boards reload once the date moves on.
+    """
+
+    def __init__(self, storage, exercise=DEFAULT_EXERCISE):
+        self.store = storage
+        self.exercise = exercise
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._replay = None  # changes heard while a load was reading the store
+        storage.shared("streak_engines", StreakEngines)  # so streaks are updated before our listener runs
+        self.load()
+        storage.add_listener(self._changed)
+
+    def load(self):
+        """Score every user who has logged the exercise
+
+        The store is read without holding self._lock (MemoryStorage calls
+        listeners under its own lock); writes heard meanwhile are replayed
+        on top, which is safe because they carry absolute day totals.
+        """
+        with self._load_lock:
+            with self._lock:
+                self._replay = []
+            today = datetime.date.today()
+            monday = today - datetime.timedelta(days=today.weekday())
+            weeks = {}
+            for user in self.store.users():
+                if self.exercise in self.store.exercises(user):
+                    rows = self.store.day_range(monday, today, exercise=self.exercise, user=user)
+                    weeks[user] = {date: total for date, total in rows if total}
+            streaks = {user: get_streak_engine(self.store, self.exercise, user).current(today) for user in weeks}
+            with self._lock:
+                self.today, self.monday, self.weeks = today, monday, weeks
+                self.scores = {
+                    "today": {user: week.get(today, 0) for user, week in weeks.items()},
+                    "week": {user: sum(week.values()) for user, week in weeks.items()},
+                    "streak": streaks,
+                }
+                self.ranked = {
+                    board: sorted((-score, user) for user, score in scores.items())
+                    for board, scores in self.scores.items()
+                }
+                for touched in self._replay:
+                    self._update(touched)
+                self._replay = None
+
+    def _changed(self, changes):
+        """Writer listener: re-score the users whose days of this exercise changed"""
+        touched = [
+            (user, exercises[self.exercise]) for user, exercises in changes.items() if self.exercise in exercises
+        ]
+        if not touched:
+            return
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(touched)
+            if datetime.date.today() == self.today:  # otherwise the next read reloads
+                self._update(touched)
+
+    def _update(self, touched):
+        """Fold [(user, {date: total})] into the boards (caller holds the lock)"""
+        for user, days in touched:
+            week = self.weeks.setdefault(user, {})
+            for date, total in days.items():
+                if self.monday <= date <= self.today:
+                    if total:
+                        week[date] = total
+                    else:
+                        week.pop(date, None)
+            self._set("today", user, week.get(self.today, 0))
+            self._set("week", user, sum(week.values()))
+            self._set("streak", user, get_streak_engine(self.store, self.exercise, user).current(self.today))
+
+    def _set(self, board, user, score):
+        scores, ranked = self.scores[board], self.ranked[board]
+        old = scores.get(user)
+        if old == score:
+            return
+        if old is not None:
+            ranked.pop(bisect.bisect_left(ranked, (-old, user)))
+        bisect.insort(ranked, (-score, user))
+        scores[user] = score
+
+    def _current(self):
+        if datetime.date.today() != self.today:
+            self.load()
+
+    # --- Queries ---
+
+    def top(self, board="today", limit=10):
+        """[{"rank", "user", "score"}] best first; equal scores share a rank"""
+        self._current()
+        out = []
+        with self._lock:
+            for i, (negative, user) in enumerate(self.ranked[board][:limit]):
+                rank = out[-1]["rank"] if out and out[-1]["score"] == -negative else i + 1
+                out.append({"rank": rank, "user": user, "score": -negative})
+        return out
+
+    def rank(self, user, board="today"):
+        """{"rank", "score"} for one user, or None if they never logged the exercise"""
+        self._current()
+        with self._lock:
+            score = self.scores[board].get(user)
+            if score is None:
+                return None
+            return {"rank": bisect.bisect_left(self.ranked[board], (-score,)) + 1, "score": score}
+
+    def __len__(self):
+        with self._lock:
+            return len(self.scores["today"])
+
+
+def get_leaderboard(storage, exercise=DEFAULT_EXERCISE):
+    """The Leaderboard for an exercise shared by everything using this store"""
+    return storage.shared(("leaderboard", exercise), lambda store: Leaderboard(store, exercise))
@@ -6,16 +6,34 @@ Runs every 35 minutes, tracks pushups, shows heatmap
 
 import sys
 import json
-import sqlite3
+import time
 import datetime
+import threading
 from pathlib import Path
 from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
 from PySide6.QtCore import QTimer, Qt, Signal, QObject
 from PySide6.QtGui import QIcon, QAction, QPixmap, QPainter, QColor, QPen
 from ui.main_window import MainWindow
+from db import DEFAULT_EXERCISE, DEFAULT_USER
+from storage import open_storage, FILENAMES
+from series import DaySeries
+from compaction import describe
+from journal import ReminderJournal
+import journal
+import backup
+import health
+import sync
+from export import export_to_file
+from importer import import_file
+from streaks import get_streak_engine
+from stats_cache import get_aggregate_cache
+from analytics import get_analytics
+from rollups import get_rollups, series
 
 class PushupTracker(QObject):
     reminder_signal = Signal()
+    data_changed = Signal()  # emitted on the Qt thread after any committed write
+    health_checked = Signal(object)  # health report dict, from the startup check
     
     def __init__(self):
         super().__init__()
@@ -23,14 +41,22 @@ class PushupTracker(QObject):
         self.config_dir = Path.home() / ".config/pushtimer"
         self.db_path = self.app_dir / "pushups.db"
         self.config_path = self.config_dir / "config.json"
+        self.backup_dir = self.app_dir / "backups"
         
         # Create directories
         self.app_dir.mkdir(parents=True, exist_ok=True)
         self.config_dir.mkdir(parents=True, exist_ok=True)
         
         # Init
-        self.init_db()
         self.load_config()
+        self.init_db()
+        # Caches for every configured exercise up front, so none loads mid-write
+        for exercise in self.get_exercises():
+            get_streak_engine(self.store, exercise, self.user)
+            get_aggregate_cache(self.store, exercise, self.user)
+            get_rollups(self.store, exercise, self.user)
+        # Writer thread -> queued signal, so slots run on the Qt thread
+        self.store.add_listener(lambda changes: self.data_changed.emit())
         
         # Timer setup
         self.timer = QTimer()
@@ -38,21 +64,36 @@ class PushupTracker(QObject):
         self.is_paused = False
         self.reminder_time = self.config.get("timer_minutes", 35) * 60 * 1000
         
+        # Reminder events journaled before they take effect; the last run's leftovers are resolved now
+        self.journal = ReminderJournal(self.app_dir / "reminders.journal")
+        self.recover_reminders()
+        
+        # Background compaction, tried hourly and run once a day when idle
+        self.last_compaction = None
+        self.compaction_timer = QTimer()
+        self.compaction_timer.timeout.connect(self.compact_if_idle)
+        self.compaction_timer.start(60 * 60 * 1000)
+        
+        # Online snapshots, checked hourly and taken once backup_interval_hours have passed
+        self.backup_running = False
+        self.backup_timer = QTimer()
+        self.backup_timer.timeout.connect(self.backup_if_due)
+        self.backup_timer.start(60 * 60 * 1000)
+        QTimer.singleShot(60 * 1000, self.backup_if_due)
+        
+        # Delta sync with the web servers listed in sync_peers
+        self.sync_running = False
+        self.sync_timer = QTimer()
+        self.sync_timer.timeout.connect(self.sync_now)
+        self.sync_timer.start(self.config.get("sync_interval_minutes", 15) * 60 * 1000)
+        QTimer.singleShot(30 * 1000, self.sync_now)
+        
     def init_db(self):
-        """Initialize SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pushups (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                count INTEGER NOT NULL,
-                timestamp TEXT NOT NULL
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON pushups(date)')
-        conn.commit()
-        conn.close()
+        """Open the configured storage engine (SQLite migrates older schemas in place)"""
+        engine = self.config.get("storage_engine", "sqlite")
+        filename = FILENAMES.get(engine)
+        self.store_path = filename and self.app_dir / filename
+        self.store = open_storage(engine, self.store_path)
     
     def load_config(self):
         """Load or create default configuration"""
@@ -64,7 +105,24 @@ class PushupTracker(QObject):
             "start_minimized": True,
             "theme": "dark",
             "aggregate_mode": "add",
-            "sound_enabled": True
+            "sound_enabled": True,
+            "exercises": [DEFAULT_EXERCISE, "squats", "planks", "pullups"],
+            "user": DEFAULT_USER,
+            "storage_engine": "sqlite",
+            "compaction_enabled": True,
+            "compaction_age_days": 365,
+            "compaction_archive": False,
+            "backup_enabled": True,
+            "backup_interval_hours": 24,
+            "backup_keep": 7,
+            "sync_peers": [],
+            "sync_interval_minutes": 15,
+            "web_port": 8080,
+            "web_process": False,
+            "web_engine": "asyncio",
+            "web_threads": 8,
+            "web_connection_limit": 500,
+            "web_timeout_seconds": 30
         }
         
         if self.config_path.exists():
@@ -95,120 +153,222 @@ class PushupTracker(QObject):
     def show_reminder(self):
         self.reminder_signal.emit()
     
-    def save_pushups(self, count):
-        today = datetime.date.today().isoformat()
-        now = datetime.datetime.now().isoformat()
+    def recover_reminders(self):
+        """Log the sets the last run never saved and bring back a reminder it left open"""
+        try:
+            report = self.journal.recover(self.store, self.user)
+        except Exception as e:
+            print(f"Reminder journal recovery failed: {e}")
+            return
+        if report["relogged"] or report["confirmed"] or report["reopen"]:
+            print(journal.describe(report))
+        if report["reopen"]:
+            delay = (report["reopen"] - datetime.datetime.now()).total_seconds()
+            QTimer.singleShot(max(int(delay * 1000), 5000), self.show_reminder)
+    
+    def reminder_shown(self):
+        """Journal a reminder going on screen; returns its id for the answer"""
+        return self.journal.fired(datetime.datetime.now())
+    
+    def reminder_dismissed(self, reminder):
+        """The reminder closed without a set (cancelled, or its snooze ran out)"""
+        self.journal.acknowledged(reminder)
+    
+    def reminder_snoozed(self, reminder, minutes=5):
+        self.journal.snoozed(reminder, datetime.datetime.now() + datetime.timedelta(minutes=minutes))
+    
+    def close(self):
+        """Drain queued writes, then make the journal durable (on quit)"""
+        self.store.close()
+        self.journal.close()
+    
+    def compact_if_idle(self):
+        """Fold old raw rows once a day, when nothing was written for a while"""
+        today = datetime.date.today()
+        if not self.config.get("compaction_enabled", True) or self.last_compaction == today:
+            return
+        if self.store.pending or time.time() - self.store.last_write_at < 10 * 60:
+            return
+        self.last_compaction = today
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        def _run():
+            try:
+                report = self.store.compact(
+                    self.config.get("compaction_age_days", 365),
+                    self.config.get("compaction_archive", False)
+                )
+                if report is not None:
+                    print(describe(report))
+            except Exception as e:
+                print(f"Compaction failed: {e}")
         
-        if self.config.get("aggregate_mode") == "replace":
-            cursor.execute("DELETE FROM pushups WHERE date = ?", (today,))
+        threading.Thread(target=_run, daemon=True).start()
+    
+    def start_health_check(self):
+        """Check (and repair) the database on a worker thread; reports via health_checked"""
+        def _run():
+            try:
+                report = self.store.check_health()
+            except Exception as e:
+                report = {"ok": False, "problems": [f"health check failed: {e}"], "repaired": [], "seconds": 0}
+            if report is None:
+                return
+            print(health.describe(report))
+            if report["repaired"]:
+                self.data_changed.emit()
+            self.health_checked.emit(report)
         
-        cursor.execute(
-            "INSERT INTO pushups (date, count, timestamp) VALUES (?, ?, ?)",
-            (today, count, now)
-        )
-        conn.commit()
-        conn.close()
+        threading.Thread(target=_run, name="pushtimer-health", daemon=True).start()
+    
+    def backup_if_due(self):
+        """Snapshot the database on a background thread when the newest one is old enough"""
+        if not self.config.get("backup_enabled", True) or self.backup_running:
+            return
+        existing = backup.snapshots(self.backup_dir)
+        interval = self.config.get("backup_interval_hours", 24) * 3600
+        if existing and time.time() - existing[0].stat().st_mtime < interval:
+            return
+        self.backup_running = True
+        
+        def _run():
+            try:
+                report = self.store.backup(self.backup_dir, self.config.get("backup_keep", 7))
+                if report is not None:
+                    print(backup.describe(report))
+            except Exception as e:
+                print(f"Backup failed: {e}")
+            finally:
+                self.backup_running = False
+        
+        threading.Thread(target=_run, daemon=True).start()
+    
+    def sync_now(self):
+        """Exchange changes with every configured peer on a background thread"""
+        peers = self.config.get("sync_peers") or []
+        if not peers or not self.store.supports_sync or self.sync_running:
+            return
+        self.sync_running = True
+        
+        def _run():
+            try:
+                for peer in peers:
+                    try:
+                        print(sync.describe(sync.sync_with(self.store, peer)))
+                    except Exception as e:
+                        print(f"Sync with {peer} failed: {e}")
+            finally:
+                self.sync_running = False
+        
+        threading.Thread(target=_run, name="pushtimer-sync", daemon=True).start()
+    
+    @property
+    def user(self):
+        """Who this desktop logs as; the web server serves everyone else by name"""
+        return self.config.get("user") or DEFAULT_USER
+
+    def get_exercises(self):
+        """Configured exercises first, then any others found in the store"""
+        configured = self.config.get("exercises") or [DEFAULT_EXERCISE]
+        return configured + [name for name in self.store.exercises(self.user) if name not in configured]
+
+    def save_pushups(self, count, exercise=DEFAULT_EXERCISE, reminder=None):
+        """Queue a log entry for today, journaled until it commits; returns a Future for the commit
+
+        reminder is the id from reminder_shown() when answering a reminder.
+        """
+        today = datetime.date.today()
+        now = datetime.datetime.now()
+        replace = self.config.get("aggregate_mode") == "replace"
+        
+        try:
+            entry = self.journal.logged(reminder, count, exercise, now, replace)
+        except Exception as e:  # the set matters more than its crash insurance
+            print(f"Reminder journal failed, logging without it: {e}")
+            entry = None
+        future = self.store.log(today, count, now, replace, exercise, self.user)
+        if entry is not None:
+            self.journal.watch(entry, future)
         self.start_timer()
+        return future
     
-    def update_pushups_for_date(self, date_str, count):
-        now = datetime.datetime.now().isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM pushups WHERE date = ?", (date_str,))
-        cursor.execute(
-            "INSERT INTO pushups (date, count, timestamp) VALUES (?, ?, ?)",
-            (date_str, count, now)
-        )
-        conn.commit()
-        conn.close()
-        if date_str == datetime.date.today().isoformat():
+    def update_pushups_for_date(self, date_str, count, exercise=DEFAULT_EXERCISE):
+        """Queue an overwrite of one day's total; returns a Future for the commit"""
+        date = datetime.date.fromisoformat(date_str)
+        future = self.store.set_day(date, count, datetime.datetime.now(), exercise, self.user)
+        if date == datetime.date.today():
             self.start_timer()
+        return future
 
-    def get_today_total(self):
-        today = datetime.date.today().isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT SUM(count) FROM pushups WHERE date = ?", (today,))
-        result = cursor.fetchone()[0]
-        conn.close()
-        return result or 0
-    
-    def get_all_data(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT date, SUM(count) as total FROM pushups GROUP BY date ORDER BY date")
-        data = {row[0]: row[1] for row in cursor.fetchall()}
-        conn.close()
-        return data
+    def get_today_total(self, exercise=DEFAULT_EXERCISE):
+        today = datetime.date.today()
+        rows = self.get_range(today, today, exercise=exercise)
+        return rows[0][1] if rows else 0
+    
+    def get_all_data(self, exercise=DEFAULT_EXERCISE):
+        return {date.isoformat(): total for date, total in self.get_range(exercise=exercise)}
+
+    def get_range(self, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE):
+        """[(period start, total)] between two dates; granularity is day/week/month/year"""
+        return self.store.day_range(start, end, granularity, exercise, self.user)
+
+    def iter_entries(self, start=None, end=None, exercise=DEFAULT_EXERCISE):
+        """Yield (datetime, count) for every logged entry between two dates"""
+        return self.store.iter_entries(start, end, exercise, self.user)
+
+    def series(self, start=None, end=None, bucket="day", exercise=DEFAULT_EXERCISE):
+        """[(bucket start, total)] per day/week/month/year bucket, zero-filled; whole log by default"""
+        return series(self.store, start, end, bucket, exercise, self.user)
+
+    def get_series(self, start=None, end=None, exercise=DEFAULT_EXERCISE):
+        """Daily totals between two dates as a DaySeries"""
+        return DaySeries.from_dates(self.get_range(start, end, exercise=exercise))
+
+    def get_range_total(self, start, end, exercise=DEFAULT_EXERCISE):
+        """Total reps between two dates (inclusive)"""
+        return get_aggregate_cache(self.store, exercise, self.user).range_total(start, end)
+
+    def get_rolling_average(self, days, start, end, exercise=DEFAULT_EXERCISE):
+        """[(date, average of the `days` days ending that date)] for start..end"""
+        return get_aggregate_cache(self.store, exercise, self.user).rolling_average(days, start, end)
 
     # --- NEW MEGA FEATURES ---
 
-    def get_streak(self):
-        """Calculate current streak of days with >= 1 pushup"""
-        data = self.get_all_data()
-        if not data: return 0
-        
-        sorted_dates = sorted(data.keys(), reverse=True)
-        today = datetime.date.today()
-        streak = 0
-        
-        # Check today first
-        if today.isoformat() in data and data[today.isoformat()] > 0:
-            streak += 1
-            current_date = today - datetime.timedelta(days=1)
-        else:
-            # If no pushups today yet, check if we had some yesterday (streak active but at risk)
-            # or if streak is already broken.
-            # Technically streak is 0 if not done today, but let's be kind and check yesterday
-            current_date = today - datetime.timedelta(days=1)
-            if current_date.isoformat() not in data:
-                return 0 # Broken streak
-        
-        while True:
-            date_str = current_date.isoformat()
-            if date_str in data and data[date_str] > 0:
-                streak += 1
-                current_date -= datetime.timedelta(days=1)
-            else:
-                break
-        return streak
+    def get_streak(self, exercise=DEFAULT_EXERCISE):
+        """Current streak of days with >= 1 rep (still alive if only yesterday is logged)"""
+        return get_streak_engine(self.store, exercise, self.user).current()
 
-    def get_stats(self):
+    def get_longest_streak(self, exercise=DEFAULT_EXERCISE):
+        return get_streak_engine(self.store, exercise, self.user).longest()
+
+    def get_streak_history(self, exercise=DEFAULT_EXERCISE):
+        """All streaks oldest first, as dicts with start, end and length"""
+        return get_streak_engine(self.store, exercise, self.user).history()
+
+    def get_stats(self, exercise=DEFAULT_EXERCISE):
         """Get comprehensive stats"""
-        data = self.get_all_data()
-        if not data:
-            return {"total": 0, "best_day": 0, "avg": 0, "weekly_avg": 0}
-            
-        values = list(data.values())
-        total = sum(values)
-        best_day = max(values)
-        avg = total / len(values)
-        
-        # Last 7 days
-        today = datetime.date.today()
-        last_week_total = 0
-        for i in range(7):
-            d = (today - datetime.timedelta(days=i)).isoformat()
-            last_week_total += data.get(d, 0)
-        weekly_avg = last_week_total / 7
-        
-        return {
-            "total": total,
-            "best_day": best_day,
-            "avg": round(avg, 1),
-            "weekly_avg": round(weekly_avg, 1)
-        }
+        return get_aggregate_cache(self.store, exercise, self.user).snapshot()
+
+    def get_analytics(self, exercise=DEFAULT_EXERCISE):
+        """Hour/weekday, set-size and rolling analytics for an exercise, or None without NumPy"""
+        return get_analytics(self.store, exercise, self.user)
+
+    def export(self, file_path, fmt="csv", level="day", start=None, end=None, compress=False, progress=None,
+               exercise=DEFAULT_EXERCISE):
+        """Stream one exercise's raw entries or day/week/month totals to a CSV or JSON Lines file
+
+        Returns the number of bytes written; progress(percent) is called along the way.
+        """
+        return export_to_file(
+            self.store, file_path, fmt, level, start, end, compress, progress, exercise, self.user
+        )
+
+    def import_file(self, file_path, fmt=None, exercise=DEFAULT_EXERCISE):
+        """Bulk-import a CSV/JSON Lines history file; returns an importer report"""
+        return import_file(self.store, file_path, fmt, exercise, self.user)
 
     def export_csv(self, file_path):
-        """Export data to CSV"""
-        data = self.get_all_data()
-        with open(file_path, 'w') as f:
-            f.write("Date,Count\n")
-            for date in sorted(data.keys()):
-                f.write(f"{date},{data[date]}\n")
+        """Export daily totals to CSV"""
+        return self.export(file_path)
 
 def main():
     app = QApplication(sys.argv)
@@ -217,11 +377,20 @@ def main():
     
     tracker = PushupTracker()
     
-    # Start web server
-    from web_server import PushupWebServer
+    # Start web server, in a supervised child process if configured (SQLite only)
+    port = tracker.config.get("web_port", 8080)
     try:
-        server = PushupWebServer(tracker.db_path)
-        server.start_in_thread()
+        if tracker.config.get("web_process") and tracker.store.supports_processes:
+            from web_process import WebProcess
+            web = WebProcess(tracker.store, tracker.store_path, port, tracker.config)
+            web.start()
+            app.aboutToQuit.connect(web.stop)  # before the store closes
+        else:
+            if tracker.config.get("web_process"):
+                print(f"{tracker.store.name} storage cannot be shared with a web server process; using a thread")
+            from web_server import PushupWebServer
+            server = PushupWebServer(tracker.store, port, tracker.config)
+            server.start_in_thread()
     except Exception as e:
         print(f"Failed to start web server: {e}")
 
@@ -270,11 +439,21 @@ def main():
     
     quit_action = QAction("Quit")
     quit_action.triggered.connect(app.quit)
+    app.aboutToQuit.connect(tracker.close)
     tray_menu.addAction(quit_action)
     
     tray_icon.setContextMenu(tray_menu)
     tray_icon.show()
     
+    # Verify the database once the event loop is running, off the UI thread
+    def show_health(report):
+        if report["problems"]:
+            tray_icon.showMessage("Pushup Timer", health.describe(report), QSystemTrayIcon.Warning, 10000)
+        elif report["repaired"]:
+            tray_icon.showMessage("Pushup Timer", health.describe(report), QSystemTrayIcon.Information, 5000)
+    tracker.health_checked.connect(show_health)
+    QTimer.singleShot(0, tracker.start_health_check)
+    
     tracker.reminder_signal.connect(window.show_reminder_dialog)
     tracker.start_timer()
     
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the pushup database
+"""
+
+import argparse
+from pathlib import Path
+from db import DEFAULT_EXERCISE, DEFAULT_USER, get_manager, rebuild_daily_totals, new_device
+from migrations import LATEST, migrate, schema_version
+from streaks import rebuild_streaks
+from compaction import compact, describe
+from storage import open_storage
+import importer
+import backup
+import health
+import sync
+
+DEFAULT_DB_PATH = Path.home() / ".local/share/pushtimer/pushups.db"
+DEFAULT_BACKUP_DIR = Path.home() / ".local/share/pushtimer/backups"
+
+
+def cmd_rebuild_aggregates(args, db):
+    """Recompute daily_totals and streaks from the raw log"""
+    with db.write() as conn:
+        days = rebuild_daily_totals(conn)
+        streaks = rebuild_streaks(conn)
+    print(f"Rebuilt daily totals for {days} exercise-days and {streaks} streaks")
+
+
+def cmd_migrate(args, db):
+    """Bring the schema up to date (already done on open; reports the version)"""
+    print(f"Schema version {schema_version(db)} (latest {LATEST})")
+
+
+def cmd_compact(args, db):
+    """Fold raw entries older than --age days into one row per day"""
+    print(describe(compact(db, args.age, args.archive)))
+
+
+def cmd_import(args, db):
+    """Bulk-load CSV/JSON Lines history, skipping entries already logged"""
+    store = open_storage("sqlite", args.db)
+    for path in args.files:
+        print(f"{path}: {importer.describe(importer.import_file(store, path, args.format, args.exercise, args.user))}")
+    store.close()
+
+
+def cmd_backup(args, db):
+    """Take an online snapshot now, keeping the newest --keep"""
+    print(backup.describe(backup.backup(db, args.dir, args.keep)))
+
+
+def cmd_restore(args, db):
+    """Replace the database with a snapshot (listing them if none is given)"""
+    if args.snapshot is None:
+        for path in backup.snapshots(args.dir):
+            print(f"{path}  {path.stat().st_size / 1024:.0f} KB")
+        return
+    # Keep what is being replaced, outside the rotation
+    safety = backup.backup(db, args.dir / "pre-restore", keep=3)
+    print(f"Saved the current database as {safety['path']}")
+    report = backup.restore(db, args.snapshot)
+    migrate(db)
+    # Peers may hold this device's changes past the snapshot; new ones must not reuse their numbers
+    with db.write() as conn:
+        device = new_device(conn)[1]
+    print(f"Restored {report['path']} ({report['bytes'] / 1024:.0f} KB) in {report['seconds']:.2f} s")
+    print(f"Now writing as device {device}; sync to get back changes made since the snapshot")
+
+
+def cmd_sync(args, db):
+    """Exchange changes with each peer's web server (pull, then push)"""
+    store = open_storage("sqlite", args.db)
+    try:
+        for peer in args.peers:
+            print(sync.describe(sync.sync_with(store, peer)))
+    finally:
+        store.close()
+
+
+def cmd_check(args, db):
+    """Run quick_check and compare derived tables with the raw log, repairing unless --no-repair"""
+    report = health.check(db, repair=not args.no_repair)
+    print(health.describe(report))
+    if not report["ok"]:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pushup Timer database maintenance")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB_PATH, help="database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-aggregates", help="recompute daily totals and streaks from the raw log")
+    rebuild.set_defaults(func=cmd_rebuild_aggregates)
+
+    upgrade = commands.add_parser("migrate", help="upgrade the database schema in place")
+    upgrade.set_defaults(func=cmd_migrate)
+
+    fold = commands.add_parser("compact", help="fold old raw entries into one row per day")
+    fold.add_argument("--age", type=int, default=365, help="only fold days older than this many days")
+    fold.add_argument("--archive", action="store_true", help="keep the raw rows in pushups_archive")
+    fold.set_defaults(func=cmd_compact)
+
+    load = commands.add_parser("import", help="bulk-import CSV or JSON Lines history (.gz ok)")
+    load.add_argument("files", nargs="+", type=Path, help="files with timestamp/date and count columns")
+    load.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    load.add_argument("--exercise", default=DEFAULT_EXERCISE, help="for rows without an exercise column")
+    load.add_argument("--user", default=DEFAULT_USER, help="whose history this is")
+    load.set_defaults(func=cmd_import)
+
+    snap = commands.add_parser("backup", help="take an online snapshot of the database")
+    snap.add_argument("--dir", type=Path, default=DEFAULT_BACKUP_DIR, help="snapshot directory")
+    snap.add_argument("--keep", type=int, default=7, help="snapshots to keep")
+    snap.set_defaults(func=cmd_backup)
+
+    back = commands.add_parser("restore", help="restore a snapshot (quit the app first)")
+    back.add_argument("snapshot", type=Path, nargs="?", help="snapshot file; omit to list them")
+    back.add_argument("--dir", type=Path, default=DEFAULT_BACKUP_DIR, help="snapshot directory")
+    back.set_defaults(func=cmd_restore)
+
+    share = commands.add_parser("sync", help="exchange changes with other devices' web servers")
+    share.add_argument("peers", nargs="+", help="peer base URLs, e.g. http://192.168.1.20:8080")
+    share.set_defaults(func=cmd_sync)
+
+    verify = commands.add_parser("check", help="verify integrity and aggregates, repairing what it can")
+    verify.add_argument("--no-repair", action="store_true", help="only report problems")
+    verify.set_defaults(func=cmd_check)
+
+    args = parser.parse_args()
+    db = get_manager(args.db)
+    migrate(db)
+    args.func(args, db)
+
+
+if __name__ == "__main__":
+    main()
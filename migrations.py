@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations keyed on PRAGMA user_version
+"""
+
+import datetime
+import sqlite3
+import uuid
+from db import DEFAULT_USER, to_day, to_ms, rebuild_daily_totals
+from streaks import rebuild_streaks
+
+BATCH_SIZE = 10000  # rows copied per step when rewriting the log
+
+
+def _script(conn, sql):
+    """Run a multi-statement script without executescript's implicit COMMIT"""
+    statement = ""
+    for line in sql.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+
+def _v1_text_log(conn, progress):
+    """The original schema: ISO text dates and timestamps"""
+    _script(conn, '''
+        CREATE TABLE IF NOT EXISTS pushups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_date ON pushups(date);
+    ''')
+
+
+def _parse_ms(timestamp, date_str):
+    try:
+        return to_ms(datetime.datetime.fromisoformat(timestamp))
+    except (TypeError, ValueError):
+        return to_ms(datetime.datetime.fromisoformat(date_str))
+
+
+def _v2_integer_days(conn, progress):
+    """Integer epoch-day/epoch-ms columns, covering (day, count) index, triggers"""
+    _script(conn, '''
+        DROP TRIGGER IF EXISTS pushups_ai;
+        DROP TRIGGER IF EXISTS pushups_ad;
+        DROP TRIGGER IF EXISTS pushups_au;
+        DROP TABLE IF EXISTS daily_totals;
+        DROP TABLE IF EXISTS streaks;
+
+        CREATE TABLE pushups_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day INTEGER NOT NULL,     -- days since 1970-01-01
+            ts INTEGER NOT NULL,      -- milliseconds since the Unix epoch
+            count INTEGER NOT NULL
+        );
+    ''')
+
+    total = conn.execute("SELECT COUNT(*) FROM pushups").fetchone()[0]
+    done, last_id = 0, -1
+    while True:
+        rows = conn.execute(
+            "SELECT id, date, timestamp, count FROM pushups WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT INTO pushups_v2 (id, day, ts, count) VALUES (?, ?, ?, ?)",
+            [
+                (row_id, to_day(datetime.date.fromisoformat(date_str)), _parse_ms(timestamp, date_str), count)
+                for row_id, date_str, timestamp, count in rows
+            ]
+        )
+        last_id = rows[-1][0]
+        done += len(rows)
+        progress(done, total)
+
+    _script(conn, '''
+        DROP TABLE pushups;
+        ALTER TABLE pushups_v2 RENAME TO pushups;
+        CREATE INDEX idx_day_count ON pushups(day, count);
+
+        -- One row per day, kept in sync with the raw log by the triggers below
+        CREATE TABLE daily_totals (
+            day INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL,
+            entries INTEGER NOT NULL,
+            last_ts INTEGER
+        ) WITHOUT ROWID;
+
+        -- Runs of consecutive active days, maintained by streaks.StreakEngine
+        CREATE TABLE streaks (
+            start INTEGER PRIMARY KEY,
+            end INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER pushups_ai AFTER INSERT ON pushups BEGIN
+            INSERT INTO daily_totals (day, total, entries, last_ts)
+            VALUES (NEW.day, NEW.count, 1, NEW.ts)
+            ON CONFLICT(day) DO UPDATE SET
+                total = total + excluded.total,
+                entries = entries + 1,
+                last_ts = MAX(last_ts, excluded.last_ts);
+        END;
+
+        CREATE TRIGGER pushups_ad AFTER DELETE ON pushups BEGIN
+            UPDATE daily_totals SET
+                total = total - OLD.count,
+                entries = entries - 1,
+                last_ts = (SELECT MAX(ts) FROM pushups WHERE day = OLD.day)
+            WHERE day = OLD.day;
+            DELETE FROM daily_totals WHERE day = OLD.day AND entries <= 0;
+        END;
+
+        CREATE TRIGGER pushups_au AFTER UPDATE OF day, ts, count ON pushups BEGIN
+            UPDATE daily_totals SET
+                total = total - OLD.count,
+                entries = entries - 1,
+                last_ts = (SELECT MAX(ts) FROM pushups WHERE day = OLD.day)
+            WHERE day = OLD.day;
+            DELETE FROM daily_totals WHERE day = OLD.day AND entries <= 0;
+            INSERT INTO daily_totals (day, total, entries, last_ts)
+            VALUES (NEW.day, NEW.count, 1, NEW.ts)
+            ON CONFLICT(day) DO UPDATE SET
+                total = total + excluded.total,
+                entries = entries + 1,
+                last_ts = MAX(last_ts, excluded.last_ts);
+        END;
+
+        -- Later versions reshape these tables, so this step keeps its own rebuild SQL
+        INSERT INTO daily_totals (day, total, entries, last_ts)
+        SELECT day, SUM(count), COUNT(*), MAX(ts) FROM pushups GROUP BY day;
+
+        INSERT INTO streaks (start, end, length)
+        SELECT MIN(day), MAX(day), COUNT(*) FROM (
+            SELECT day, day - ROW_NUMBER() OVER (ORDER BY day) AS grp
+            FROM daily_totals WHERE total > 0
+        )
+        GROUP BY grp;
+    ''')
+
+
+def _v3_covering_entries(conn, progress):
+    """Cover (day, ts, count) so entry scans and last_ts lookups are index-only"""
+    _script(conn, '''
+        DROP INDEX IF EXISTS idx_day_count;
+        CREATE INDEX idx_day_ts_count ON pushups(day, ts, count);
+    ''')
+
+
+def _v4_incremental_vacuum(conn, progress):
+    """Let compaction hand freed pages back without a full VACUUM (applied by the VACUUM below)"""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pushups_archive (
+            id INTEGER PRIMARY KEY,
+            day INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            count INTEGER NOT NULL
+        )
+    ''')
+
+
+def _v5_exercises(conn, progress):
+    """Exercise dimension: existing entries become "pushups", aggregates keyed per exercise"""
+    _script(conn, '''
+        CREATE TABLE exercises (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        INSERT INTO exercises (id, name) VALUES (1, 'pushups');
+
+        -- A constant default, so existing rows are not rewritten
+        ALTER TABLE pushups ADD COLUMN exercise INTEGER NOT NULL DEFAULT 1;
+        ALTER TABLE pushups_archive ADD COLUMN exercise INTEGER NOT NULL DEFAULT 1;
+        DROP INDEX IF EXISTS idx_day_ts_count;
+        CREATE INDEX idx_exercise_day_ts_count ON pushups(exercise, day, ts, count);
+
+        DROP TRIGGER IF EXISTS pushups_ai;
+        DROP TRIGGER IF EXISTS pushups_ad;
+        DROP TRIGGER IF EXISTS pushups_au;
+        DROP TABLE IF EXISTS daily_totals;
+        DROP TABLE IF EXISTS streaks;
+
+        CREATE TABLE daily_totals (
+            exercise INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            entries INTEGER NOT NULL,
+            last_ts INTEGER,
+            PRIMARY KEY (exercise, day)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE streaks (
+            exercise INTEGER NOT NULL,
+            start INTEGER NOT NULL,
+            end INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (exercise, start)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER pushups_ai AFTER INSERT ON pushups BEGIN
+            INSERT INTO daily_totals (exercise, day, total, entries, last_ts)
+            VALUES (NEW.exercise, NEW.day, NEW.count, 1, NEW.ts)
+            ON CONFLICT(exercise, day) DO UPDATE SET
+                total = total + excluded.total,
+                entries = entries + 1,
+                last_ts = MAX(last_ts, excluded.last_ts);
+        END;
+
+        CREATE TRIGGER pushups_ad AFTER DELETE ON pushups BEGIN
+            UPDATE daily_totals SET
+                total = total - OLD.count,
+                entries = entries - 1,
+                last_ts = (SELECT MAX(ts) FROM pushups WHERE exercise = OLD.exercise AND day = OLD.day)
+            WHERE exercise = OLD.exercise AND day = OLD.day;
+            DELETE FROM daily_totals WHERE exercise = OLD.exercise AND day = OLD.day AND entries <= 0;
+        END;
+
+        CREATE TRIGGER pushups_au AFTER UPDATE OF exercise, day, ts, count ON pushups BEGIN
+            UPDATE daily_totals SET
+                total = total - OLD.count,
+                entries = entries - 1,
+                last_ts = (SELECT MAX(ts) FROM pushups WHERE exercise = OLD.exercise AND day = OLD.day)
+            WHERE exercise = OLD.exercise AND day = OLD.day;
+            DELETE FROM daily_totals WHERE exercise = OLD.exercise AND day = OLD.day AND entries <= 0;
+            INSERT INTO daily_totals (exercise, day, total, entries, last_ts)
+            VALUES (NEW.exercise, NEW.day, NEW.count, 1, NEW.ts)
+            ON CONFLICT(exercise, day) DO UPDATE SET
+                total = total + excluded.total,
+                entries = entries + 1,
+                last_ts = MAX(last_ts, excluded.last_ts);
+        END;
+    ''')
+    rebuild_daily_totals(conn)
+    rebuild_streaks(conn)
+
+
+def _v6_change_log(conn, progress):
+    """Devices and a per-device change log for delta sync; existing entries become this device's history"""
+    _script(conn, '''
+        CREATE TABLE devices (
+            id INTEGER PRIMARY KEY,
+            uuid TEXT NOT NULL UNIQUE,
+            local INTEGER NOT NULL DEFAULT 0  -- 1 for the device this database writes as
+        );
+
+        -- Every write, as its author logged it; peers exchange these by (device, seq)
+        CREATE TABLE changes (
+            device INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            op INTEGER NOT NULL,      -- 1 append, 2 reset the day
+            exercise INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (device, seq)
+        ) WITHOUT ROWID;
+
+        -- The latest reset of each day; entries ordered before it are gone
+        CREATE TABLE day_resets (
+            exercise INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            device INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (exercise, day)
+        ) WITHOUT ROWID;
+
+        -- Which change each entry came from, so resets can order entries across devices
+        ALTER TABLE pushups ADD COLUMN device INTEGER NOT NULL DEFAULT 1;
+        ALTER TABLE pushups ADD COLUMN seq INTEGER;
+        UPDATE pushups SET seq = id;
+        INSERT INTO changes (device, seq, op, exercise, day, ts, count)
+        SELECT 1, id, 1, exercise, day, ts, count FROM pushups ORDER BY id;
+    ''')
+    conn.execute("INSERT INTO devices (id, uuid, local) VALUES (1, ?, 1)", (uuid.uuid4().hex,))
+
+
+def _v7_users(conn, progress):
+    """User dimension: an exercise belongs to a user, existing ones to the default user"""
+    _script(conn, '''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+
+        -- Everything keyed by exercise id (daily_totals, streaks, day_resets, changes)
+        -- becomes per user with it, so none of those tables is rewritten
+        CREATE TABLE exercises_v7 (
+            id INTEGER PRIMARY KEY,
+            user INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            UNIQUE (user, name)
+        );
+        INSERT INTO exercises_v7 (id, user, name) SELECT id, 1, name FROM exercises;
+        DROP TABLE exercises;
+        ALTER TABLE exercises_v7 RENAME TO exercises;
+    ''')
+    conn.execute("INSERT INTO users (id, name) VALUES (1, ?)", (DEFAULT_USER,))
+
+
+# (version, description, function, vacuum afterwards)
+MIGRATIONS = [
+    (1, "text log", _v1_text_log, False),
+    (2, "integer day/timestamp columns", _v2_integer_days, True),
+    (3, "covering entry index", _v3_covering_entries, False),
+    (4, "incremental vacuum and archive table", _v4_incremental_vacuum, True),
+    (5, "exercise dimension", _v5_exercises, False),
+    (6, "sync change log", _v6_change_log, False),
+    (7, "user dimension", _v7_users, False),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def print_progress(done, total):
+    print(f"Migrating database: {done}/{total} rows ({done * 100 // max(total, 1)}%)")
+
+
+def schema_version(manager):
+    with manager.read() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(manager, progress=print_progress):
+    """Bring the database up to LATEST; a no-op when it is already current"""
+    if schema_version(manager) >= LATEST:
+        return 0
+
+    applied = 0
+    vacuum = False
+    with manager.write() as conn:
+        for version, description, step, wants_vacuum in MIGRATIONS:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current >= version:
+                continue
+            print(f"Applying migration {version}: {description}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                step(conn, progress)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied += 1
+            vacuum = vacuum or wants_vacuum
+
+    if vacuum:
+        # Rewriting the log leaves the old pages free; give them back
+        with manager.write() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return applied
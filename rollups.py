@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Precomputed week/month/year totals for long-range charts
+"""
+
+import bisect
+import threading
+from db import DEFAULT_EXERCISE, DEFAULT_USER, to_day, from_day
+from storage import PERIOD_STARTS
+
+BUCKETS = ("day", "week", "month", "year")
+MAX_POINTS = 3660  # buckets one web request may ask for: ten years of days
+
+
+def bucket_count(bucket, start, end):
+    """Number of buckets overlapping start..end"""
+    if start > end:
+        return 0
+    if bucket == "day":
+        return (end - start).days + 1
+    if bucket == "week":
+        return (to_day(end) - PERIOD_STARTS["week"](to_day(start))) // 7 + 1
+    if bucket == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return end.year - start.year + 1
+
+
+def next_start(bucket, start):
+    """First epoch day of the bucket after the one starting at `start`"""
+    if bucket == "day":
+        return start + 1
+    if bucket == "week":
+        return start + 7
+    date = from_day(start)
+    if bucket == "month":
+        return to_day(date.replace(year=date.year + date.month // 12, month=date.month % 12 + 1))
+    return to_day(date.replace(year=date.year + 1))
+
+
+class Rollups:
+    """Week, month and year totals of one user's exercise, kept in memory
+
+    Loaded with one grouped query per bucket size. A write only marks the
+    buckets containing its days stale; each stale bucket is recomputed
+    from the daily totals of its own range on the next read, so a
+    ten-year chart never rescans the history.
+    """
+
+    SIZES = BUCKETS[1:]  # days come straight from the store's daily totals
+
+    def __init__(self, storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        self.store = storage
+        self.exercise = exercise
+        self.user = user
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one recompute at a time, in write order
+        self._stale = {size: set() for size in self.SIZES}
+        self.load()
+        storage.add_listener(self._changed)
+
+    def load(self):
+        with self._refresh_lock:
+            with self._lock:
+                for stale in self._stale.values():
+                    stale.clear()
+            loaded = {
+                size: {
+                    to_day(date): total
+                    for date, total in self.store.day_range(None, None, size, self.exercise, self.user)
+                }
+                for size in self.SIZES
+            }
+            with self._lock:
+                self.totals = loaded  # size -> {bucket start epoch day: total}
+                self.starts = {size: sorted(totals) for size, totals in loaded.items()}
+
+    def _changed(self, changes):
+        """Writer listener: mark the buckets holding each changed day stale"""
+        days = changes.get(self.user, {}).get(self.exercise)
+        if not days:
+            return
+        with self._lock:
+            for date in days:
+                day = to_day(date)
+                for size in self.SIZES:
+                    self._stale[size].add(PERIOD_STARTS[size](day))
+
+    def _refresh(self):
+        """Recompute stale buckets; the store is read without holding self._lock
+
+        (MemoryStorage calls listeners under its own lock, and _changed needs ours.)
+        """
+        with self._refresh_lock:
+            with self._lock:
+                stale = {size: sorted(starts) for size, starts in self._stale.items() if starts}
+                for size in stale:
+                    self._stale[size].clear()
+            if not stale:
+                return
+            fresh = {
+                size: [
+                    (start, self.store.day_range(
+                        from_day(start), from_day(next_start(size, start) - 1), size, self.exercise, self.user
+                    ))
+                    for start in starts
+                ]
+                for size, starts in stale.items()
+            }
+            with self._lock:
+                for size, buckets in fresh.items():
+                    totals, starts = self.totals[size], self.starts[size]
+                    for start, rows in buckets:
+                        if rows:
+                            if start not in totals:
+                                bisect.insort(starts, start)
+                            totals[start] = rows[0][1]
+                        elif start in totals:
+                            del totals[start]
+                            starts.pop(bisect.bisect_left(starts, start))
+
+    def series(self, start, end, size):
+        """[(bucket start date, total)] for every bucket overlapping start..end, zeros included"""
+        self._refresh()
+        first = PERIOD_STARTS[size](to_day(start))
+        last = to_day(end)
+        with self._lock:
+            totals = self.totals[size]
+            out = []
+            bucket = first
+            while bucket <= last:
+                out.append((from_day(bucket), totals.get(bucket, 0)))
+                bucket = next_start(size, bucket)
+            return out
+
+
+def series(storage, start=None, end=None, bucket="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """Bucketed totals between two dates (default: the whole log), zero-filled
+
+    Buckets are whole weeks (Monday first), months or years: a bucket is
+    included when it overlaps start..end and carries its full total.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r} (expected one of {', '.join(BUCKETS)})")
+    if start is None or end is None:
+        bounds = storage.bounds(exercise, user)
+        if bounds is None:
+            return []
+        start, end = start or bounds[0], end or bounds[1]
+    if start > end:
+        return []
+    if bucket == "day":
+        totals = dict(storage.day_range(start, end, "day", exercise, user))
+        first, last = to_day(start), to_day(end)
+        return [(from_day(day), totals.get(from_day(day), 0)) for day in range(first, last + 1)]
+    return get_rollups(storage, exercise, user).series(start, end, bucket)
+
+
+def get_rollups(storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """The Rollups for a user's exercise shared by everything using this store"""
+    return storage.shared(("rollups", exercise, user), lambda store: Rollups(store, exercise, user))
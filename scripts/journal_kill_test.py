@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Kill the app mid-write and check that the reminder journal loses nothing
+
+Each round starts a child that answers reminders as fast as it can
+(fired, logged, written to SQLite, saved) and SIGKILLs it at a random
+moment. A fresh process then recovers the journal and checks that every
+set the child had journaled is in the database exactly once. Some
+rounds also cut the journal at a random byte, as a power cut would, and
+then only require that nothing is logged twice. Finally it times the
+append on the reminder hot path.
+
+    python scripts/journal_kill_test.py [rounds]
+"""
+
+import datetime
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import to_ms
+from journal import ReminderJournal
+from storage import open_storage
+
+EXERCISES = ("pushups", "squats", "Kettlebell swings (single arm, left)")  # the last is over 32 bytes
+
+
+def child(workdir):
+    """Answer reminders forever; prints each set's timestamp once it is journaled"""
+    store = open_storage("sqlite", Path(workdir) / "pushups.db")
+    journal = ReminderJournal(Path(workdir) / "reminders.journal", fsync_interval=0.05)
+    base = datetime.datetime.now().replace(microsecond=0)
+    step = int(time.time() * 1000) % 1000000  # unique timestamps across rounds
+    i = 0
+    while True:
+        i += 1
+        moment = base + datetime.timedelta(milliseconds=step * 1000 + i)
+        reminder = journal.fired(moment)
+        count = random.randint(0, 30)
+        exercise = random.choice(EXERCISES)
+        journal.logged(reminder, count, exercise, moment)
+        print(json.dumps([to_ms(moment), count, exercise]), flush=True)
+        journal.watch(reminder, store.log(moment.date(), count, moment, False, exercise))
+
+
+def recover(workdir):
+    """Recover once in this process and print the report and every stored entry"""
+    store = open_storage("sqlite", Path(workdir) / "pushups.db")
+    journal = ReminderJournal(Path(workdir) / "reminders.journal")
+    report = journal.recover(store)
+    journal.close()
+    entries = [
+        [ts, count, exercise]
+        for exercise in EXERCISES for _, ts, count in store.iter_raw(exercise=exercise)
+    ]
+    store.close()
+    print(json.dumps({"relogged": report["relogged"], "confirmed": report["confirmed"], "entries": entries}))
+
+
+def run_round(workdir, tear):
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--child", workdir], stdout=subprocess.PIPE, text=True
+    )
+    time.sleep(random.uniform(0.3, 1.5))
+    os.kill(proc.pid, signal.SIGKILL)
+    # Whole lines only: the kill may cut the last one; migrations print too
+    journaled = [tuple(json.loads(line)) for line in proc.stdout if line.startswith("[") and line.endswith("\n")]
+    proc.wait()
+
+    path = Path(workdir) / "reminders.journal"
+    if tear:
+        size = path.stat().st_size
+        with open(path, "r+b") as f:
+            f.truncate(random.randint(len(ReminderJournal.MAGIC), size))
+
+    out = subprocess.run(
+        [sys.executable, __file__, "--recover", workdir], capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    stored = [tuple(entry) for entry in result["entries"]]
+    attempted = set(journaled)
+    duplicates = len(stored) - len(set(stored))
+    missing = 0 if tear else len(attempted - set(stored))
+    return len(journaled), result, duplicates, missing
+
+
+def bench(workdir, n=20000):
+    journal = ReminderJournal(Path(workdir) / "bench.journal")
+    now = datetime.datetime.now()
+    began = time.perf_counter()
+    for _ in range(n):
+        reminder = journal.fired(now)
+        journal.logged(reminder, 20, "pushups", now)
+        journal.saved(reminder)
+    elapsed = time.perf_counter() - began
+    journal.close()
+    return elapsed / (3 * n) * 1e6, journal.fsyncs
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for i in range(rounds):
+            tear = i % 3 == 2
+            journaled, result, duplicates, missing = run_round(workdir, tear)
+            ok = not duplicates and not missing
+            failures += not ok
+            print(f"round {i + 1}{' (torn journal)' if tear else ''}: {journaled} sets journaled, "
+                  f"{result['relogged']} logged again, {result['confirmed']} already saved, "
+                  f"{duplicates} duplicate(s), {missing} missing  {'ok' if ok else 'FAIL'}")
+        per_append, fsyncs = bench(workdir)
+    print(f"append: {per_append:.2f} us per event ({fsyncs} fsyncs in the background)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == "--recover":
+        recover(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Compact per-day series of pushup totals
+"""
+
+import datetime
+from array import array
+from db import EPOCH_ORDINAL
+
+
+class DaySeries:
+    """Daily totals in a flat int array indexed by day offset from the first day
+
+    Lookups by date are an index computation instead of a string-keyed dict
+    probe, and sum/max run over the array in C. A parallel byte array marks
+    which days actually have entries, so a logged zero ("skip") still counts
+    as a day for averages.
+    """
+
+    def __init__(self, origin=None):
+        self.origin = origin  # ordinal of index 0, None while empty
+        self.values = array('i')
+        self.present = array('B')
+        self.days = 0  # number of present days
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (epoch_day, total) rows, ideally in day order"""
+        series = cls()
+        for day, total in rows:
+            series._set(day + EPOCH_ORDINAL, total)
+        return series
+
+    @classmethod
+    def from_dates(cls, items):
+        """Build from (date, total) pairs, ideally in date order"""
+        series = cls()
+        for date, total in items:
+            series[date] = total
+        return series
+
+    def copy(self):
+        series = DaySeries(self.origin)
+        series.values = array('i', self.values)
+        series.present = array('B', self.present)
+        series.days = self.days
+        return series
+
+    # --- Indexing ---
+
+    def _index(self, ordinal):
+        if self.origin is None:
+            return -1
+        i = ordinal - self.origin
+        return i if 0 <= i < len(self.values) else -1
+
+    def _grow(self, ordinal):
+        """Extend the arrays so ordinal is addressable; returns its index"""
+        if self.origin is None:
+            self.origin = ordinal
+        if ordinal < self.origin:
+            pad = self.origin - ordinal
+            self.values[:0] = array('i', bytes(4 * pad))
+            self.present[:0] = array('B', bytes(pad))
+            self.origin = ordinal
+        i = ordinal - self.origin
+        if i >= len(self.values):
+            pad = i + 1 - len(self.values)
+            self.values.extend(array('i', bytes(4 * pad)))
+            self.present.extend(array('B', bytes(pad)))
+        return i
+
+    def value_at(self, ordinal):
+        """Total for a day ordinal (date.toordinal()), 0 if not logged"""
+        i = self._index(ordinal)
+        return self.values[i] if i >= 0 else 0
+
+    def get(self, date, default=0):
+        i = self._index(date.toordinal())
+        return self.values[i] if i >= 0 and self.present[i] else default
+
+    def __getitem__(self, date):
+        return self.value_at(date.toordinal())
+
+    def __setitem__(self, date, total):
+        self._set(date.toordinal(), total)
+
+    def _set(self, ordinal, total):
+        i = self._grow(ordinal)
+        if not self.present[i]:
+            self.present[i] = 1
+            self.days += 1
+        self.values[i] = total
+
+    def discard(self, date):
+        """Forget a day that no longer has entries"""
+        i = self._index(date.toordinal())
+        if i >= 0 and self.present[i]:
+            self.present[i] = 0
+            self.values[i] = 0
+            self.days -= 1
+
+    def __contains__(self, date):
+        i = self._index(date.toordinal())
+        return i >= 0 and bool(self.present[i])
+
+    def __len__(self):
+        return self.days
+
+    # --- Ranges and aggregates ---
+
+    @property
+    def first(self):
+        return None if self.origin is None else datetime.date.fromordinal(self.origin)
+
+    @property
+    def last(self):
+        return None if self.origin is None else datetime.date.fromordinal(self.origin + len(self.values) - 1)
+
+    def _bounds(self, start, end):
+        """Array slice bounds for an inclusive date range (None = open)"""
+        if self.origin is None:
+            return 0, 0
+        lo = 0 if start is None else max(0, start.toordinal() - self.origin)
+        hi = len(self.values) if end is None else max(0, end.toordinal() - self.origin + 1)
+        return lo, min(hi, len(self.values))
+
+    def window(self, start, end):
+        """Totals for every day from start to end inclusive, zero-filled"""
+        n = (end - start).days + 1
+        out = array('i', bytes(4 * max(n, 0)))
+        if self.origin is None or n <= 0:
+            return out
+        lo, hi = self._bounds(start, end)
+        if hi > lo:
+            offset = self.origin + lo - start.toordinal()
+            out[offset:offset + hi - lo] = self.values[lo:hi]
+        return out
+
+    def sum(self, start=None, end=None):
+        lo, hi = self._bounds(start, end)
+        return sum(self.values[lo:hi])
+
+    def max(self, start=None, end=None):
+        lo, hi = self._bounds(start, end)
+        return max(self.values[lo:hi], default=0)
+
+    def mean(self, start=None, end=None):
+        """Average over days with entries"""
+        lo, hi = self._bounds(start, end)
+        days = sum(self.present[lo:hi])
+        return sum(self.values[lo:hi]) / days if days else 0
+
+    def items(self, start=None, end=None):
+        """(date, total) for present days in date order"""
+        lo, hi = self._bounds(start, end)
+        for i in range(lo, hi):
+            if self.present[i]:
+                yield datetime.date.fromordinal(self.origin + i), self.values[i]
+
+
+class RangeIndex:
+    """Fenwick tree over a DaySeries for O(log n) totals between any two dates
+
+    Kept in step by calling add() after the series is updated. The tree is
+    built with spare capacity so new days rarely force a rebuild; a day
+    before the series origin or past the capacity rebuilds it in O(n).
+    """
+
+    def __init__(self, series):
+        self.series = series
+        self.rebuild()
+
+    def rebuild(self):
+        values = self.series.values
+        self.origin = self.series.origin
+        self.size = max(2 * len(values), len(values) + 366)
+        tree = [0] * (self.size + 1)
+        tree[1:len(values) + 1] = values
+        for i in range(1, self.size + 1):
+            j = i + (i & -i)
+            if j <= self.size:
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def add(self, date, delta):
+        """Record that a day's total changed by delta"""
+        if self.origin is None or self.origin != self.series.origin:
+            self.rebuild()
+            return
+        i = date.toordinal() - self.origin + 1
+        if i > self.size:
+            self.rebuild()
+            return
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i):
+        """Sum of the first i days after the origin"""
+        i = min(max(i, 0), self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start, end):
+        """Total from start to end inclusive"""
+        if self.origin is None or end < start:
+            return 0
+        return self._prefix(end.toordinal() - self.origin + 1) - self._prefix(start.toordinal() - self.origin)
+
+
+def rolling_average(totals, days, origin, start):
+    """[(date, average over the `days` days ending that date)] from start on
+
+    totals are zero-filled daily totals beginning at the date origin, as
+    DaySeries.window() returns them; one running sum covers the whole range.
+    """
+    out = []
+    running = 0
+    first = start.toordinal() - origin.toordinal()
+    for i, total in enumerate(totals):
+        running += total
+        if i >= days:
+            running -= totals[i - days]
+        if i >= first:
+            out.append((datetime.date.fromordinal(origin.toordinal() + i), running / days))
+    return out
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+HTTP serving for the web server: an asyncio front end over a bounded WSGI worker pool
+
+Flask's development server starts a thread per connection and holds it
+for as long as the phone keeps the connection open. Here one event loop
+owns every socket: idle keep-alive connections cost a few kilobytes, not
+a thread, and only a request being answered takes one of a fixed number
+of worker threads. Beyond the connection limit new clients get a 503
+straight away instead of queueing behind everyone else.
+
+Engines, chosen with "web_engine" in config.json:
+
+    asyncio   this module (default, no dependencies)
+    waitress  waitress's WSGI server (pip install waitress), same settings
+    dev       Flask's development server, as before
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import unquote
+
+ENGINES = ("asyncio", "waitress", "dev")
+DEFAULTS = {
+    "web_engine": "asyncio",
+    "web_threads": 8,              # WSGI worker threads
+    "web_connection_limit": 500,   # open connections, idle keep-alive ones included
+    "web_timeout_seconds": 30,     # idle keep-alive connections and stalled reads/writes
+}
+MAX_HEADER_BYTES = 64 * 1024
+READ_CHUNK = 64 * 1024
+PREFETCH_BYTES = 256 * 1024  # sized bodies up to this are produced in one trip to a worker
+STATUS_503 = (b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n"
+              b"Retry-After: 1\r\nConnection: close\r\n\r\n")
+
+
+class BadRequest(Exception):
+    pass
+
+
+class _Input:
+    """wsgi.input: the request body, pulled from the event loop by the worker reading it
+
+    Bodies are streamed rather than buffered, so an import is parsed as it
+    arrives just as it was with the development server.
+    """
+
+    def __init__(self, reader, loop, length, timeout):
+        self.reader = reader
+        self.loop = loop
+        self.remaining = length
+        self.timeout = timeout
+        self.buffer = bytearray()
+
+    def _fill(self):
+        """Pull the next piece of the body into the buffer; False at its end"""
+        if self.remaining <= 0:
+            return False
+        read = asyncio.wait_for(self.reader.read(min(self.remaining, READ_CHUNK)), self.timeout)
+        chunk = asyncio.run_coroutine_threadsafe(read, self.loop).result()
+        if not chunk:
+            raise ConnectionError("Client closed the connection mid-body")
+        self.remaining -= len(chunk)
+        self.buffer += chunk
+        return True
+
+    def _take(self, size):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            return self._take(len(self.buffer))
+        while len(self.buffer) < size and self._fill():
+            pass
+        return self._take(size)
+
+    def readline(self, size=-1):
+        limited = size is not None and size >= 0
+        while b"\n" not in self.buffer and not (limited and len(self.buffer) >= size) and self._fill():
+            pass
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        return self._take(min(end, size) if limited else end)
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+
+class AsyncWSGIServer:
+    """HTTP/1.1 with keep-alive on one asyncio loop; the WSGI app runs on a fixed thread pool
+
+    Response bodies are pulled from the app one chunk at a time on the
+    pool and written with backpressure; without a Content-Length they go
+    out chunked. A body with __aiter__ is iterated on the loop instead, so
+    a long-lived stream that mostly waits (Server-Sent Events) holds no
+    worker. Timeouts bound every read and write, so a stalled phone
+    cannot hold a connection or a worker for longer than `timeout`.
+    """
+
+    def __init__(self, app, host="0.0.0.0", port=8080, threads=8, connection_limit=500, timeout=30):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self.connections = 0
+        self.requests = 0
+        self.rejected = 0
+        self.ready = threading.Event()
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="pushtimer-web")
+        self._loop = None
+        self._stop = None
+        self._writers = set()
+        self._date_cache = (0, "")
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Stop serving (from any thread); serve_forever returns once open requests finish"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def _date(self):
+        """The Date header value, formatted once a second"""
+        now = int(time.time())
+        if now != self._date_cache[0]:
+            self._date_cache = (now, formatdate(now, usegmt=True))
+        return self._date_cache[1]
+
+    def stats(self):
+        return {"engine": "asyncio", "threads": self.threads, "connections": self.connections,
+                "requests": self.requests, "rejected": self.rejected}
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(
+            self._connection, self.host, self.port, limit=MAX_HEADER_BYTES, backlog=self.connection_limit
+        )
+        self.port = server.sockets[0].getsockname()[1]  # the real one when asked for port 0
+        self.ready.set()
+        await self._stop.wait()
+        server.close()
+        for writer in list(self._writers):
+            writer.close()  # idle keep-alives and event streams would hold wait_closed() open
+        await server.wait_closed()
+        self._pool.shutdown(wait=False)
+
+    async def _connection(self, reader, writer):
+        if self.connections >= self.connection_limit:
+            self.rejected += 1
+            writer.write(STATUS_503)
+            writer.close()
+            return
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while await self._request(reader, writer):
+                pass
+        except BadRequest as e:
+            body = str(e).encode("utf-8")
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nConnection: close\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except asyncio.CancelledError:  # shutting down
+            pass
+        except Exception as e:
+            print(f"Web server error: {e}")
+        finally:
+            self.connections -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _read_head(self, reader):
+        """(method, target, version, headers) of the next request, or None when the client is done"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout)
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise BadRequest("Incomplete request head")
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise BadRequest("Malformed request line")
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise BadRequest(f"Unsupported protocol {version}")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, sep, value = line.partition(":")
+                if not sep:
+                    raise BadRequest("Malformed header")
+                key = name.strip().upper().replace("-", "_")
+                value = value.strip()
+                headers[key] = headers[key] + "," + value if key in headers else value
+        return method, target, version, headers
+
+    def _environ(self, method, target, version, headers, body, writer):
+        path, _, query = target.partition("?")
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, "latin-1"),
+            "QUERY_STRING": query,
+            "RAW_URI": target,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0],
+            "REMOTE_PORT": str(peer[1]),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            "pushtimer.async_bodies": True,  # an iterable with __aiter__ is iterated on the loop
+        }
+        for key, value in headers.items():
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[key] = value
+            else:
+                environ["HTTP_" + key] = value
+        return environ
+
+    async def _request(self, reader, writer):
+        """Answer one request; returns whether the connection stays open"""
+        head = await self._read_head(reader)
+        if head is None:
+            return False
+        method, target, version, headers = head
+        if "TRANSFER_ENCODING" in headers:
+            raise BadRequest("Chunked request bodies are not supported; send a Content-Length")
+        try:
+            length = int(headers.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            raise BadRequest("Bad Content-Length")
+        connection = headers.get("CONNECTION", "").lower()
+        keep_alive = "close" not in connection if version == "HTTP/1.1" else "keep-alive" in connection
+        if length and headers.get("EXPECT", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        body = _Input(reader, self._loop, length, self.timeout)
+        environ = self._environ(method, target, version, headers, body, writer)
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"], response["headers"] = status, response_headers
+            return lambda data: response.setdefault("written", []).append(data)
+
+        def call():
+            """Run the app on a worker up to its first chunk, or through a short body of declared length
+
+            Returns None with the body complete in response["written"],
+            else (result, iterator) for the rest to be pulled chunk by chunk.
+            """
+            result = self.app(environ, start_response)
+            pieces = response.setdefault("written", [])
+            if isinstance(result, (list, tuple)):
+                pieces += result
+                return None
+            if hasattr(result, "__aiter__"):
+                return result, None  # iterated on the loop, e.g. an event stream
+            declared = next((int(value) for name, value in response["headers"]
+                             if name.lower() == "content-length"), None)
+            chunks = iter(result)
+            size = 0
+            done = True
+            for piece in chunks:
+                pieces.append(piece)
+                size += len(piece)
+                if declared is None or size >= min(declared, PREFETCH_BYTES):
+                    done = declared is not None and size >= declared
+                    break
+            if not done:
+                return result, chunks
+            if hasattr(result, "close"):
+                result.close()
+            return None
+
+        self.requests += 1
+        try:
+            streaming = await self._loop.run_in_executor(self._pool, call)
+        except Exception as e:
+            print(f"Web app error on {method} {target}: {e}")
+            writer.write(b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return False
+        response["sent"] = True
+        status = response["status"]
+        names = {name.lower() for name, _ in response["headers"]}
+        bodyless = method == "HEAD" or status[:3] in ("204", "304") or status[0] == "1"
+        chunked = not bodyless and "content-length" not in names and version == "HTTP/1.1"
+        if not bodyless and "content-length" not in names and not chunked:
+            keep_alive = False  # HTTP/1.0 without a length: the end of the body is the close
+        lines = [f"{version} {status}"]
+        lines += [f"{name}: {value}" for name, value in response["headers"]]
+        if "date" not in names:
+            lines.append("Date: " + self._date())
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+
+        def frame(piece):
+            return b"%x\r\n%s\r\n" % (len(piece), piece) if chunked else piece
+
+        out = [("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")]  # head and body in one send
+        if not bodyless:
+            out += [frame(piece) for piece in response["written"] if piece]
+        writer.write(b"".join(out))
+        if streaming is not None and streaming[1] is None:
+            chunks = streaming[0].__aiter__()
+            try:
+                async for piece in chunks:
+                    if bodyless:
+                        break
+                    if piece:
+                        writer.write(frame(piece))
+                        await asyncio.wait_for(writer.drain(), self.timeout)
+            finally:
+                if hasattr(chunks, "aclose"):
+                    await chunks.aclose()
+        elif streaming is not None:
+            result, chunks = streaming
+            try:
+                while not bodyless:
+                    await asyncio.wait_for(writer.drain(), self.timeout)
+                    piece = await self._loop.run_in_executor(self._pool, next, chunks, None)
+                    if piece is None:
+                        break
+                    if piece:
+                        writer.write(frame(piece))
+            finally:
+                if hasattr(result, "close"):
+                    await self._loop.run_in_executor(self._pool, result.close)
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+        await asyncio.wait_for(writer.drain(), self.timeout)
+        if body.remaining:
+            keep_alive = False  # the app left part of the body unread
+        return keep_alive
+
+
+def options(config=None):
+    """The web server settings from a config dict, defaults filled in"""
+    config = config or {}
+    return {key: config.get(key, default) for key, default in DEFAULTS.items()}
+
+
+def serve(app, host="0.0.0.0", port=8080, config=None):
+    """Serve a WSGI app with the engine and limits named in config; blocks"""
+    settings = options(config)
+    engine = settings["web_engine"]
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown web engine {engine!r} (expected one of {', '.join(ENGINES)})")
+    if engine == "waitress":
+        try:
+            import waitress
+        except ImportError:
+            print("waitress is not installed (pip install waitress); serving with asyncio")
+        else:
+            return waitress.serve(
+                app, host=host, port=port, threads=settings["web_threads"],
+                connection_limit=settings["web_connection_limit"],
+                channel_timeout=settings["web_timeout_seconds"], ident=None,
+            )
+    if engine == "dev":
+        return app.run(host=host, port=port, debug=False, threaded=True)
+    AsyncWSGIServer(
+        app, host, port, settings["web_threads"], settings["web_connection_limit"], settings["web_timeout_seconds"]
+    ).serve_forever()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Aggregate statistics kept current by the write path
+"""
+
+import datetime
+import threading
+from db import DEFAULT_EXERCISE, DEFAULT_USER
+from series import DaySeries, RangeIndex, rolling_average
+
+
+class AggregateCache:
+    """Running totals, best day and a range-sum index over daily totals
+
+    Loaded once from the store's daily totals, then adjusted per changed day after each
+    commit, so reading stats costs the same with ten years of logs as with
+    ten days. Rolling 7/30/365-day windows are O(log n) index queries.
+    One cache per user and exercise.
+    """
+
+    def __init__(self, storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        self.store = storage
+        self.exercise = exercise
+        self.user = user
+        self._lock = threading.Lock()
+        self.load()
+        storage.add_listener(self._apply)
+
+    def load(self):
+        rows = self.store.day_range(exercise=self.exercise, user=self.user)
+        with self._lock:
+            self.days = DaySeries.from_dates(rows)
+            self.index = RangeIndex(self.days)
+            self.total = self.days.sum()
+            self.best_day = self.days.max()
+            self._best_stale = False
+
+    def _apply(self, changes):
+        """Writer listener: fold each changed day's delta into the aggregates"""
+        days = changes.get(self.user, {}).get(self.exercise)
+        if not days:
+            return
+        with self._lock:
+            for date, total in days.items():
+                old = self.days[date]
+                if total is None:
+                    self.days.discard(date)
+                    total = 0
+                else:
+                    self.days[date] = total
+                delta = total - old
+                self.total += delta
+                self.index.add(date, delta)
+                if total >= self.best_day:
+                    self.best_day = total
+                elif old == self.best_day:
+                    self._best_stale = True  # the best day went down
+
+    def range_total(self, start, end):
+        """Total between two dates inclusive"""
+        with self._lock:
+            return self.index.range_sum(start, end)
+
+    def rolling_average(self, days, start, end):
+        """[(date, average of the `days` days ending there)] for each date in start..end
+
+        Only the daily totals are copied under the lock; the averages are
+        worked out after releasing it so a long range never stalls the writer.
+        """
+        origin = datetime.date.fromordinal(max(start.toordinal() - days + 1, 1))
+        with self._lock:
+            totals = self.days.window(origin, end)
+        return rolling_average(totals, days, origin, start)
+
+    def _window_avg(self, days, today):
+        start = today - datetime.timedelta(days=days - 1)
+        return round(self.index.range_sum(start, today) / days, 1)
+
+    def snapshot(self):
+        """Stats in the shape PushupTracker.get_stats returns"""
+        today = datetime.date.today()
+        with self._lock:
+            if self._best_stale:
+                self.best_day = self.days.max()
+                self._best_stale = False
+            if not self.days:
+                return {"total": 0, "best_day": 0, "avg": 0, "weekly_avg": 0, "monthly_avg": 0, "yearly_avg": 0}
+            return {
+                "total": self.total,
+                "best_day": self.best_day,
+                "avg": round(self.total / len(self.days), 1),
+                "weekly_avg": self._window_avg(7, today),
+                "monthly_avg": self._window_avg(30, today),
+                "yearly_avg": self._window_avg(365, today),
+            }
+
+
+def get_aggregate_cache(storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """The AggregateCache for a user's exercise shared by everything using this store"""
+    return storage.shared(("stats", exercise, user), lambda store: AggregateCache(store, exercise, user))
@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+Pluggable storage engines behind the tracker and the web server
+"""
+
+import bisect
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from db import (
+    DEFAULT_EXERCISE, DEFAULT_USER, get_manager, to_day, from_day, to_ms, from_ms,
+    insert_entry, query_range, iter_range, iter_entries, iter_raw, day_bounds, list_exercises, list_users,
+)
+
+
+class Storage:
+    """What PushupTracker and PushupWebServer need from a pushup store
+
+    Dates are datetime.date, moments are naive local datetimes, exercises
+    and users are names ("pushups", "squats", ...; "default", "alice", ...).
+    Writes return a Future resolved once the write is applied; listeners
+    are called with {user: {exercise: {date: total}}} afterwards (total
+    None for a day left empty), the same shape WriteQueue listeners get.
+    """
+
+    name = None
+    supports_hooks = False  # in-transaction hooks, see WriteQueue.add_hook
+    supports_sync = False   # a change log peers can sync with, see sync.py
+    supports_processes = False  # other processes may write it too, see web_process.py
+
+    def __init__(self):
+        self._shared = {}
+        self._shared_lock = threading.RLock()
+        self._reloads = 0
+
+    def shared(self, key, factory):
+        """Per-store singleton built by factory(store), e.g. an in-memory cache
+
+        The desktop UI and the web server reach the same instance, so caches
+        are maintained once per process rather than once per caller.
+        """
+        with self._shared_lock:
+            if key not in self._shared:
+                self._shared[key] = factory(self)
+            return self._shared[key]
+
+    # --- Writes ---
+
+    def log(self, date, count, moment, replace=False, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Append an entry, optionally replacing the rest of that day's entries of the user's exercise"""
+        raise NotImplementedError
+
+    def set_day(self, date, count, moment, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Collapse a day of a user's exercise into a single entry with the given count"""
+        return self.log(date, count, moment, replace=True, exercise=exercise, user=user)
+
+    def import_entries(self, records, report, user=DEFAULT_USER):
+        """Add a user's (exercise, epoch day, epoch ms, count) records not already logged, in one go
+
+        Sets report["inserted"]; listeners hear about every touched day once.
+        Returns the touched (user, exercise, date) triples.
+        """
+        raise NotImplementedError
+
+    def add_listener(self, listener):
+        raise NotImplementedError
+
+    def add_hook(self, hook):
+        raise NotImplementedError(f"{self.name} storage has no write transactions")
+
+    def touch(self, keys):
+        """Bring hooks and listeners up to date with (user, exercise, date) days another process wrote"""
+        raise NotImplementedError(f"{self.name} storage cannot be shared between processes")
+
+    # --- Reads ---
+
+    def day_range(self, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """[(period start date, total)] for periods with entries between start and end"""
+        raise NotImplementedError
+
+    def iter_range(self, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """day_range() as a generator, for streaming long histories"""
+        return iter(self.day_range(start, end, granularity, exercise, user))
+
+    def iter_entries(self, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Yield (datetime, count) for each entry between start and end, in time order"""
+        raise NotImplementedError
+
+    def iter_raw(self, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Yield (epoch day, epoch ms, count) for each entry, in time order, without decoding"""
+        raise NotImplementedError
+
+    def bounds(self, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """(first, last) logged date, or None when nothing is logged"""
+        raise NotImplementedError
+
+    def exercises(self, user=DEFAULT_USER):
+        """Names of a user's exercises, in the order they were first logged"""
+        raise NotImplementedError
+
+    def users(self):
+        """Names of the users the store knows, in the order they first logged"""
+        raise NotImplementedError
+
+    # --- Sync ---
+
+    def sync_state(self):
+        """{"device": this store's device uuid, "vector": {device uuid: last seq held}}"""
+        raise NotImplementedError(f"{self.name} storage keeps no change log")
+
+    def changes_since(self, since, limit):
+        """([change], more): up to `limit` logged changes beyond the vector `since`"""
+        raise NotImplementedError(f"{self.name} storage keeps no change log")
+
+    def apply_changes(self, changes):
+        """Apply a peer's changes (skipping known ones); returns how many were new"""
+        raise NotImplementedError(f"{self.name} storage keeps no change log")
+
+    # --- Maintenance ---
+
+    @property
+    def data_version(self):
+        """A counter that moves after each write, once every listener (and so every shared cache) has seen it
+
+        Anything read while it holds one value may be tagged with that
+        value: a cache still catching up is read under the old one.
+        """
+        return self._reloads
+
+    @property
+    def pending(self):
+        """Writes accepted but not yet applied"""
+        return 0
+
+    @property
+    def last_write_at(self):
+        """time.time() of the last applied write, 0 if none yet"""
+        return 0.0
+
+    def compact(self, older_than_days=365, archive=False):
+        """Fold old raw entries; returns a compaction report, or None if unsupported"""
+        return None
+
+    def backup(self, backup_dir, keep=7):
+        """Snapshot the store into backup_dir; returns a backup report, or None if unsupported"""
+        return None
+
+    def check_health(self, repair=True):
+        """Verify (and repair) the store; returns a health report, or None if there is nothing to check"""
+        return None
+
+    def reload_shared(self):
+        """Reload every shared cache from the store, e.g. after a repair"""
+        with self._shared_lock:
+            shared = list(self._shared.values())
+        for obj in shared:
+            if hasattr(obj, "load"):
+                obj.load()
+        self._reloads += 1
+
+    def stats(self):
+        return {"engine": self.name}
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage(Storage):
+    """The SQLite database, written through its group-committing WriteQueue"""
+
+    name = "sqlite"
+    supports_hooks = True
+    supports_sync = True
+    supports_processes = True
+
+    def __init__(self, path):
+        super().__init__()
+        from migrations import migrate
+        from streaks import StreakEngines
+        self.db = get_manager(path)
+        migrate(self.db)
+        self.shared("streak_engines", StreakEngines)  # the streaks table follows every write, engines or not
+
+    def log(self, date, count, moment, replace=False, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        return self.db.writer.submit(insert_entry(date, count, moment, replace, exercise, user))
+
+    def import_entries(self, records, report, user=DEFAULT_USER):
+        from importer import bulk_insert
+        return self.db.writer.submit(bulk_insert(records, report, user)).result()
+
+    def add_listener(self, listener, local_only=False):
+        self.db.writer.add_listener(listener, local_only)
+
+    def add_hook(self, hook):
+        self.db.writer.add_hook(hook)
+
+    def touch(self, keys):
+        return self.db.writer.touch(keys)
+
+    @property
+    def data_version(self):
+        return self.db.writer.version + self._reloads
+
+    def day_range(self, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        with self.db.read() as conn:
+            return query_range(conn, start, end, granularity, exercise, user)
+
+    def iter_range(self, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        return iter_range(self.db, start, end, granularity, exercise, user)
+
+    def iter_entries(self, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        return iter_entries(self.db, start, end, exercise, user)
+
+    def iter_raw(self, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        return iter_raw(self.db, start, end, exercise, user)
+
+    def bounds(self, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        with self.db.read() as conn:
+            return day_bounds(conn, exercise, user)
+
+    def exercises(self, user=DEFAULT_USER):
+        with self.db.read() as conn:
+            return list_exercises(conn, user)
+
+    def users(self):
+        with self.db.read() as conn:
+            return list_users(conn)
+
+    def sync_state(self):
+        from sync import sync_state
+        with self.db.read() as conn:
+            return sync_state(conn)
+
+    def changes_since(self, since, limit):
+        from sync import changes_since
+        with self.db.read() as conn:
+            return changes_since(conn, since, limit)
+
+    def apply_changes(self, changes):
+        from sync import apply_changes
+        report = {"applied": 0}
+        self.db.writer.submit(apply_changes(changes, report)).result()
+        return report["applied"]
+
+    @property
+    def pending(self):
+        return self.db.writer.depth
+
+    @property
+    def last_write_at(self):
+        return self.db.writer.last_commit_at
+
+    def compact(self, older_than_days=365, archive=False):
+        from compaction import compact
+        return compact(self.db, older_than_days, archive)
+
+    def backup(self, backup_dir, keep=7):
+        from backup import backup
+        return backup(self.db, backup_dir, keep)
+
+    def check_health(self, repair=True):
+        from health import check
+        report = check(self.db, repair)
+        if report["repaired"]:
+            self.reload_shared()
+        return report
+
+    def stats(self):
+        return {"engine": self.name, **self.db.writer.stats()}
+
+    def close(self):
+        self.db.writer.close()
+
+
+# Python equivalents of db.PERIODS: epoch day -> first epoch day of its period
+PERIOD_STARTS = {
+    "day": lambda day: day,
+    "week": lambda day: (day + 3) // 7 * 7 - 3,
+    "month": lambda day: to_day(from_day(day).replace(day=1)),
+    "year": lambda day: to_day(from_day(day).replace(month=1, day=1)),
+}
+
+
+class MemoryStorage(Storage):
+    """Everything in dicts, nothing on disk; for tests, benchmarks and load tests
+
+    Writes are applied synchronously on the caller's thread and listeners
+    are notified before log() returns, under the store lock so they see
+    changes in the order they were made.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.RLock()
+        # Per (user, exercise), in first-logged order:
+        self._entries = {}  # (user, exercise) -> {epoch day -> [(ms, count)] in write order}
+        self._totals = {}   # (user, exercise) -> {epoch day -> total}
+        self._days = {}     # (user, exercise) -> sorted epoch days with entries
+        self._tables(DEFAULT_EXERCISE, DEFAULT_USER)
+        self._listeners = []
+        self._version = 0
+        self.writes = 0
+        self._last_write_at = 0.0
+
+    def _tables(self, exercise, user):
+        """(entries, totals, days) for a user's exercise, registering it on first use"""
+        key = (user, exercise)
+        if key not in self._entries:
+            self._entries[key], self._totals[key], self._days[key] = {}, {}, []
+        return self._entries[key], self._totals[key], self._days[key]
+
+    def _apply(self, exercise, user, day, ms, count, replace):
+        all_entries, totals, days = self._tables(exercise, user)
+        entries = all_entries.get(day)
+        if entries is None:
+            entries = all_entries[day] = []
+            bisect.insort(days, day)
+        if replace:
+            entries.clear()
+            totals[day] = 0
+        entries.append((ms, count))
+        totals[day] = totals.get(day, 0) + count
+
+    def log(self, date, count, moment, replace=False, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        day = to_day(date)
+        with self._lock:
+            self._write(exercise, user, day, to_ms(moment), count, replace)
+            self.writes += 1
+            self._last_write_at = time.time()
+            self._notify({user: {exercise: {date: self._totals[user, exercise][day]}}})
+        future = Future()
+        future.set_result([(user, exercise, date)])
+        return future
+
+    def _write(self, exercise, user, day, ms, count, replace):
+        self._apply(exercise, user, day, ms, count, replace)
+
+    def import_entries(self, records, report, user=DEFAULT_USER):
+        with self._lock:
+            seen = {}  # (exercise, epoch day) -> {(ms, count)} for days met so far
+            try:
+                for exercise, day, ms, count in records:
+                    keys = seen.get((exercise, day))
+                    if keys is None:
+                        keys = seen[exercise, day] = set(self._entries.get((user, exercise), {}).get(day, ()))
+                    if (ms, count) in keys:
+                        continue
+                    keys.add((ms, count))
+                    self._write(exercise, user, day, ms, count, False)
+                    report["inserted"] += 1
+            finally:
+                # No rollback here: whatever was applied before an error stays, so announce it
+                self.writes += 1
+                self._last_write_at = time.time()
+                changes = {}
+                for exercise, day in sorted(seen):
+                    total = self._totals.get((user, exercise), {}).get(day)
+                    changes.setdefault(exercise, {})[from_day(day)] = total
+                if changes:
+                    self._notify({user: changes})
+        return [(user, exercise, from_day(day)) for exercise, day in sorted(seen)]
+
+    def _notify(self, changes):
+        for listener in self._listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"Write listener failed: {e}")
+        self._version += 1
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    @property
+    def data_version(self):
+        return self._version + self._reloads
+
+    def _slice(self, exercise, user, start, end):
+        """Sorted epoch days of a user's exercise between start and end (caller holds the lock)"""
+        days = self._days.get((user, exercise), [])
+        lo = 0 if start is None else bisect.bisect_left(days, to_day(start))
+        hi = len(days) if end is None else bisect.bisect_right(days, to_day(end))
+        return days[lo:hi]
+
+    def day_range(self, start=None, end=None, granularity="day", exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        period_start = PERIOD_STARTS[granularity]
+        out = []
+        with self._lock:
+            totals = self._totals.get((user, exercise), {})
+            for day in self._slice(exercise, user, start, end):
+                period = period_start(day)
+                if out and out[-1][0] == period:
+                    out[-1][1] += totals[day]
+                else:
+                    out.append([period, totals[day]])
+        return [(from_day(period), total) for period, total in out]
+
+    def iter_entries(self, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        with self._lock:
+            entries = self._entries.get((user, exercise), {})
+            days = [sorted(entries[day]) for day in self._slice(exercise, user, start, end)]
+        for day_entries in days:
+            for ms, count in day_entries:
+                yield from_ms(ms), count
+
+    def iter_raw(self, start=None, end=None, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        with self._lock:
+            entries = self._entries.get((user, exercise), {})
+            days = [(day, sorted(entries[day])) for day in self._slice(exercise, user, start, end)]
+        for day, day_entries in days:
+            for ms, count in day_entries:
+                yield day, ms, count
+
+    def bounds(self, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        with self._lock:
+            days = self._days.get((user, exercise))
+            if not days:
+                return None
+            return from_day(days[0]), from_day(days[-1])
+
+    def exercises(self, user=DEFAULT_USER):
+        with self._lock:
+            return [exercise for owner, exercise in self._entries if owner == user]
+
+    def users(self):
+        with self._lock:
+            return list(dict.fromkeys(user for user, _ in self._entries))
+
+    @property
+    def last_write_at(self):
+        return self._last_write_at
+
+    def stats(self):
+        days = sum(len(days) for days in self._days.values())
+        users = len(set(user for user, _ in self._days))
+        return {"engine": self.name, "writes": self.writes, "days": days, "exercises": len(self._days),
+                "users": users}
+
+
+class LogStorage(MemoryStorage):
+    """Append-only binary log on disk with the in-memory index of MemoryStorage
+
+    A write is one fixed-size record appended and flushed to the OS, with
+    no SQL and no per-write fsync; a background thread fsyncs at most once
+    per interval. Opening replays the log to rebuild the index, dropping a
+    torn record left by a crash mid-append.
+
+    Exercises are one-byte ids; a NAME record (same size as an entry)
+    introduces each one before its first entry, except pushups, which is
+    id 1 as in the database. Logs from before exercises (PTLOG01) are
+    rewritten in the current format on open. The log is single-user: all
+    of it belongs to the default user.
+    """
+
+    name = "log"
+    MAGIC = b"PTLOG02\n"
+    RECORD = struct.Struct("<BBiqi")  # op, exercise id, epoch day, epoch ms, count
+    NAME_RECORD = struct.Struct("<BB16s")  # NAME, exercise id, utf-8 name padded with NULs
+    APPEND, REPLACE, NAME = 1, 2, 3
+    V1_MAGIC = b"PTLOG01\n"
+    V1_RECORD = struct.Struct("<Biqi")  # op, epoch day, epoch ms, count
+
+    def __init__(self, path, fsync_interval=1.0):
+        super().__init__()
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.fsyncs = 0
+        self._bulk = False  # defer flushing while importing
+        self._ids = {DEFAULT_EXERCISE: 1}
+        self._replay()
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(self.MAGIC)
+            self._file.flush()
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="pushtimer-log-sync", daemon=True)
+        self._syncer.start()
+
+    def _replay(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if not data:
+            return
+        if data.startswith(self.V1_MAGIC):
+            return self._upgrade_v1(data)
+        if not data.startswith(self.MAGIC):
+            raise ValueError(f"{self.path} is not a pushup log")
+        size = self.RECORD.size
+        body = len(data) - len(self.MAGIC)
+        whole = len(self.MAGIC) + body - body % size
+        names = {1: DEFAULT_EXERCISE}
+        for offset in range(len(self.MAGIC), whole, size):
+            op, ex, day, ms, count = self.RECORD.unpack_from(data, offset)
+            if op == self.NAME:
+                name = self.NAME_RECORD.unpack_from(data, offset)[2].rstrip(b"\0").decode("utf-8")
+                names[ex] = name
+                self._ids[name] = ex
+                self._tables(name, DEFAULT_USER)
+            else:
+                self._apply(names[ex], DEFAULT_USER, day, ms, count, op == self.REPLACE)
+        if whole < len(data):
+            print(f"Dropping a torn {len(data) - whole}-byte record at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(whole)
+
+    def _upgrade_v1(self, data):
+        """Load a pre-exercise log as pushups and rewrite it in the current format"""
+        size = self.V1_RECORD.size
+        body = len(data) - len(self.V1_MAGIC)
+        whole = len(self.V1_MAGIC) + body - body % size
+        for op, day, ms, count in self.V1_RECORD.iter_unpack(data[len(self.V1_MAGIC):whole]):
+            self._apply(DEFAULT_EXERCISE, DEFAULT_USER, day, ms, count, op == self.REPLACE)
+        upgraded = self.path.with_name(self.path.name + ".upgrade")
+        with open(upgraded, "wb") as f:
+            f.write(self.MAGIC)
+            key = (DEFAULT_USER, DEFAULT_EXERCISE)
+            for day in self._days[key]:
+                for ms, count in self._entries[key][day]:
+                    f.write(self.RECORD.pack(self.APPEND, 1, day, ms, count))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(upgraded, self.path)
+        print(f"Upgraded {self.path} to the exercise-aware log format")
+
+    def _exercise_id(self, exercise, user):
+        """Id for an exercise, appending its NAME record on first use"""
+        if user != DEFAULT_USER:
+            raise ValueError(f"The log engine is single-user and cannot store entries of {user!r}")
+        ex = self._ids.get(exercise)
+        if ex is None:
+            encoded = exercise.encode("utf-8")
+            if len(encoded) > 16 or len(self._ids) >= 255:
+                raise ValueError(f"The log engine cannot store exercise {exercise!r} (max 255 names of 16 bytes)")
+            ex = self._ids[exercise] = len(self._ids) + 1
+            self._file.write(self.NAME_RECORD.pack(self.NAME, ex, encoded))
+        return ex
+
+    def _write(self, exercise, user, day, ms, count, replace):
+        ex = self._exercise_id(exercise, user)
+        self._file.write(self.RECORD.pack(self.REPLACE if replace else self.APPEND, ex, day, ms, count))
+        if not self._bulk:
+            self._file.flush()
+        self._dirty.set()
+        self._apply(exercise, user, day, ms, count, replace)
+
+    def import_entries(self, records, report, user=DEFAULT_USER):
+        with self._lock:
+            self._bulk = True
+            try:
+                return super().import_entries(records, report, user)
+            finally:
+                self._bulk = False
+                self._file.flush()
+
+    def _sync_loop(self):
+        while not self._closed.is_set():
+            self._dirty.wait()
+            if self._closed.wait(self.fsync_interval):
+                break
+            self._sync()
+
+    def _sync(self):
+        # Outside the lock so writes keep flowing; close() joins us before closing the file
+        self._dirty.clear()
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+
+    def stats(self):
+        return {**super().stats(), "bytes": self._file.tell(), "fsyncs": self.fsyncs}
+
+    def close(self):
+        self._closed.set()
+        self._dirty.set()  # wake the syncer so it sees the close
+        self._syncer.join(self.fsync_interval + 1)
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+ENGINES = {
+    "sqlite": SQLiteStorage,
+    "memory": lambda path: MemoryStorage(),
+    "log": LogStorage,
+}
+
+# Default file name per engine inside the data directory
+FILENAMES = {"sqlite": "pushups.db", "memory": None, "log": "pushups.log"}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_storage(engine="sqlite", path=None):
+    """Return the process-wide store for an engine and file (path unused for memory)"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown storage engine {engine!r} (expected one of {', '.join(ENGINES)})")
+    key = (engine, str(Path(path).resolve()) if path is not None else None)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ENGINES[engine](path)
+        return store
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Streak tracking: runs of consecutive days with at least one pushup
+"""
+
+import bisect
+import datetime
+import threading
+from db import DEFAULT_EXERCISE, DEFAULT_USER, EXERCISE_ID_SQL, exercise_id, to_day, from_day
+
+# Gaps-and-islands: consecutive active days of an exercise share the same (day - row_number)
+ISLANDS_SQL = '''
+    SELECT exercise, MIN(day), MAX(day), COUNT(*) FROM (
+        SELECT exercise, day, day - ROW_NUMBER() OVER (PARTITION BY exercise ORDER BY day) AS grp
+        FROM daily_totals WHERE total > 0
+    )
+    GROUP BY exercise, grp
+'''
+
+
+def rebuild_streaks(conn, exercise=None):
+    """Recompute the streaks table in one set-based pass, for every exercise or one exercise id;
+    returns the run count"""
+    if exercise is None:
+        conn.execute("DELETE FROM streaks")
+        cursor = conn.execute(f"INSERT INTO streaks (exercise, start, end, length) {ISLANDS_SQL}")
+        return cursor.rowcount
+    conn.execute("DELETE FROM streaks WHERE exercise = ?", (exercise,))
+    cursor = conn.execute('''
+        INSERT INTO streaks (exercise, start, end, length)
+        SELECT exercise, MIN(day), MAX(day), COUNT(*) FROM (
+            SELECT exercise, day, day - ROW_NUMBER() OVER (ORDER BY day) AS grp
+            FROM daily_totals WHERE exercise = ? AND total > 0
+        )
+        GROUP BY grp
+    ''', (exercise,))
+    return cursor.rowcount
+
+
+def islands(days):
+    """Runs [start, end] of consecutive epoch days, from days in ascending order"""
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] == day - 1:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+class StreakEngines:
+    """The write hook and listener of a store's streak engines, routing changes to the engines they concern
+
+    Engines are per user and exercise. With hundreds of users, a hook per
+    engine would cost every commit a savepoint per engine; routing costs
+    one dict lookup per changed (user, exercise). A change with no engine
+    in this process still rebuilds that exercise's streaks rows, so an
+    engine loaded later (here or in another process) reads current runs.
+    """
+
+    def __init__(self, storage):
+        self._lock = threading.Lock()
+        self.engines = {}  # (user, exercise) -> StreakEngine
+        if storage.supports_hooks:
+            # Persisted in the streaks table, inside the same transaction as the write
+            storage.add_hook(self._apply)
+            storage.add_listener(self._committed)
+        else:
+            storage.add_listener(lambda changes: self._apply(None, changes))
+
+    def add(self, engine):
+        with self._lock:
+            self.engines[engine.user, engine.exercise] = engine
+
+    def _routes(self, changes):
+        """[(engine, {date: total})] for the engines whose days changed"""
+        with self._lock:
+            return [
+                (self.engines[user, exercise], days)
+                for user, exercises in changes.items()
+                for exercise, days in exercises.items()
+                if (user, exercise) in self.engines
+            ]
+
+    def _unrouted(self, changes):
+        """[(user, exercise)] changed without an engine here"""
+        with self._lock:
+            return [
+                (user, exercise)
+                for user, exercises in changes.items()
+                for exercise in exercises
+                if (user, exercise) not in self.engines
+            ]
+
+    def _apply(self, conn, changes):
+        if conn is not None:
+            for user, exercise in self._unrouted(changes):
+                conn.execute("SAVEPOINT streak")
+                try:
+                    ex = exercise_id(conn, exercise, user=user)
+                    if ex is not None:
+                        rebuild_streaks(conn, ex)
+                    conn.execute("RELEASE streak")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO streak")
+                    conn.execute("RELEASE streak")
+                    print(f"Streak rebuild for {user}/{exercise} failed: {e}")
+        for engine, days in self._routes(changes):
+            if conn is None:
+                engine._apply(None, days)
+                continue
+            # Each engine in its own savepoint, as separate hooks would be
+            conn.execute("SAVEPOINT streak")
+            try:
+                engine._apply(conn, days)
+                conn.execute("RELEASE streak")
+            except Exception as e:
+                conn.execute("ROLLBACK TO streak")
+                conn.execute("RELEASE streak")
+                print(f"Streak update for {engine.user}/{engine.exercise} failed: {e}")
+
+    def _committed(self, changes):
+        for engine, _ in self._routes(changes):
+            engine._committed()
+
+
+class StreakEngine:
+    """In-memory streak runs kept current by the write path
+
+    Runs are [start, end] epoch days sorted by start. A write touching a
+    day only merges or splits the runs next to it, so logging today or
+    editing an old day never rescans the history. One engine per user
+    and exercise, fed by the store's StreakEngines.
+    """
+
+    def __init__(self, storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        self.store = storage
+        self.exercise = exercise
+        self.user = user
+        self._lock = threading.Lock()
+        self._in_flight = False  # hook ran, commit not yet confirmed
+        self._hook_ok = False
+        self.load()
+        storage.shared("streak_engines", StreakEngines).add(self)
+
+    def load(self, conn=None):
+        """Read the persisted runs (rebuilding them if the table is empty), or
+        derive them from the daily totals on stores without a streaks table"""
+        if not self.store.supports_hooks:
+            days = self.store.day_range(exercise=self.exercise, user=self.user)
+            runs = islands(to_day(date) for date, total in days if total > 0)
+        elif conn is None:
+            with self.store.db.write() as conn:
+                return self.load(conn)
+        else:
+            query = f"SELECT start, end FROM streaks WHERE exercise = {EXERCISE_ID_SQL} ORDER BY start"
+            rows = conn.execute(query, (self.exercise, self.user)).fetchall()
+            if not rows and conn.execute(
+                f"SELECT 1 FROM daily_totals WHERE exercise = {EXERCISE_ID_SQL} AND total > 0 LIMIT 1",
+                (self.exercise, self.user)
+            ).fetchone():
+                rebuild_streaks(conn, exercise_id(conn, self.exercise, user=self.user))
+                rows = conn.execute(query, (self.exercise, self.user)).fetchall()
+            runs = [[start, end] for start, end in rows]
+        with self._lock:
+            self.runs = runs
+
+    # --- Write path ---
+
+    def _apply(self, conn, days):
+        """Writer hook (via StreakEngines): update the runs around each changed day and persist them
+
+        conn is None on stores without hooks; the runs then live only in memory.
+        """
+        if conn is None:
+            with self._lock:
+                for date, total in sorted(days.items()):
+                    self._set_day(self.runs, to_day(date), (total or 0) > 0)
+            return
+        if self._in_flight:
+            self.load(conn)  # the previous batch never committed
+        self._in_flight = True
+        self._hook_ok = False
+        touched = set()
+        with self._lock:
+            for date, total in sorted(days.items()):
+                touched.update(self._set_day(self.runs, to_day(date), (total or 0) > 0))
+            current = {start: self._find(start) for start in touched}
+        if current:
+            ex = exercise_id(conn, self.exercise, user=self.user)
+        for start, run in current.items():
+            if run is not None and run[0] == start:
+                conn.execute(
+                    "INSERT OR REPLACE INTO streaks (exercise, start, end, length) VALUES (?, ?, ?, ?)",
+                    (ex, start, run[1], run[1] - start + 1)
+                )
+            else:
+                conn.execute("DELETE FROM streaks WHERE exercise = ? AND start = ?", (ex, start))
+        self._hook_ok = True
+
+    def _committed(self):
+        """Writer listener (via StreakEngines): the batch is durable, or reload if the hook failed"""
+        self._in_flight = False
+        if not self._hook_ok:
+            self.load()
+
+    @staticmethod
+    def _set_day(runs, day, active):
+        """Mark one day (in)active; returns the start days of runs touched"""
+        i = bisect.bisect_right(runs, [day, float("inf")]) - 1
+        inside = i >= 0 and runs[i][0] <= day <= runs[i][1]
+        if active == inside:
+            return ()
+
+        if not active:
+            start, end = runs.pop(i)
+            pieces = [p for p in ([start, day - 1], [day + 1, end]) if p[0] <= p[1]]
+            runs[i:i] = pieces
+            return [start] + [p[0] for p in pieces]
+
+        touched = [day]
+        start = end = day
+        if i + 1 < len(runs) and runs[i + 1][0] == day + 1:
+            end = runs.pop(i + 1)[1]
+            touched.append(day + 1)
+        if i >= 0 and runs[i][1] == day - 1:
+            start = runs.pop(i)[0]
+            touched.append(start)
+            i -= 1
+        runs.insert(i + 1, [start, end])
+        return touched
+
+    def _find(self, day):
+        """The run containing an epoch day, or None (caller holds the lock)"""
+        i = bisect.bisect_right(self.runs, [day, float("inf")]) - 1
+        if i >= 0 and self.runs[i][0] <= day <= self.runs[i][1]:
+            return self.runs[i]
+        return None
+
+    # --- Queries ---
+
+    def current(self, today=None):
+        """Length of the run through today, or through yesterday if today is not logged yet"""
+        today = to_day(today or datetime.date.today())
+        with self._lock:
+            for day in (today, today - 1):
+                run = self._find(day)
+                if run is not None:
+                    return day - run[0] + 1
+        return 0
+
+    def longest(self):
+        with self._lock:
+            return max((end - start + 1 for start, end in self.runs), default=0)
+
+    def history(self):
+        """Every streak, oldest first"""
+        with self._lock:
+            runs = list(self.runs)
+        return [
+            {"start": from_day(start).isoformat(), "end": from_day(end).isoformat(), "length": end - start + 1}
+            for start, end in runs
+        ]
+
+
+def get_streak_engine(storage, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+    """The StreakEngine for a user's exercise shared by everything using this store"""
+    return storage.shared(("streaks", exercise, user), lambda store: StreakEngine(store, exercise, user))
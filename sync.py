@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Delta sync between databases: each device's change log, exchanged by sequence number
+
+Every database writes as one device (a random uuid) and numbers its
+writes 1, 2, 3... in the changes table. A peer's progress is therefore a
+version vector {device uuid: last seq held}, and a sync sends exactly the
+changes beyond it: traffic follows what changed, not the size of the
+history. Edits (resets of a day) merge without conflicts, see
+db.apply_change.
+
+Try it on loopback with two servers and one command:
+
+    python web_server.py sqlite 8081 a.db
+    python manage.py --db b.db sync http://127.0.0.1:8081
+"""
+
+import datetime
+import json
+import time
+import urllib.request
+from db import (
+    DEFAULT_USER, APPEND, RESET, to_day, from_day, local_device, device_id, last_seq, exercise_id, apply_change,
+)
+
+PAGE_SIZE = 2000  # changes per request
+MAX_PAGE = 10000  # the most a server sends or accepts at once
+OPS = {"append": APPEND, "reset": RESET}
+OP_NAMES = {code: name for name, code in OPS.items()}
+
+
+# --- Server side: reads and a writer op over the change log ---
+
+def version_vector(conn):
+    """{device uuid: last seq} for every device with logged changes"""
+    vector = {}
+    for device, device_uuid in conn.execute("SELECT id, uuid FROM devices ORDER BY id").fetchall():
+        seq = last_seq(conn, device)
+        if seq:
+            vector[device_uuid] = seq
+    return vector
+
+
+def sync_state(conn):
+    return {"device": local_device(conn)[1], "vector": version_vector(conn)}
+
+
+def changes_since(conn, since, limit=PAGE_SIZE):
+    """([change], more): up to `limit` changes beyond the vector `since`, in seq order per device"""
+    out = []
+    more = False
+    for device, device_uuid in conn.execute("SELECT id, uuid FROM devices ORDER BY id").fetchall():
+        room = limit - len(out)
+        rows = conn.execute(
+            "SELECT c.seq, c.op, u.name, e.name, c.day, c.ts, c.count FROM changes AS c "
+            "JOIN exercises AS e ON e.id = c.exercise JOIN users AS u ON u.id = e.user "
+            "WHERE c.device = ? AND c.seq > ? ORDER BY c.seq LIMIT ?",
+            (device, since.get(device_uuid, 0), room + 1)
+        ).fetchall()
+        if len(rows) > room:
+            rows, more = rows[:room], True
+        out += [
+            {"device": device_uuid, "seq": seq, "op": OP_NAMES[op], "user": user, "exercise": name,
+             "date": from_day(day).isoformat(), "ts": ts, "count": count}
+            for seq, op, user, name, day, ts, count in rows
+        ]
+        if more:
+            break
+    return out, more
+
+
+def _decode(change):
+    try:
+        return (
+            str(change["device"]), int(change["seq"]), OPS[change["op"]],
+            str(change.get("user", DEFAULT_USER)), str(change["exercise"]),
+            datetime.date.fromisoformat(change["date"]), int(change["ts"]), int(change["count"]),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed change {change!r}") from e
+
+
+def apply_changes(changes, report):
+    """Writer op: apply a peer's changes, skipping ones already logged; returns the touched days
+
+    Each device's log must arrive without gaps (a vector only says "up
+    to seq N"), so a change skipping ahead fails the whole batch.
+    """
+    def op(conn):
+        devices = {}  # uuid -> [id, last seq]
+        exercises = {}  # (user, exercise) -> id
+        touched = set()
+        for change in changes:
+            device_uuid, seq, code, user, name, date, ts, count = _decode(change)
+            known = devices.get(device_uuid)
+            if known is None:
+                device = device_id(conn, device_uuid)
+                known = devices[device_uuid] = [device, last_seq(conn, device)]
+            if seq <= known[1]:
+                continue
+            if seq != known[1] + 1:
+                raise ValueError(f"Change {seq} of device {device_uuid} arrived before change {known[1] + 1}")
+            ex = exercises.get((user, name))
+            if ex is None:
+                ex = exercises[user, name] = exercise_id(conn, name, create=True, user=user)
+            apply_change(conn, known[0], seq, code, ex, to_day(date), ts, count)
+            known[1] = seq
+            report["applied"] += 1
+            touched.add((user, name, date))
+        return sorted(touched)
+    return op
+
+
+# --- Client side: one round of pull then push against a peer's web server ---
+
+def _request(url, payload=None, timeout=30):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.load(response)
+
+
+def sync_with(store, peer, page=PAGE_SIZE, timeout=30):
+    """Pull what the peer has beyond our vector, then push what it lacks; returns a report
+
+    `peer` is the base URL of its web server, e.g. http://192.168.1.20:8080.
+    """
+    peer = peer.rstrip("/")
+    report = {"peer": peer, "pulled": 0, "pushed": 0, "applied": 0, "requests": 0}
+    began = time.perf_counter()
+
+    more = True
+    while more:
+        reply = _request(f"{peer}/api/sync/pull", {"since": store.sync_state()["vector"], "limit": page}, timeout)
+        report["requests"] += 1
+        report["pulled"] += len(reply["changes"])
+        report["applied"] += store.apply_changes(reply["changes"])
+        more = reply["more"]
+
+    theirs = _request(f"{peer}/api/sync/state", timeout=timeout)["vector"]
+    report["requests"] += 1
+    while True:
+        changes, more = store.changes_since(theirs, page)
+        if not changes:
+            break
+        theirs = _request(f"{peer}/api/sync/push", {"changes": changes}, timeout)["vector"]
+        report["requests"] += 1
+        report["pushed"] += len(changes)
+        if not more:
+            break
+
+    report["seconds"] = time.perf_counter() - began
+    return report
+
+
+def describe(report):
+    return (f"Synced with {report['peer']}: pulled {report['pulled']} ({report['applied']} new), "
+            f"pushed {report['pushed']} changes in {report['requests']} requests, {report['seconds']:.2f} s")
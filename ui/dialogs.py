@@ -1,20 +1,22 @@
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
     QSpinBox, QMessageBox, QFormLayout, QComboBox, QCheckBox,
-    QLineEdit, QDialogButtonBox, QWidget, QApplication
+    QLineEdit, QDialogButtonBox, QWidget, QApplication, QDateEdit
 )
-from PySide6.QtCore import Qt, Signal, QTimer, QPoint, QPropertyAnimation, QEasingCurve
+from PySide6.QtCore import Qt, Signal, QTimer, QPoint, QPropertyAnimation, QEasingCurve, QDate
 from PySide6.QtGui import QFont, QMouseEvent, QPainter, QColor, QPen, QBrush
 
 class NotificationDialog(QWidget):
     """Non-modal notification with 10-second grace period - Modern Dark Theme"""
-    action_taken = Signal(int)  # Signal: -2=grace cancel, -1=snooze, 0=skip, >0=pushup count
+    action_taken = Signal(int, str)  # Signal: (-2=grace cancel, -1=snooze, 0=skip, >0=rep count; exercise)
     
-    def __init__(self, parent=None):
+    def __init__(self, exercises=("pushups",), parent=None):
         super().__init__(parent)
         self.setWindowFlags(Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
-        self.setFixedSize(380, 280)
+        self.setFixedSize(380, 330)
+        
+        self.exercises = list(exercises)
         
         self.grace_period_active = True
         self.grace_seconds_left = 10
@@ -32,7 +34,7 @@ class NotificationDialog(QWidget):
                 border-radius: 20px;
             }
         """)
-        main_widget.setGeometry(0, 0, 380, 280)
+        main_widget.setGeometry(0, 0, 380, 330)
         
         layout = QVBoxLayout(main_widget)
         layout.setContentsMargins(25, 25, 25, 25)
@@ -73,11 +75,28 @@ class NotificationDialog(QWidget):
         quote = random.choice(quotes)
         
         # Message
-        message = QLabel(f"35 minutes are up!\nHow many pushups did you do?\n\n<i>{quote}</i>")
+        message = QLabel(f"35 minutes are up!\nHow many reps did you do?\n\n<i>{quote}</i>")
         message.setAlignment(Qt.AlignCenter)
         message.setStyleSheet("color: #ffffff; font-size: 14px; line-height: 1.4;")
         layout.addWidget(message)
         
+        # Exercise picker
+        self.exercise_combo = QComboBox()
+        for exercise in self.exercises:
+            self.exercise_combo.addItem(exercise.capitalize(), exercise)
+        self.exercise_combo.setStyleSheet("""
+            QComboBox {
+                background: #1a1d24;
+                color: #00ff88;
+                font-size: 13px;
+                font-weight: bold;
+                border: 2px solid #00ff88;
+                border-radius: 10px;
+                padding: 4px 12px;
+            }
+        """)
+        layout.addWidget(self.exercise_combo)
+        
         # Input with + / - buttons
         input_layout = QHBoxLayout()
         input_layout.setSpacing(0)
@@ -246,7 +265,7 @@ class NotificationDialog(QWidget):
     def take_action(self, action_type):
         self.grace_timer.stop()
         self.auto_close_timer.stop()
-        self.action_taken.emit(action_type)
+        self.action_taken.emit(action_type, self.exercise_combo.currentData())
         self.close()
         
     def showEvent(self, event):
@@ -262,9 +281,9 @@ class NotificationDialog(QWidget):
         if self.grace_period_active:
             self.grace_timer.stop()
             self.auto_close_timer.stop()
-            self.action_taken.emit(-2)
+            self.action_taken.emit(-2, self.exercise_combo.currentData())
         else:
-            self.action_taken.emit(0)
+            self.action_taken.emit(0, self.exercise_combo.currentData())
         
         event.accept()
         
@@ -350,3 +369,66 @@ class SettingsDialog(QDialog):
             "daily_goal": self.goal_spinbox.value(),
             "sound_enabled": self.sound_check.isChecked()
         }
+
+
+class ExportDialog(QDialog):
+    """Pick what to export: raw entries or rollups, format, compression and range"""
+    LEVELS = [("Daily totals", "day"), ("Weekly totals", "week"), ("Monthly totals", "month"), ("Raw entries", "raw")]
+    FORMATS = [("CSV", "csv"), ("JSON Lines", "jsonl")]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Export")
+        self.setup_ui()
+        
+    def setup_ui(self):
+        layout = QFormLayout(self)
+        
+        self.level_combo = QComboBox()
+        for label, level in self.LEVELS:
+            self.level_combo.addItem(label, level)
+        layout.addRow("Export:", self.level_combo)
+        
+        self.format_combo = QComboBox()
+        for label, fmt in self.FORMATS:
+            self.format_combo.addItem(label, fmt)
+        layout.addRow("Format:", self.format_combo)
+        
+        self.gzip_check = QCheckBox()
+        layout.addRow("Compress (gzip):", self.gzip_check)
+        
+        self.all_check = QCheckBox()
+        self.all_check.setChecked(True)
+        layout.addRow("All history:", self.all_check)
+        
+        today = QDate.currentDate()
+        self.start_edit = QDateEdit(today.addYears(-1))
+        self.end_edit = QDateEdit(today)
+        for edit in (self.start_edit, self.end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+            edit.setEnabled(False)
+            self.all_check.toggled.connect(lambda checked, e=edit: e.setEnabled(not checked))
+        layout.addRow("From:", self.start_edit)
+        layout.addRow("To:", self.end_edit)
+        
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        
+    def get_options(self):
+        """dict of export() keyword arguments: fmt, level, start, end, compress"""
+        start = end = None
+        if not self.all_check.isChecked():
+            start = self.start_edit.date().toPython()
+            end = self.end_edit.date().toPython()
+        return {
+            "fmt": self.format_combo.currentData(),
+            "level": self.level_combo.currentData(),
+            "start": start,
+            "end": end,
+            "compress": self.gzip_check.isChecked()
+        }
@@ -4,10 +4,11 @@ from PySide6.QtGui import QPainter, QColor, QBrush, QPen, QFont
 import datetime
 
 class HeatmapWidget(QWidget):
-    def __init__(self, tracker):
+    def __init__(self, tracker, exercise="pushups"):
         super().__init__()
         self.tracker = tracker
-        self.data = tracker.get_all_data()
+        self.exercise = exercise
+        self.load_data()
         self.cell_size = 14
         self.cell_margin = 3
         self.setMouseTracking(True)
@@ -16,9 +17,20 @@ class HeatmapWidget(QWidget):
         
         # Debug: print loaded data
         print(f"[Heatmap] Loaded {len(self.data)} entries")
-        for date, count in sorted(self.data.items())[-5:]:
+        for date, count in list(self.data.items())[-5:]:
             print(f"  {date}: {count}")
         
+    def load_data(self):
+        # Only the 53 weeks on screen
+        today = QDate.currentDate()
+        start_date = today.addDays(-(52 * 7) - (today.dayOfWeek() - 1))
+        self.data = self.tracker.get_series(start_date.toPython(), today.toPython(), self.exercise)
+        
+    def set_exercise(self, exercise):
+        self.exercise = exercise
+        self.load_data()
+        self.update()
+        
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -31,10 +43,11 @@ class HeatmapWidget(QWidget):
         # We want to start on a Monday, so subtract (dayOfWeek - 1) to get to current week's Monday
         # then go back 52 weeks
         start_date = today.addDays(-(52 * 7) - (today.dayOfWeek() - 1))
+        start_day = start_date.toPython().toordinal()
         print(f"[Heatmap] Start date: {start_date.toString('yyyy-MM-dd')}")
         
         # Calculate max for scaling
-        max_count = max(self.data.values()) if self.data else 1
+        max_count = self.data.max() if self.data else 1
         
         x_offset = 40
         y_offset = 25
@@ -81,11 +94,7 @@ class HeatmapWidget(QWidget):
                     current_date = current_date.addDays(1)
                     continue
                     
-                date_str = current_date.toString("yyyy-MM-dd")
-                count = self.data.get(date_str, 0)
-                
-                if count > 0:
-                    print(f"[Heatmap] MATCH: {date_str} = {count} at week {week}, day {day_idx}, x={week_x}")
+                count = self.data.value_at(start_day + week * 7 + day_idx)
                 
                 # Determine color level (0-4)
                 if count == 0:
@@ -149,13 +158,13 @@ class HeatmapWidget(QWidget):
         cell_y = (pos.y() - y_offset) // (self.cell_size + self.cell_margin)
         
         if 0 <= cell_x < 53 and 0 <= cell_y < 7:
-            check_date = start_date.addDays(int(cell_x) * 7 + int(cell_y))
-            date_str = check_date.toString("yyyy-MM-dd")
-            count = self.data.get(date_str, 0)
+            offset = int(cell_x) * 7 + int(cell_y)
+            date_str = start_date.addDays(offset).toString("yyyy-MM-dd")
+            count = self.data.value_at(start_date.toPython().toordinal() + offset)
             
             QToolTip.showText(
                 event.globalPosition().toPoint(),
-                f"<b>{date_str}</b><br>{count} pushups",
+                f"<b>{date_str}</b><br>{count} {self.exercise}",
                 self
             )
     
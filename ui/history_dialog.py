@@ -12,6 +12,7 @@ class HistoryDialog(QDialog):
         self.tracker = tracker
         self.setup_ui()
         self.load_data()
+        self.tracker.data_changed.connect(self.load_data)
         
     def setup_ui(self):
         self.setWindowTitle("Edit History")
@@ -73,21 +74,22 @@ class HistoryDialog(QDialog):
         layout.addWidget(close_btn)
         
     def load_data(self):
-        data = self.tracker.get_all_data()
-        # Sort by date desc
-        sorted_dates = sorted(data.keys(), reverse=True)
+        # Newest first
+        rows = self.tracker.get_range()[::-1]
         
-        self.table.setRowCount(len(sorted_dates))
+        self.table.setRowCount(len(rows))
         
-        for i, date_str in enumerate(sorted_dates):
-            count = data[date_str]
-            
-            date_item = QTableWidgetItem(date_str)
+        for i, (date, count) in enumerate(rows):
+            date_item = QTableWidgetItem(date.isoformat())
             count_item = QTableWidgetItem(str(count))
             
             self.table.setItem(i, 0, date_item)
             self.table.setItem(i, 1, count_item)
             
+    def done(self, result):
+        self.tracker.data_changed.disconnect(self.load_data)
+        super().done(result)
+            
     def on_cell_clicked(self, row, col):
         date_str = self.table.item(row, 0).text()
         count = int(self.table.item(row, 1).text())
@@ -108,5 +110,4 @@ class HistoryDialog(QDialog):
         
         if reply == QMessageBox.Yes:
             self.tracker.update_pushups_for_date(date_str, count)
-            self.load_data()
             QMessageBox.information(self, "Success", "History updated!")
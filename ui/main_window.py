@@ -29,6 +29,8 @@ class MainWindow(QMainWindow):
         self.setup_actions()
         self.setup_timers()
         self.load_theme()
+        # Writes are committed on the writer thread; refresh once they land
+        self.tracker.data_changed.connect(self.update_today_total)
         
     def setup_ui(self):
         self.setWindowTitle("Pushup Timer")
@@ -342,31 +344,34 @@ class MainWindow(QMainWindow):
         if self.tracker.config.get("sound_enabled", True):
             sounds.play_sound()
             
-        self._notification_dialog = NotificationDialog()
+        self._reminder_id = self.tracker.reminder_shown()
+        self._notification_dialog = NotificationDialog(self.tracker.get_exercises())
         self._notification_dialog.action_taken.connect(self.on_notification_closed)
         self._notification_dialog.show()
         
-    def on_notification_closed(self, action_type):
+    def on_notification_closed(self, action_type, exercise):
         if hasattr(self, '_notification_dialog'):
             self._notification_dialog.deleteLater()
             self._notification_dialog = None
             
         if action_type == -2: # Grace cancel
+            self.tracker.reminder_dismissed(self._reminder_id)
             self.show_notification("Reminder Cancelled", "No action taken.")
             return
             
         elif action_type == -1: # Snooze
+            self.tracker.reminder_snoozed(self._reminder_id, 5)
             self.tracker.pause_timer()
             self.next_reminder = QDateTime.currentDateTime().addSecs(5 * 60)
-            QTimer.singleShot(5 * 60 * 1000, self.snooze_ended)
+            reminder = self._reminder_id
+            QTimer.singleShot(5 * 60 * 1000, lambda: self.snooze_ended(reminder))
             
             self.pause_btn.setText("▶ Resume Timer")
             self.show_notification("Snoozed", "Back in 5 minutes! 💤")
             return
             
         elif action_type >= 0:
-            self.tracker.save_pushups(action_type)
-            self.update_today_total()
+            self.tracker.save_pushups(action_type, exercise, self._reminder_id)
             
             self.tracker.start_timer()
             self.next_reminder = QDateTime.currentDateTime().addSecs(
@@ -374,11 +379,13 @@ class MainWindow(QMainWindow):
             )
             
             if action_type > 0:
-                self.show_notification("BEAST MODE! 💪", f"{action_type} pushups logged. Keep it up!")
+                self.show_notification("BEAST MODE! 💪", f"{action_type} {exercise} logged. Keep it up!")
             else:
                 self.show_notification("Skipped", "No worries, get them next time.")
             
-    def snooze_ended(self):
+    def snooze_ended(self, reminder=None):
+        if reminder is not None:
+            self.tracker.reminder_dismissed(reminder)
         self.tracker.resume_timer()
         self.next_reminder = QDateTime.currentDateTime().addSecs(
             self.tracker.config.get("timer_minutes", 35) * 60
@@ -457,7 +464,7 @@ class MainWindow(QMainWindow):
         
         def update_qr():
             ip = ip_combo.currentText()
-            url = f"http://{ip}:8080"
+            url = f"http://{ip}:{self.tracker.config.get('web_port', 8080)}"
             
             # QR Code
             qr = qrcode.QRCode(version=1, box_size=8, border=2)
@@ -538,7 +545,13 @@ class MainWindow(QMainWindow):
         dialog.setStyleSheet("background: #1a1d24; color: white;")
         
         layout = QVBoxLayout(dialog)
+        exercise_combo = QComboBox()
+        for exercise in self.tracker.get_exercises():
+            exercise_combo.addItem(exercise.capitalize(), exercise)
+        exercise_combo.setStyleSheet("background: #2d333b; color: white; padding: 4px;")
+        layout.addWidget(exercise_combo)
         heatmap = HeatmapWidget(self.tracker)
+        exercise_combo.currentIndexChanged.connect(lambda: heatmap.set_exercise(exercise_combo.currentData()))
         layout.addWidget(heatmap)
         
         close_btn = QPushButton("Close")
@@ -1,17 +1,55 @@
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
-    QWidget, QFrame, QFileDialog, QMessageBox
+    QWidget, QFrame, QFileDialog, QMessageBox, QProgressDialog, QComboBox
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal, QObject, QRectF
 from PySide6.QtGui import QPainter, QBrush, QColor, QFont
 import datetime
+import os
+import threading
+from ui.dialogs import ExportDialog
+
+
+class ExportWorker(QObject):
+    """Runs tracker.export on a background thread; signals arrive on the Qt thread"""
+    progress = Signal(int)
+    finished = Signal(int)  # bytes written
+    failed = Signal(str)
+    
+    def __init__(self, tracker, file_path, options):
+        super().__init__()
+        self.tracker = tracker
+        self.file_path = file_path
+        self.options = options
+        self.cancelled = False
+        
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        
+    def report(self, percent):
+        if self.cancelled:
+            raise InterruptedError("Export cancelled")
+        self.progress.emit(percent)
+        
+    def run(self):
+        try:
+            written = self.tracker.export(self.file_path, progress=self.report, **self.options)
+        except Exception as e:
+            try:
+                os.remove(self.file_path)  # don't leave a truncated export behind
+            except OSError:
+                pass
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(written)
+
 
 class StatsDialog(QDialog):
     def __init__(self, tracker, parent=None):
         super().__init__(parent)
         self.tracker = tracker
         self.setWindowTitle("Statistics Dashboard")
-        self.setMinimumSize(700, 500)
+        self.setMinimumSize(760, 760)
         self.setStyleSheet("background: #0f1115; color: white;")
         self.init_ui()
         
@@ -20,42 +58,92 @@ class StatsDialog(QDialog):
         layout.setContentsMargins(30, 30, 30, 30)
         layout.setSpacing(20)
         
-        # Header
+        # Header with the exercise picker
+        header_layout = QHBoxLayout()
         header = QLabel("Performance Stats")
         header.setStyleSheet("font-size: 24px; font-weight: bold; color: #ffffff;")
-        layout.addWidget(header)
+        header_layout.addWidget(header)
+        header_layout.addStretch()
+        
+        self.exercise_combo = QComboBox()
+        for exercise in self.tracker.get_exercises():
+            self.exercise_combo.addItem(exercise.capitalize(), exercise)
+        self.exercise_combo.setStyleSheet("background: #2d333b; color: white; padding: 6px; border-radius: 6px;")
+        self.exercise_combo.currentIndexChanged.connect(self.refresh_stats)
+        header_layout.addWidget(self.exercise_combo)
+        layout.addLayout(header_layout)
         
         # Stats Cards
         stats_layout = QHBoxLayout()
-        stats = self.tracker.get_stats()
-        streak = self.tracker.get_streak()
-        
-        stats_layout.addWidget(self.create_card("Total 🔥", str(stats['total']), "#ff9800"))
-        stats_layout.addWidget(self.create_card("Best Day 🏆", str(stats['best_day']), "#00ff88"))
-        stats_layout.addWidget(self.create_card("Streak ⚡", str(streak), "#7000ff"))
-        stats_layout.addWidget(self.create_card("Avg/Day 📈", str(stats['avg']), "#00d4ff"))
+        self.cards = {}
+        for key, title, color in [
+            ("total", "Total 🔥", "#ff9800"),
+            ("best_day", "Best Day 🏆", "#00ff88"),
+            ("streak", "Streak ⚡", "#7000ff"),
+            ("longest", "Longest 🏅", "#ff4081"),
+            ("avg", "Avg/Day 📈", "#00d4ff"),
+        ]:
+            card, self.cards[key] = self.create_card(title, "", color)
+            stats_layout.addWidget(card)
         
         layout.addLayout(stats_layout)
         
+        # Recent streaks, newest first
+        self.streaks_label = QLabel()
+        self.streaks_label.setWordWrap(True)
+        self.streaks_label.setStyleSheet("color: #8b9bb4; font-size: 12px;")
+        layout.addWidget(self.streaks_label)
+        
         # Bar Chart
         chart_container = QWidget()
         chart_container.setStyleSheet("background: #1a1d24; border-radius: 15px;")
         chart_container.setFixedHeight(250)
         chart_layout = QVBoxLayout(chart_container)
         
-        chart_label = QLabel("Last 7 Days Activity")
+        chart_header = QHBoxLayout()
+        chart_label = QLabel("Activity")
         chart_label.setStyleSheet("color: #8b9bb4; font-weight: bold; padding: 10px;")
-        chart_layout.addWidget(chart_label)
+        chart_header.addWidget(chart_label)
+        chart_header.addStretch()
+        
+        self.bucket_combo = QComboBox()
+        for label, bucket in BarChartWidget.VIEWS:
+            self.bucket_combo.addItem(label, bucket)
+        self.bucket_combo.setStyleSheet("background: #2d333b; color: white; padding: 4px; border-radius: 6px;")
+        chart_header.addWidget(self.bucket_combo)
+        chart_layout.addLayout(chart_header)
         
         self.bar_chart = BarChartWidget(self.tracker)
+        self.bucket_combo.currentIndexChanged.connect(
+            lambda: self.bar_chart.set_bucket(self.bucket_combo.currentData())
+        )
         chart_layout.addWidget(self.bar_chart)
         
         layout.addWidget(chart_container)
         
+        # When and how: hour x weekday grid, set sizes, rolling trend (needs NumPy)
+        patterns_container = QWidget()
+        patterns_container.setStyleSheet("background: #1a1d24; border-radius: 15px;")
+        patterns_layout = QVBoxLayout(patterns_container)
+        
+        patterns_label = QLabel("When You Train")
+        patterns_label.setStyleSheet("color: #8b9bb4; font-weight: bold; padding: 10px;")
+        patterns_layout.addWidget(patterns_label)
+        
+        self.hour_chart = HourWeekdayWidget()
+        patterns_layout.addWidget(self.hour_chart)
+        
+        self.analytics_label = QLabel()
+        self.analytics_label.setWordWrap(True)
+        self.analytics_label.setStyleSheet("color: #8b9bb4; font-size: 12px; padding: 6px 10px;")
+        patterns_layout.addWidget(self.analytics_label)
+        
+        layout.addWidget(patterns_container)
+        
         # Buttons
         btn_layout = QHBoxLayout()
         
-        export_btn = QPushButton("💾 Export to CSV")
+        export_btn = QPushButton("💾 Export")
         export_btn.setFixedSize(150, 45)
         export_btn.setStyleSheet("""
             QPushButton {
@@ -80,8 +168,54 @@ class StatsDialog(QDialog):
         btn_layout.addWidget(close_btn)
         
         layout.addLayout(btn_layout)
+        self.refresh_stats()
+        
+    @property
+    def exercise(self):
+        return self.exercise_combo.currentData()
+        
+    def refresh_stats(self):
+        exercise = self.exercise
+        stats = self.tracker.get_stats(exercise)
+        values = {
+            "total": stats['total'],
+            "best_day": stats['best_day'],
+            "streak": self.tracker.get_streak(exercise),
+            "longest": self.tracker.get_longest_streak(exercise),
+            "avg": stats['avg'],
+        }
+        for key, value in values.items():
+            self.cards[key].setText(str(value))
+        
+        recent = self.tracker.get_streak_history(exercise)[-5:][::-1]
+        parts = [f"{s['start']} → {s['end']} ({s['length']}d)" for s in recent]
+        self.streaks_label.setText("Recent streaks:  " + "   ·   ".join(parts))
+        self.streaks_label.setVisible(bool(recent))
+        self.bar_chart.set_exercise(exercise)
+        self.refresh_analytics(exercise)
+        
+    def refresh_analytics(self, exercise):
+        analytics = self.tracker.get_analytics(exercise)
+        if analytics is None:
+            self.hour_chart.set_data(None)
+            self.analytics_label.setText("Install NumPy for time-of-day and set-size analytics.")
+            return
+        self.hour_chart.set_data(analytics.hour_weekday()["reps"])
+        sets = analytics.set_distribution()
+        rolling = analytics.rolling(7, 1)
+        parts = []
+        if sets["sets"]:
+            pct = sets["percentiles"]
+            parts.append(
+                f"Sets: {sets['sets']} · median {pct['p50']:g} · p25–p75 {pct['p25']:g}–{pct['p75']:g}"
+                f" · p90 {pct['p90']:g} · biggest {sets['max']}"
+            )
+        if rolling:
+            parts.append(f"Last 7 days: mean {rolling[-1]['mean']:g}/day · median {rolling[-1]['median']:g}/day")
+        self.analytics_label.setText("\n".join(parts) or "No sets logged yet.")
         
     def create_card(self, title, value, color):
+        """Returns the card and its value label"""
         card = QFrame()
         card.setStyleSheet(f"""
             QFrame {{
@@ -100,25 +234,81 @@ class StatsDialog(QDialog):
         v_lbl.setStyleSheet(f"color: {color}; font-size: 28px; font-weight: bold;")
         layout.addWidget(v_lbl)
         
-        return card
+        return card, v_lbl
         
     def export_data(self):
+        options_dialog = ExportDialog(self)
+        if not options_dialog.exec():
+            return
+        options = options_dialog.get_options()
+        options["exercise"] = self.exercise
+        ext = ".csv" if options["fmt"] == "csv" else ".jsonl"
+        if options["compress"]:
+            ext += ".gz"
         filename, _ = QFileDialog.getSaveFileName(
-            self, "Export Data", "pushup_history.csv", "CSV Files (*.csv)"
+            self, "Export Data", f"{self.exercise}_history{ext}", f"Export Files (*{ext})"
         )
-        if filename:
-            try:
-                self.tracker.export_csv(filename)
-                QMessageBox.information(self, "Success", f"Data exported to {filename}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to export: {str(e)}")
+        if not filename:
+            return
+        
+        # Export streams on a worker thread; the dialog only tracks progress
+        progress = QProgressDialog("Exporting...", "Cancel", 0, 100, self)
+        progress.setWindowTitle("Export")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        
+        worker = ExportWorker(self.tracker, filename, options)
+        worker.progress.connect(progress.setValue)
+        progress.canceled.connect(lambda: setattr(worker, "cancelled", True))
+        
+        def done(written):
+            progress.reset()
+            QMessageBox.information(self, "Success", f"Exported {written / 1024:.1f} KB to {filename}")
+        
+        def failed(error):
+            progress.reset()
+            if not worker.cancelled:
+                QMessageBox.critical(self, "Error", f"Failed to export: {error}")
+        
+        worker.finished.connect(done)
+        worker.failed.connect(failed)
+        self.export_worker = worker  # keep it alive until the thread finishes
+        worker.start()
 
 
 class BarChartWidget(QWidget):
-    def __init__(self, tracker):
+    """Bars per day, week, month or year from the tracker's bucketed series"""
+    VIEWS = [("Last 7 Days", "day"), ("Last 12 Weeks", "week"), ("Last 12 Months", "month"), ("By Year", "year")]
+    LABELS = {"day": "%a", "week": "%d %b", "month": "%b", "year": "%Y"}
+    
+    def __init__(self, tracker, exercise="pushups", bucket="day"):
         super().__init__()
         self.tracker = tracker
-        self.data = tracker.get_all_data()
+        self.exercise = exercise
+        self.bucket = bucket
+        self.load_data()
+        
+    def set_exercise(self, exercise):
+        self.exercise = exercise
+        self.load_data()
+        
+    def set_bucket(self, bucket):
+        self.bucket = bucket
+        self.load_data()
+        
+    def load_data(self):
+        today = datetime.date.today()
+        if self.bucket == "day":
+            start = today - datetime.timedelta(days=6)
+        elif self.bucket == "week":
+            start = today - datetime.timedelta(weeks=11)
+        elif self.bucket == "month":
+            months = today.year * 12 + today.month - 1 - 11
+            start = datetime.date(months // 12, months % 12 + 1, 1)
+        else:
+            start = None  # from the first logged year
+        self.data = self.tracker.series(start, today, self.bucket, self.exercise)
+        self.update()
         
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -127,26 +317,17 @@ class BarChartWidget(QWidget):
         width = self.width()
         height = self.height()
         
-        # Get last 7 days data
-        days = []
-        counts = []
-        today = datetime.date.today()
-        max_val = 1
-        
-        for i in range(6, -1, -1):
-            d = today - datetime.timedelta(days=i)
-            d_str = d.isoformat()
-            count = self.data.get(d_str, 0)
-            
-            days.append(d.strftime("%a"))
-            counts.append(count)
-            if count > max_val: max_val = count
+        labels = [date.strftime(self.LABELS[self.bucket]) for date, _ in self.data]
+        counts = [total for _, total in self.data]
+        if not counts:
+            return
+        max_val = max(counts + [1])
             
         # Draw Bars
-        bar_width = (width - 40) / 7 - 10
+        bar_width = (width - 40) / len(counts) - 10
         x_start = 20
         
-        for i in range(7):
+        for i in range(len(counts)):
             val = counts[i]
             bar_height = (val / max_val) * (height - 40)
             
@@ -163,6 +344,47 @@ class BarChartWidget(QWidget):
                 painter.setPen(QColor("white"))
                 painter.drawText(x, y - 5, bar_width, 10, Qt.AlignCenter, str(val))
             
-            # Day Label
+            # Bucket Label
+            painter.setPen(QColor("#8b9bb4"))
+            painter.drawText(x, height - 20, bar_width, 20, Qt.AlignCenter, labels[i])
+
+
+class HourWeekdayWidget(QWidget):
+    """7 x 24 grid of reps by weekday and hour of day"""
+    DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    
+    def __init__(self):
+        super().__init__()
+        self.grid = None
+        self.setMinimumHeight(170)
+        
+    def set_data(self, grid):
+        self.grid = grid
+        self.update()
+        
+    def paintEvent(self, event):
+        if not self.grid:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        
+        x_offset, y_offset = 40, 5
+        cell_w = (self.width() - x_offset - 10) / 24
+        cell_h = (self.height() - y_offset - 20) / 7
+        max_val = max(max(row) for row in self.grid) or 1
+        
+        painter.setFont(QFont("Segoe UI", 8))
+        for day, row in enumerate(self.grid):
+            y = y_offset + day * cell_h
             painter.setPen(QColor("#8b9bb4"))
-            painter.drawText(x, height - 20, bar_width, 20, Qt.AlignCenter, days[i])
+            painter.drawText(QRectF(0, y, x_offset - 6, cell_h), Qt.AlignRight | Qt.AlignVCenter, self.DAYS[day])
+            painter.setPen(Qt.NoPen)
+            for hour, value in enumerate(row):
+                color = QColor("#00ff88")
+                color.setAlphaF(0.08 + 0.92 * value / max_val if value else 0.04)
+                painter.setBrush(QBrush(color))
+                painter.drawRoundedRect(QRectF(x_offset + hour * cell_w + 1, y + 1, cell_w - 2, cell_h - 2), 2, 2)
+        
+        painter.setPen(QColor("#8b9bb4"))
+        for hour in range(0, 24, 3):
+            painter.drawText(QRectF(x_offset + hour * cell_w, self.height() - 16, cell_w * 3, 16), Qt.AlignLeft, f"{hour:02d}")
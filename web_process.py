@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+The web server in a child process, supervised by the desktop app
+
+Serving phones in the Qt process makes request handling, JSON encoding
+and SQLite reads compete with the UI for the GIL. With "web_process" set
+in config.json the server runs in its own process instead, on its own
+connection to the same SQLite database (WAL lets both read while either
+writes). A duplex pipe carries change notifications: each side sends
+the days its own writes touched, and the other replays them through its
+writer (Storage.touch) so streaks, caches and the UI catch up as if the
+write had been local. The child is restarted if it dies and exits when
+the app does, or as soon as its pipe to the app closes.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+RESTART_DELAYS = (1, 2, 5, 10, 30, 60)  # seconds before each successive restart
+STABLE_AFTER = 60  # a child up this long resets the backoff
+
+
+def _keys(changes):
+    return [(user, exercise, date)
+            for user, exercises in changes.items()
+            for exercise, days in exercises.items()
+            for date in days]
+
+
+class Notifier:
+    """Both ends' half of the pipe: sends this process's changed days, replays the other's
+
+    forward() is meant for a local_only writer listener. Sending happens on
+    a thread of its own, never on the writer thread: a stalled peer must
+    not hold up commits. Days queued while one batch is being sent go out
+    together as the next.
+    """
+
+    def __init__(self, store, conn, on_closed=None):
+        self.store = store
+        self.conn = conn
+        self.on_closed = on_closed
+        self.sent = 0
+        self.received = 0
+        self._outbox = queue.Queue()
+        self._closed = threading.Event()
+        threading.Thread(target=self._send_loop, name="pushtimer-ipc-send", daemon=True).start()
+        threading.Thread(target=self._receive_loop, name="pushtimer-ipc-receive", daemon=True).start()
+
+    def forward(self, changes):
+        if not self._closed.is_set():
+            self._outbox.put(_keys(changes))
+
+    def _send_loop(self):
+        while True:
+            items = [self._outbox.get()]
+            while True:
+                try:
+                    items.append(self._outbox.get_nowait())
+                except queue.Empty:
+                    break
+            if self._closed.is_set():
+                return
+            batch = sorted({key for item in items if item for key in item})
+            farewell = None in items
+            try:
+                if batch:
+                    self.conn.send(batch)
+                    self.sent += 1
+                if farewell:
+                    self.conn.send(None)
+            except (OSError, EOFError, ValueError):  # the other side is gone
+                farewell = True
+            if farewell:
+                self.close()
+                return
+
+    def _receive_loop(self):
+        while True:
+            try:
+                keys = self.conn.recv()
+            except (OSError, EOFError):
+                break
+            if keys is None:  # the other side is shutting down
+                break
+            self.received += 1
+            try:
+                self.store.touch(keys)
+            except Exception as e:
+                print(f"Applying changes from the other process failed: {e}")
+        self.close()
+
+    def shutdown(self):
+        """Tell the other side to shut down once everything queued is sent"""
+        self._outbox.put(None)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._outbox.put([])  # wake the sender so it sees the close
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.on_closed:
+            self.on_closed()
+
+
+def child_main(path, port, config, conn):
+    """Entry point of the child process: serve until the app closes the pipe"""
+    from storage import open_storage
+    from web_server import PushupWebServer
+
+    store = open_storage("sqlite", path)
+
+    def parent_gone():
+        store.close()  # commit what phones already sent
+        os._exit(0)
+
+    notifier = Notifier(store, conn, on_closed=parent_gone)
+    store.add_listener(notifier.forward, local_only=True)
+    PushupWebServer(store, port, config).run()
+
+
+class WebProcess:
+    """Start, watch and restart the web server child process"""
+
+    def __init__(self, store, path, port=8080, config=None):
+        if not store.supports_processes:
+            raise ValueError(f"{store.name} storage cannot be shared with a web server process")
+        self.store = store
+        self.path = str(path)
+        self.port = port
+        self.config = config if config is not None else {}
+        self.restarts = 0
+        self.process = None
+        self.notifier = None
+        self._context = multiprocessing.get_context("spawn")  # no forking of Qt or of live threads
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        store.add_listener(self._changed, local_only=True)
+
+    def start(self):
+        self._spawn()
+        threading.Thread(target=self._supervise, name="pushtimer-web-supervisor", daemon=True).start()
+
+    def _changed(self, changes):
+        """Writer listener: pass the app's own writes on to the current child"""
+        with self._lock:
+            notifier = self.notifier
+        if notifier is not None:
+            notifier.forward(changes)
+
+    def _spawn(self):
+        ours, theirs = self._context.Pipe()
+        config = dict(self.config)  # a snapshot: the child cannot see later changes
+        process = self._context.Process(
+            target=child_main, args=(self.path, self.port, config, theirs), name="pushtimer-web", daemon=True
+        )
+        process.start()
+        theirs.close()
+        with self._lock:
+            if self.notifier is not None:
+                self.notifier.close()
+            self.process = process
+            self.notifier = Notifier(self.store, ours)
+        print(f"Web server process started (pid {process.pid})")
+
+    def _supervise(self):
+        attempt = 0
+        while not self._stopping.is_set():
+            started = time.time()
+            self.process.join()
+            if self._stopping.is_set():
+                return
+            print(f"Web server process exited with code {self.process.exitcode}; restarting")
+            self.store.reload_shared()  # it may have died before reporting its last writes
+            if time.time() - started > STABLE_AFTER:
+                attempt = 0
+            if self._stopping.wait(RESTART_DELAYS[min(attempt, len(RESTART_DELAYS) - 1)]):
+                return
+            attempt += 1
+            self.restarts += 1
+            self._spawn()
+
+    def stop(self, timeout=5):
+        """Shut the child down with the app: it commits what phones already sent, then exits"""
+        self._stopping.set()
+        with self._lock:
+            process, notifier = self.process, self.notifier
+        if notifier is not None:
+            notifier.shutdown()
+        if process is not None:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            process, notifier = self.process, self.notifier
+        return {
+            "pid": process.pid if process else None,
+            "alive": bool(process and process.is_alive()),
+            "restarts": self.restarts,
+            "sent": notifier.sent if notifier else 0,
+            "received": notifier.received if notifier else 0,
+        }
@@ -3,25 +3,45 @@
 Web server for phone sync via hotspot
 """
 
-from flask import Flask, request, jsonify, render_template_string
-import sqlite3
+from flask import Flask, Response, request, jsonify, render_template_string
 import datetime
+import functools
 import threading
+import time
 import socket
 import netifaces
 import qrcode
 from io import BytesIO
 import base64
+import gzip
 import logging
+import re
+import zlib
+from db import DEFAULT_EXERCISE, DEFAULT_USER
+from storage import open_storage
+from export import export_chunks, FORMATS, LEVELS
+from importer import import_lines
+from stats_cache import get_aggregate_cache
+from analytics import get_analytics
+from rollups import series, bucket_count, BUCKETS, MAX_POINTS
+from sync import PAGE_SIZE, MAX_PAGE
+from leaderboard import get_leaderboard, BOARDS
+from serving import serve, options
+from events import get_broadcaster
+
+USER_NAME = re.compile(r"^[\w .@-]{1,40}$")  # what a phone may call itself
 
 # Configure Flask logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
 class PushupWebServer:
-    def __init__(self, db_path, port=8080):
-        self.db_path = db_path
+    def __init__(self, store, port=8080, config=None):
+        self.store = store
+        self.config = config if config is not None else {}  # the tracker's live config
         self.port = port
+        self.events = get_broadcaster(store)
+        self.started = int(time.time() * 1000)  # so ETags from an earlier run never match
         self.app = Flask(__name__)
         self.setup_routes()
         
@@ -52,59 +72,63 @@ class PushupWebServer:
                 pass
             return "127.0.0.1"
     
-    def get_today_total(self):
-        """Get today's pushup total from database"""
-        today = datetime.date.today().isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT SUM(count) FROM pushups WHERE date = ?", (today,))
-        result = cursor.fetchone()[0]
-        conn.close()
-        return result or 0
+    def get_user(self, data=None):
+        """The user named by ?user= or a JSON body's "user", else the desktop app's user"""
+        user = (data or {}).get('user') or request.args.get('user') or self.config.get('user') or DEFAULT_USER
+        user = str(user).strip()
+        if not USER_NAME.match(user):
+            raise ValueError("user must be 1-40 letters, digits, spaces or . @ - _")
+        return user
+    
+    def get_exercises(self, user=DEFAULT_USER):
+        """Configured exercises first, then any others the user has logged"""
+        configured = self.config.get("exercises") or [DEFAULT_EXERCISE]
+        return configured + [name for name in self.store.exercises(user) if name not in configured]
+    
+    def get_exercise(self, data=None, user=DEFAULT_USER):
+        """The exercise named by ?exercise= or a JSON body's "exercise", else pushups"""
+        exercise = (data or {}).get('exercise') or request.args.get('exercise') or DEFAULT_EXERCISE
+        if exercise not in self.get_exercises(user):
+            raise ValueError(f"Unknown exercise {exercise!r}")
+        return exercise
+    
+    def get_team_exercise(self):
+        """The exercise named by ?exercise=, else pushups, if it is configured or anyone has logged it"""
+        exercise = request.args.get('exercise') or DEFAULT_EXERCISE
+        configured = self.config.get("exercises") or [DEFAULT_EXERCISE]
+        if exercise not in configured and not any(exercise in self.store.exercises(user) for user in self.store.users()):
+            raise ValueError(f"Unknown exercise {exercise!r}")
+        return exercise
+    
+    def get_today_total(self, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Get a user's total for an exercise today"""
+        today = datetime.date.today()
+        rows = self.store.day_range(today, today, exercise=exercise, user=user)
+        return rows[0][1] if rows else 0
     
-    def log_pushups(self, count):
-        """Log pushups to database (append mode)"""
-        today = datetime.date.today().isoformat()
-        now = datetime.datetime.now().isoformat()
+    def log_pushups(self, count, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Log reps to database, honouring aggregate_mode like the desktop app"""
+        today = datetime.date.today()
+        now = datetime.datetime.now()
+        replace = self.config.get("aggregate_mode") == "replace"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO pushups (date, count, timestamp) VALUES (?, ?, ?)",
-            (today, count, now)
-        )
-        conn.commit()
-        conn.close()
-
-    def update_pushups_for_date(self, date_str, count):
+        # Blocks this request thread only; concurrent phones share a commit
+        self.store.log(today, count, now, replace, exercise, user).result()
+
+    def update_pushups_for_date(self, date_str, count, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
         """Update/Overwrite pushups for a specific date"""
         # Note: This simplifies the data model by deleting all entries for that date
         # and inserting a single 'manual edit' entry.
         # This is destructive to strict timestamp logging but matches "Edit" intent best.
         
-        now = datetime.datetime.now().isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Remove existing entries for this date
-        cursor.execute("DELETE FROM pushups WHERE date = ?", (date_str,))
-        
-        # Insert new single entry
-        cursor.execute(
-            "INSERT INTO pushups (date, count, timestamp) VALUES (?, ?, ?)",
-            (date_str, count, now)
-        )
-        conn.commit()
-        conn.close()
-
-    def get_history(self):
-        """Get daily totals for history view"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT date, SUM(count) FROM pushups GROUP BY date ORDER BY date DESC LIMIT 30")
-        data = [{'date': row[0], 'count': row[1] or 0} for row in cursor.fetchall()]
-        conn.close()
-        return data
+        date = datetime.date.fromisoformat(date_str)
+        self.store.set_day(date, count, datetime.datetime.now(), exercise, user).result()
+
+    def get_history(self, days=30, exercise=DEFAULT_EXERCISE, user=DEFAULT_USER):
+        """Get a user's daily totals for the last `days` days, newest first"""
+        today = datetime.date.today()
+        rows = self.store.day_range(today - datetime.timedelta(days=days - 1), today, exercise=exercise, user=user)
+        return [{'date': date.isoformat(), 'count': total or 0} for date, total in reversed(rows)]
 
     def setup_routes(self):
         """Setup Flask routes"""
@@ -326,15 +350,28 @@ class PushupWebServer:
                 }
                 .toast.show { transform: translateX(-50%) translateY(0); opacity: 1; }
                 .toast.error { background: #ff4757; color: white; }
+
+                .board-tabs { display: flex; gap: 8px; margin-bottom: 20px; }
+                .board-tabs .nav-btn { flex: 1; }
+                .rank { width: 36px; font-weight: 800; color: var(--text-secondary); }
+                .history-item.me { border: 1px solid var(--primary); }
+
+                .exercise-select {
+                    background: var(--card-bg); color: var(--text); border: 1px solid var(--text-secondary);
+                    border-radius: 8px; padding: 6px 10px; font-family: inherit; text-transform: capitalize;
+                }
             </style>
         </head>
         <body>
             <header class="app-header">
                 <div class="logo">PUSH<span>TIMER</span></div>
                 <nav>
-                    <button class="nav-btn active" onclick="switchView('dashboard')">Timer</button>
-                    <button class="nav-btn" onclick="switchView('history')">History</button>
+                    <button class="nav-btn active" data-view="dashboard" onclick="switchView('dashboard')">Timer</button>
+                    <button class="nav-btn" data-view="history" onclick="switchView('history')">History</button>
+                    <button class="nav-btn" data-view="team" onclick="switchView('team')">Team</button>
                 </nav>
+                <button id="userBtn" class="nav-btn" onclick="changeUser()"></button>
+                <select id="exercise" class="exercise-select" onchange="switchExercise()"></select>
             </header>
 
             <!-- Dashboard View -->
@@ -342,7 +379,7 @@ class PushupWebServer:
                 <div class="stats-circle" id="progressRing">
                     <div class="stats-inner">
                         <div class="count-big" id="todayTotal">--</div>
-                        <div class="label-dim">Today's Pushups</div>
+                        <div class="label-dim" id="todayLabel">Today's Pushups</div>
                     </div>
                 </div>
 
@@ -365,6 +402,16 @@ class PushupWebServer:
                 </div>
             </main>
 
+            <!-- Team View -->
+            <main id="team" class="view">
+                <div class="board-tabs">
+                    <button class="nav-btn active" data-board="today" onclick="switchBoard('today')">Today</button>
+                    <button class="nav-btn" data-board="week" onclick="switchBoard('week')">Week</button>
+                    <button class="nav-btn" data-board="streak" onclick="switchBoard('streak')">Streak</button>
+                </div>
+                <div class="history-list" id="teamList"></div>
+            </main>
+
             <!-- Edit Modal -->
             <div class="modal-overlay" id="editModal">
                 <div class="modal">
@@ -387,6 +434,16 @@ class PushupWebServer:
                 let buffer = 10;
                 let todayTotal = 0;
                 let currentView = 'dashboard';
+                let exercise = localStorage.getItem('exercise') || 'pushups';
+                let user = localStorage.getItem('user') || '';
+                let me = user;  // the user the server resolved an empty name to
+                let board = 'today';
+                let historyItems = [];
+
+                // Query string naming the current exercise and user (the server's default if unset)
+                function scope() {
+                    return 'exercise=' + encodeURIComponent(exercise) + (user ? '&user=' + encodeURIComponent(user) : '');
+                }
 
                 // Icons
                 const icons = {
@@ -394,24 +451,130 @@ class PushupWebServer:
                 };
 
                 // Init
-                document.addEventListener('DOMContentLoaded', () => {
+                document.addEventListener('DOMContentLoaded', async () => {
+                    document.getElementById('userBtn').innerText = user || 'Set name';
+                    await loadExercises();
                     refreshData();
+                    listen();
                     // Set default date in modal to today
                     document.getElementById('editDate').valueAsDate = new Date();
                 });
 
+                // Live updates: the server pushes every write, from any phone or the desktop
+                function listen() {
+                    if(!window.EventSource) return;
+                    const events = new EventSource('/api/events');
+                    events.addEventListener('change', e => applyChanges(JSON.parse(e.data)));
+                    events.addEventListener('reset', () => {
+                        refreshData();
+                        if(currentView === 'history') loadHistory();
+                        if(currentView === 'team') loadBoard();
+                    });
+                    // The browser reconnects by itself unless the server turned it away
+                    events.onerror = () => {
+                        if(events.readyState === EventSource.CLOSED) setTimeout(listen, 10000);
+                    };
+                }
+
+                let boardTimer = null;
+                function applyChanges(data) {
+                    const ours = data.changes.filter(c => c.exercise === exercise);
+                    const mine = ours.filter(c => c.user === me);
+                    mine.forEach(c => {
+                        if(c.date === data.today) showToday(c.total);
+                        const item = historyItems.find(h => h.date === c.date);
+                        if(item) item.count = c.total;
+                        else if(c.total && historyItems.length && c.date > historyItems[historyItems.length - 1].date) {
+                            historyItems.push({date: c.date, count: c.total});
+                            historyItems.sort((a, b) => b.date.localeCompare(a.date));
+                        }
+                    });
+                    if(mine.length && currentView === 'history') renderHistory();
+                    // Ranks depend on everyone: refetch the board, at most once a second
+                    if(ours.length && currentView === 'team' && !boardTimer) {
+                        boardTimer = setTimeout(() => { boardTimer = null; loadBoard(); }, 1000);
+                    }
+                }
+
                 // Navigation
                 function switchView(viewName) {
                     document.querySelectorAll('.view').forEach(el => el.classList.remove('active'));
                     document.querySelectorAll('.nav-btn').forEach(el => el.classList.remove('active'));
                     
                     document.getElementById(viewName).classList.add('active');
-                    // Find the button that triggered this or select by index
-                    const btns = document.querySelectorAll('.nav-btn');
-                    if(viewName === 'dashboard') btns[0].classList.add('active');
-                    else btns[1].classList.add('active');
+                    document.querySelector(`nav .nav-btn[data-view="${viewName}"]`).classList.add('active');
                     
+                    currentView = viewName;
                     if(viewName === 'history') loadHistory();
+                    if(viewName === 'team') loadBoard();
+                }
+
+                // Users: each phone logs under its own name
+                async function changeUser() {
+                    const name = prompt('Your name on this server', user);
+                    if(name === null) return;
+                    user = name.trim();
+                    localStorage.setItem('user', user);
+                    document.getElementById('userBtn').innerText = user || 'Set name';
+                    await loadExercises();
+                    refreshData();
+                    if(currentView === 'history') loadHistory();
+                    if(currentView === 'team') loadBoard();
+                }
+
+                // Exercises
+                async function loadExercises() {
+                    const res = await fetch('/api/exercises' + (user ? '?user=' + encodeURIComponent(user) : ''));
+                    const data = await res.json();
+                    if(!data.exercises.includes(exercise)) exercise = data.exercises[0];
+                    const select = document.getElementById('exercise');
+                    select.innerHTML = data.exercises.map(
+                        name => `<option value="${name}"${name === exercise ? ' selected' : ''}>${name}</option>`
+                    ).join('');
+                    document.getElementById('todayLabel').innerText = "Today's " + exercise;
+                }
+
+                function switchExercise() {
+                    exercise = document.getElementById('exercise').value;
+                    localStorage.setItem('exercise', exercise);
+                    document.getElementById('todayLabel').innerText = "Today's " + exercise;
+                    refreshData();
+                    if(currentView === 'history') loadHistory();
+                    if(currentView === 'team') loadBoard();
+                }
+
+                // Leaderboard
+                function switchBoard(name) {
+                    board = name;
+                    document.querySelectorAll('.board-tabs .nav-btn').forEach(
+                        el => el.classList.toggle('active', el.dataset.board === name)
+                    );
+                    loadBoard();
+                }
+
+                async function loadBoard() {
+                    const res = await fetch('/api/leaderboard?board=' + board + '&' + scope());
+                    const data = await res.json();
+                    const list = document.getElementById('teamList');
+                    const unit = board === 'streak' ? ' days' : '';
+                    list.innerHTML = data.leaders.length ? '' :
+                        '<div style="text-align:center; color:var(--text-secondary); padding:20px;">No one has logged ' + exercise + ' yet</div>';
+                    data.leaders.forEach(item => {
+                        const el = document.createElement('div');
+                        el.className = 'history-item' + (item.user === user ? ' me' : '');
+                        el.innerHTML = `
+                            <div class="count-col"><span class="rank">#${item.rank}</span><span class="h-date"></span></div>
+                            <span class="h-count">${item.score}${unit}</span>
+                        `;
+                        el.querySelector('.h-date').textContent = item.user;
+                        list.appendChild(el);
+                    });
+                    if(data.you && data.you.rank > data.leaders.length) {
+                        const el = document.createElement('div');
+                        el.className = 'history-item me';
+                        el.innerHTML = `<span class="h-ago">You: #${data.you.rank}</span><span class="h-count">${data.you.score}${unit}</span>`;
+                        list.appendChild(el);
+                    }
                 }
 
                 // Buffer Logic
@@ -426,11 +589,11 @@ class PushupWebServer:
                         const res = await fetch('/api/log', {
                             method: 'POST',
                             headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify({count: buffer})
+                            body: JSON.stringify({count: buffer, exercise, user})
                         });
                         const data = await res.json();
                         if(data.success) {
-                            showToast('Logged ' + buffer + ' pushups!');
+                            showToast('Logged ' + buffer + ' ' + exercise + '!');
                             refreshData();
                             buffer = 10; // Reset
                             document.getElementById('bufferDisplay').textContent = buffer;
@@ -442,9 +605,14 @@ class PushupWebServer:
 
                 // Data Fetching
                 async function refreshData() {
-                    const res = await fetch('/api/today');
+                    const res = await fetch('/api/today?' + scope());
                     const data = await res.json();
-                    todayTotal = data.total;
+                    me = data.user;
+                    showToday(data.total);
+                }
+
+                function showToday(total) {
+                    todayTotal = total;
                     document.getElementById('todayTotal').innerText = todayTotal;
                     
                     // Update ring (assuming goal of 100 for visual)
@@ -453,17 +621,22 @@ class PushupWebServer:
                 }
 
                 async function loadHistory() {
-                    const res = await fetch('/api/history');
+                    const res = await fetch('/api/history?' + scope());
                     const data = await res.json();
+                    historyItems = data.history;
+                    renderHistory();
+                }
+
+                function renderHistory() {
                     const list = document.getElementById('historyList');
                     list.innerHTML = '';
                     
-                    if(data.history.length === 0) {
+                    if(historyItems.length === 0) {
                         list.innerHTML = '<div style="text-align:center; color:var(--text-secondary); padding:20px;">No logs yet</div>';
                         return;
                     }
                     
-                    data.history.forEach(item => {
+                    historyItems.forEach(item => {
                         const el = document.createElement('div');
                         el.className = 'history-item';
                         // Format date nicely
@@ -518,7 +691,7 @@ class PushupWebServer:
                         const res = await fetch('/api/edit', {
                             method: 'POST',
                             headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify({date, count: parseInt(count)})
+                            body: JSON.stringify({date, count: parseInt(count), exercise, user})
                         });
                         const data = await res.json();
                         
@@ -548,24 +721,290 @@ class PushupWebServer:
         def index():
             return render_template_string(HTML_TEMPLATE)
         
+        def conditional(view):
+            """ETag the view's answer by data version and day; a matching If-None-Match gets a 304
+
+            The version is the store's data_version, which moves only once
+            every cache has taken a write in, so a revalidation costs no
+            query and no JSON and never pins a body read mid-update. The
+            tag also covers the date (today and history move at midnight)
+            and the config the answer depends on.
+            """
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                scope = repr((self.get_user(), self.config.get('exercises')))
+                etag = (f"{self.started:x}.{self.store.data_version}-{datetime.date.today():%Y%m%d}-"
+                        f"{zlib.crc32(scope.encode('utf-8')):08x}")
+                if request.if_none_match.contains_weak(etag):
+                    response = Response(status=304)
+                else:
+                    response = self.app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'  # keep it, but ask every time
+                return response
+            return wrapper
+        
+        @self.app.errorhandler(ValueError)
+        def bad_request(e):
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        @self.app.route('/api/exercises')
+        @conditional
+        def api_exercises():
+            return jsonify({'exercises': self.get_exercises(self.get_user())})
+        
+        @self.app.route('/api/users')
+        @conditional
+        def api_users():
+            return jsonify({'users': self.store.users()})
+        
         @self.app.route('/api/today')
+        @conditional
         def api_today():
-            total = self.get_today_total()
-            return jsonify({'total': total})
+            user = self.get_user()
+            exercise = self.get_exercise(user=user)
+            total = self.get_today_total(exercise, user)
+            return jsonify({'total': total, 'exercise': exercise, 'user': user})
         
         @self.app.route('/api/history')
+        @conditional
         def api_history():
-            history = self.get_history()
-            return jsonify({'history': history})
+            user = self.get_user()
+            exercise = self.get_exercise(user=user)
+            days = min(max(int(request.args.get('days', 30)), 1), 3660)
+            history = self.get_history(days, exercise, user)
+            return jsonify({'history': history, 'exercise': exercise, 'user': user})
+        
+        @self.app.route('/api/leaderboard')
+        @conditional
+        def api_leaderboard():
+            """Ranked users: ?board=today|week|streak[&exercise][&limit=10][&user= to include their rank]"""
+            exercise = self.get_team_exercise()
+            board = request.args.get('board', 'today')
+            if board not in BOARDS:
+                return jsonify({'success': False, 'error': f"board must be one of {', '.join(BOARDS)}"}), 400
+            limit = min(max(int(request.args.get('limit', 10)), 1), 1000)
+            leaderboard = get_leaderboard(self.store, exercise)
+            result = {
+                'exercise': exercise,
+                'board': board,
+                'users': len(leaderboard),
+                'leaders': leaderboard.top(board, limit),
+            }
+            if request.args.get('user'):
+                result['you'] = leaderboard.rank(self.get_user(), board)
+            return jsonify(result)
+        
+        @self.app.route('/api/series')
+        @conditional
+        def api_series():
+            """Bucketed totals: ?bucket=day|week|month|year[&start&end][&exercise][&user], zero-filled
+
+            The range is clamped to the first logged day and today (or the
+            last logged day if later); more than MAX_POINTS buckets is a 400.
+            """
+            user = self.get_user()
+            exercise = self.get_exercise(user=user)
+            bucket = request.args.get('bucket', 'day')
+            if bucket not in BUCKETS:
+                return jsonify({'success': False, 'error': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+            try:
+                start = request.args.get('start')
+                end = request.args.get('end')
+                start = datetime.date.fromisoformat(start) if start else None
+                end = datetime.date.fromisoformat(end) if end else None
+            except ValueError:
+                return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD'}), 400
+            bounds = self.store.bounds(exercise, user)
+            rows = []
+            if bounds is not None:
+                start = max(start or bounds[0], bounds[0])
+                end = min(end or bounds[1], max(bounds[1], datetime.date.today()))
+                if bucket_count(bucket, start, end) > MAX_POINTS:
+                    return jsonify({'success': False, 'error': f'At most {MAX_POINTS} {bucket} buckets per request; '
+                                    'narrow start..end or use a larger bucket'}), 400
+                rows = series(self.store, start, end, bucket, exercise, user)
+            return jsonify({
+                'exercise': exercise,
+                'user': user,
+                'bucket': bucket,
+                'series': [{'date': date.isoformat(), 'total': total} for date, total in rows],
+            })
+        
+        @self.app.route('/api/stats')
+        @conditional
+        def api_stats():
+            user = self.get_user()
+            return jsonify(get_aggregate_cache(self.store, self.get_exercise(user=user), user).snapshot())
+        
+        @self.app.route('/api/analytics')
+        @conditional
+        def api_analytics():
+            """Hour x weekday histograms, set-size distribution, rolling mean/median (?window=7&days=90)"""
+            user = self.get_user()
+            analytics = get_analytics(self.store, self.get_exercise(user=user), user)
+            if analytics is None:
+                return jsonify({'success': False, 'error': 'Analytics need NumPy on the server'}), 501
+            window = min(max(int(request.args.get('window', 7)), 1), 365)
+            days = min(max(int(request.args.get('days', 90)), 1), 3660)
+            return jsonify(analytics.summary(window, days))
+        
+        @self.app.route('/api/range')
+        @conditional
+        def api_range():
+            user = self.get_user()
+            exercise = self.get_exercise(user=user)
+            try:
+                start = datetime.date.fromisoformat(request.args['start'])
+                end = datetime.date.fromisoformat(request.args['end'])
+                rolling = int(request.args.get('rolling', 0))
+            except (KeyError, ValueError):
+                return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD'}), 400
+            if rolling and not 1 <= rolling <= 365:
+                return jsonify({'success': False, 'error': 'rolling must be between 1 and 365 days'}), 400
+            
+            stats = get_aggregate_cache(self.store, exercise, user)
+            result = {
+                'exercise': exercise,
+                'user': user,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'total': stats.range_total(start, end),
+            }
+            if rolling:
+                # Averages only where there can be data, as /api/series does
+                bounds = self.store.bounds(exercise, user)
+                result['rolling'] = []
+                if bounds is not None:
+                    start = max(start, bounds[0])
+                    end = min(end, max(bounds[1], datetime.date.today()))
+                    if bucket_count('day', start, end) > MAX_POINTS:
+                        return jsonify({'success': False, 'error': f'At most {MAX_POINTS} days of rolling averages'}), 400
+                    result['rolling'] = [
+                        {'date': d.isoformat(), 'avg': round(avg, 1)}
+                        for d, avg in stats.rolling_average(rolling, start, end)
+                    ]
+            return jsonify(result)
+        
+        @self.app.route('/api/export')
+        def api_export():
+            """Chunked download: ?format=csv|jsonl&level=raw|day|week|month[&exercise][&user][&start&end][&gzip=1]"""
+            user = self.get_user()
+            exercise = self.get_exercise(user=user)
+            fmt = request.args.get('format', 'csv')
+            level = request.args.get('level', 'day')
+            compress = request.args.get('gzip') == '1'
+            try:
+                start = request.args.get('start')
+                end = request.args.get('end')
+                start = datetime.date.fromisoformat(start) if start else None
+                end = datetime.date.fromisoformat(end) if end else None
+            except ValueError:
+                return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD'}), 400
+            if fmt not in FORMATS or level not in LEVELS:
+                return jsonify({'success': False, 'error': 'Unknown format or level'}), 400
+            
+            filename = f"{exercise}_{level}.{fmt}" + (".gz" if compress else "")
+            mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+            return Response(
+                export_chunks(self.store, fmt, level, start, end, compress, exercise=exercise, user=user),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
+        
+        @self.app.route('/api/import', methods=['POST'])
+        def api_import():
+            """Bulk upload: raw CSV or JSON Lines body (?format=csv|jsonl), gzip via Content-Encoding
+
+            Rows without an exercise column or key are logged as ?exercise= (default pushups),
+            all of them as ?user=.
+            """
+            user = self.get_user()
+            exercise = self.get_exercise(user=user)
+            fmt = request.args.get('format', 'jsonl' if 'json' in (request.content_type or '') else 'csv')
+            if fmt not in FORMATS:
+                return jsonify({'success': False, 'error': 'Unknown format'}), 400
+            stream = request.stream
+            if request.headers.get('Content-Encoding') == 'gzip':
+                stream = gzip.GzipFile(fileobj=stream)
+            lines = (line.decode('utf-8') for line in stream)  # parsed as it arrives
+            try:
+                report = import_lines(self.store, lines, fmt, exercise, user)
+            except Exception as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            return jsonify({'success': True, **report})
+        
+        @self.app.route('/api/events')
+        def api_events():
+            """Server-Sent Events: "change" with the new day totals after every write, "reset" to refetch all"""
+            try:
+                last_id = int(request.headers.get('Last-Event-ID') or request.args['last_id'])
+            except (KeyError, ValueError):
+                last_id = None
+            if not request.environ.get('pushtimer.async_bodies'):
+                # This engine holds a thread per stream: leave half of them for ordinary requests
+                if self.events.streams >= max(1, options(self.config)['web_threads'] // 2):
+                    return Response('Too many live streams', status=503, headers={'Retry-After': '10'})
+            return Response(
+                self.events.stream(last_id),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+                direct_passthrough=True,  # hand the stream itself to the server, see serving.py
+            )
+        
+        @self.app.route('/api/status')
+        def api_status():
+            return jsonify({'writer': self.store.stats(), 'events': self.events.stats()})
+        
+        # --- Delta sync with other devices' databases (see sync.py) ---
+        
+        def no_sync():
+            return jsonify({'success': False, 'error': f"{self.store.name} storage cannot sync"}), 501
+        
+        @self.app.route('/api/sync/state')
+        def api_sync_state():
+            """This store's device uuid and version vector {device uuid: last seq held}"""
+            if not self.store.supports_sync:
+                return no_sync()
+            return jsonify(self.store.sync_state())
+        
+        @self.app.route('/api/sync/pull', methods=['POST'])
+        def api_sync_pull():
+            """{"since": vector, "limit": n} -> the changes beyond the vector, a page at a time"""
+            if not self.store.supports_sync:
+                return no_sync()
+            data = request.get_json(silent=True) or {}
+            try:
+                since = {str(device): int(seq) for device, seq in (data.get('since') or {}).items()}
+                limit = min(max(int(data.get('limit', PAGE_SIZE)), 1), MAX_PAGE)
+            except (AttributeError, TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'since must map device ids to sequence numbers'}), 400
+            changes, more = self.store.changes_since(since, limit)
+            return jsonify({'changes': changes, 'more': more})
+        
+        @self.app.route('/api/sync/push', methods=['POST'])
+        def api_sync_push():
+            """{"changes": [...]} -> applied count and the updated vector"""
+            if not self.store.supports_sync:
+                return no_sync()
+            changes = (request.get_json(silent=True) or {}).get('changes')
+            if not isinstance(changes, list) or len(changes) > MAX_PAGE:
+                return jsonify({'success': False, 'error': f'changes must be a list of at most {MAX_PAGE}'}), 400
+            applied = self.store.apply_changes(changes)  # malformed or out-of-order changes -> 400
+            return jsonify({'success': True, 'applied': applied, **self.store.sync_state()})
         
         @self.app.route('/api/log', methods=['POST'])
         def api_log():
             try:
                 data = request.get_json()
                 count = int(data.get('count', 0))
+                user = self.get_user(data)
+                exercise = self.get_exercise(data, user)
                 
-                self.log_pushups(count)
-                return jsonify({'success': True, 'count': count})
+                self.log_pushups(count, exercise, user)
+                return jsonify({'success': True, 'count': count, 'exercise': exercise, 'user': user})
             except Exception as e:
                 return jsonify({'success': False, 'error': str(e)})
 
@@ -582,17 +1021,18 @@ class PushupWebServer:
                 if not date_str or count < 0:
                     return jsonify({'success': False, 'error': 'Invalid data'})
                     
-                self.update_pushups_for_date(date_str, count)
+                user = self.get_user(data)
+                self.update_pushups_for_date(date_str, count, self.get_exercise(data, user), user)
                 return jsonify({'success': True})
             except Exception as e:
                 return jsonify({'success': False, 'error': str(e)})
     
     def run(self):
-        """Run the Flask server"""
+        """Serve with the engine and limits configured as web_* (see serving.py)"""
         ip = self.get_local_ip()
         print(f"WEB_SERVER_STARTED_AT:http://{ip}:{self.port}")
         # Host=0.0.0.0 is CRITICAL for hotspot accessibility
-        self.app.run(host='0.0.0.0', port=self.port, debug=False, threaded=True)
+        serve(self.app, '0.0.0.0', self.port, self.config)
     
     def start_in_thread(self):
         """Start server in a background thread"""
@@ -602,6 +1042,11 @@ class PushupWebServer:
 
 if __name__ == "__main__":
     # Standalone testing
-    db_path = "test.db"
-    server = PushupWebServer(db_path)
+    import sys
+    # python web_server.py [engine] [port] [path] [web engine]; two on loopback make a sync test bed
+    engine = sys.argv[1] if len(sys.argv) > 1 else "sqlite"  # "memory" for load tests
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    path = sys.argv[3] if len(sys.argv) > 3 else ("test.db" if engine == "sqlite" else "test.log")
+    config = {"web_engine": sys.argv[4]} if len(sys.argv) > 4 else None
+    server = PushupWebServer(open_storage(engine, path), port=port, config=config)
     server.run()